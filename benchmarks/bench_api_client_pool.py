@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+共享 ApiClient 连接池基准测试
+在本地启动一个 TLS 服务器模拟 d.pcs.baidu.com，对比：
+    1. 每个请求新建 ApiClient（旧的 upload_chunk 做法）
+    2. 使用 ApiClientRegistry 共享的 ApiClient
+统计总耗时和服务端完成的 TLS 握手次数。
+
+用法: python benchmarks/bench_api_client_pool.py [请求数] [并发数]
+依赖: 系统中可用的 openssl 命令（用于生成自签名证书）
+"""
+import os
+import sys
+import ssl
+import time
+import tempfile
+import threading
+import subprocess
+import concurrent.futures
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import openapi_client
+from modules.api_clients import ApiClientRegistry, PCS_HOST
+
+# 每个请求携带的分片大小
+PAYLOAD_SIZE = 256 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body = b'{"md5": "0"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _TLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, context):
+        super().__init__(address, _Handler)
+        self.context = context
+        self.handshakes = 0
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        sock, address = self.socket.accept()
+        tls_sock = self.context.wrap_socket(sock, server_side=True)
+        with self.lock:
+            self.handshakes += 1
+        return tls_sock, address
+
+
+def _make_certificate(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+         '-keyout', key, '-out', cert],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+def _upload(api_client, url, payload):
+    return api_client.rest_client.request(
+        'POST', url, headers={'Content-Type': 'application/octet-stream'}, body=payload
+    )
+
+
+def run(requests_count=200, concurrency=8):
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = _make_certificate(directory)
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        server = _TLSServer(('127.0.0.1', 0), context)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"https://127.0.0.1:{server.server_address[1]}/rest/2.0/pcs/superfile2?method=upload"
+
+        configuration = openapi_client.Configuration(ssl_ca_cert=cert)
+        payload = os.urandom(PAYLOAD_SIZE)
+
+        def fresh_client_upload(_):
+            with openapi_client.ApiClient(configuration) as api_client:
+                return _upload(api_client, url, payload)
+
+        registry = ApiClientRegistry(pool_size=concurrency, configuration=configuration)
+
+        def shared_client_upload(_):
+            return _upload(registry.get(PCS_HOST), url, payload)
+
+        print(f"请求数: {requests_count}, 并发数: {concurrency}, 每个请求 {PAYLOAD_SIZE // 1024}KB")
+        for name, func in (("每个请求新建 ApiClient", fresh_client_upload),
+                           ("共享 ApiClient 连接池", shared_client_upload)):
+            server.handshakes = 0
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(func, range(requests_count)))
+            elapsed = time.perf_counter() - start
+            print(f"{name:<24} 耗时 {elapsed:6.2f}s  {requests_count / elapsed:7.1f} req/s  "
+                  f"TLS握手 {server.handshakes} 次")
+
+        registry.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    run(count, workers)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+异步上传引擎基准测试
+在本地启动一个模拟百度网盘上传接口的 HTTP 服务器（每个分片请求固定延迟，模拟网络往返），
+分别在 10、100、500 个并发分片下对比：
+    1. 线程引擎：auto_chunked_upload + UploadScheduler（每个槽位一个线程）
+    2. 异步引擎：AsyncUploadEngine（单个事件循环）
+统计总耗时、吞吐量以及进程线程数峰值。
+
+用法: python benchmarks/bench_async_engine.py [并发数...]
+依赖: aiohttp
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+import openapi_client
+from modules.api_clients import configure_api_clients
+from modules.upload_scheduler import UploadScheduler
+from modules.upload_new import auto_chunked_upload
+from modules.async_upload import AsyncUploadEngine
+
+# 分片大小（较小的分片使请求数成为瓶颈）
+PART_SIZE = 64 * 1024
+
+# 每个分片请求在服务端的固定延迟（秒）
+PART_LATENCY = 0.05
+
+# 每个并发槽位平均上传的分片数
+PARTS_PER_SLOT = 4
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        method = parse_qs(urlparse(self.path).query).get('method', [''])[0]
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if method == 'precreate':
+            self._send({'errno': 0, 'return_type': 1, 'uploadid': 'u%d' % random.randrange(1 << 30)})
+        elif method == 'upload':
+            time.sleep(PART_LATENCY)
+            self._send({'md5': '0'})
+        else:
+            self._send({'errno': 0, 'fs_id': 1})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class _ThreadSampler:
+    """后台采样进程的线程数峰值"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+
+def _run_threaded(local_path, concurrency):
+    scheduler = UploadScheduler(concurrency)
+    configure_api_clients(concurrency)
+    result = auto_chunked_upload('bench', local_path, '/apps/bench/threaded', chunk_size=PART_SIZE,
+                                 show_progress=False, rapid_upload=False, scheduler=scheduler)
+    assert result, "线程引擎上传失败"
+
+
+def _run_async(local_path, concurrency):
+    async def run():
+        async with AsyncUploadEngine('bench', max_parts=concurrency) as engine:
+            return await engine.upload(local_path, '/apps/bench/async', chunk_size=PART_SIZE,
+                                       rapid_upload=False, show_progress=False)
+
+    assert asyncio.run(run()), "异步引擎上传失败"
+
+
+def _serve(server):
+    server.serve_forever()
+
+
+def run(levels=(10, 100, 500)):
+    # 服务器运行在子进程中，统计的线程数只包含客户端
+    server = _Server(('127.0.0.1', 0), _Handler)
+    process = multiprocessing.Process(target=_serve, args=(server,), daemon=True)
+    process.start()
+    server.server_close()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    # 所有接口都指向本地服务器
+    openapi_client.Configuration.get_host_from_settings = lambda self, index, variables=None, servers=None: url
+
+    print(f"分片大小 {PART_SIZE // 1024}KB，服务端每个分片延迟 {PART_LATENCY * 1000:.0f}ms，"
+          f"每个并发槽位 {PARTS_PER_SLOT} 个分片")
+    with tempfile.TemporaryDirectory() as directory:
+        for concurrency in levels:
+            parts = concurrency * PARTS_PER_SLOT
+            local_path = os.path.join(directory, f'bench_{concurrency}.bin')
+            with open(local_path, 'wb') as f:
+                f.write(os.urandom(parts * PART_SIZE))
+
+            for name, func in (("线程引擎", _run_threaded), ("异步引擎", _run_async)):
+                baseline = threading.active_count()
+                with _ThreadSampler() as sampler:
+                    start = time.perf_counter()
+                    func(local_path, concurrency)
+                    elapsed = time.perf_counter() - start
+                print(f"并发 {concurrency:>3}  {name}  {parts:>5} 个分片  耗时 {elapsed:6.2f}s  "
+                      f"{parts / elapsed:7.1f} 分片/s  新增线程峰值 {sampler.peak - baseline}")
+
+    process.terminate()
+
+
+if __name__ == '__main__':
+    levels = [int(arg) for arg in sys.argv[1:]] or [10, 100, 500]
+    run(levels)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+加密进程池基准测试
+生成一个测试文件并按分片记录 CBC 链接向量，然后用与上传槽位数相同的线程并发加密全部分片：
+    1. 线程加密：ChunkReader.read（在调用线程中原地加密）
+    2. 进程池加密：EncryptionPool（子进程在共享内存中原地加密），进程数从1递增到CPU核数
+统计加密吞吐量（MB/s）。进程池的吞吐量应随核数近似线性增长，单核机器上与线程加密持平。
+
+用法: python benchmarks/bench_encrypt_pool.py [文件大小MB] [分片大小MB]
+"""
+import os
+import sys
+import time
+import tempfile
+import concurrent.futures
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from modules.crypto_utils import StreamEncryptor
+from modules.upload_new import ChunkReader, split_file_to_chunks
+from modules.encrypt_pool import EncryptionPool
+
+# 并发加密的线程数（模拟上传槽位）
+THREADS = 8
+
+
+def _run_threads(func, chunks):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(func, chunks))
+
+
+def _bench_threads(path, encryptor, chunks):
+    with ChunkReader(path, encryptor) as reader:
+        _run_threads(reader.read, chunks)
+
+
+def _bench_pool(path, encryptor, chunks, pool):
+    def encrypt(chunk):
+        pool.encrypt_chunk(path, encryptor, chunk).release()
+
+    _run_threads(encrypt, chunks)
+
+
+def _measure(func, size, rounds=3):
+    """取多轮中的最好成绩"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size / best / (1024 * 1024)
+
+
+def run(file_mb=256, chunk_mb=4):
+    size = file_mb * 1024 * 1024
+    chunk_size = chunk_mb * 1024 * 1024
+    cores = os.cpu_count() or 1
+    print(f"文件 {file_mb}MB，分片 {chunk_mb}MB，{THREADS} 个并发线程，CPU 核数 {cores}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.bin')
+        with open(path, 'wb') as f:
+            for _ in range(file_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        encryptor = StreamEncryptor('bench')
+        chunks, _ = split_file_to_chunks(path, chunk_size, encrypt=True, encryptor=encryptor)
+
+        speed = _measure(lambda: _bench_threads(path, encryptor, chunks), size)
+        print(f"线程加密            {speed:8.1f} MB/s")
+
+        processes = 1
+        while True:
+            pool = EncryptionPool(processes, slot_size=chunk_size + 64, slots=THREADS)
+            try:
+                # 预热：启动子进程并映射共享内存
+                _bench_pool(path, encryptor, chunks[:THREADS], pool)
+                speed = _measure(lambda: _bench_pool(path, encryptor, chunks, pool), size)
+            finally:
+                pool.close()
+            print(f"进程池加密 {processes:>2} 进程  {speed:8.1f} MB/s")
+            if processes >= cores:
+                break
+            processes = min(processes * 2, cores)
+
+
+if __name__ == '__main__':
+    arguments = [int(arg) for arg in sys.argv[1:]]
+    run(*arguments)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+排除规则基准测试
+生成 100 多条规则（文件类型、通配符、相对目录名和绝对目录），对一批随机路径逐个判断是否排除：
+    1. 逐条匹配：与原 FileMonitor._is_excluded 相同的实现（每次导入 fnmatch、逐个模式匹配、逐个目录 relpath/split）
+    2. 编译规则：ExclusionRules.is_excluded（合并正则、后缀集合、路径分量前缀树）
+统计每个路径的平均判断耗时（微秒）。
+
+用法: python benchmarks/bench_exclude_rules.py [每类规则数] [路径数]
+"""
+import os
+import sys
+import time
+import random
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from modules.exclude_rules import ExclusionRules
+
+WATCH_DIR = '/data/share'
+
+
+def legacy_is_excluded(file_path, watch_dir, file_types, exclude_patterns, exclude_dirs):
+    """原 FileMonitor._is_excluded 的实现"""
+    import fnmatch
+    file_name = os.path.basename(file_path)
+    file_dir = os.path.dirname(file_path)
+
+    if file_types and not any(file_name.endswith(ext) for ext in file_types):
+        return True
+
+    for pattern in exclude_patterns:
+        if fnmatch.fnmatch(file_name, pattern):
+            return True
+
+    for exclude_dir in exclude_dirs:
+        if os.path.isabs(exclude_dir):
+            if file_dir.startswith(exclude_dir):
+                return True
+        else:
+            dir_components = file_dir.split(os.path.sep)
+            if exclude_dir in dir_components:
+                return True
+            rel_path = os.path.relpath(file_dir, watch_dir)
+            rel_components = rel_path.split(os.path.sep)
+            if exclude_dir in rel_components:
+                return True
+
+    return False
+
+
+def make_rules(count):
+    file_types = [f'.e{i}' for i in range(count)] + ['.jpg', '.mp4']
+    exclude_patterns = [f'*.tmp{i}' for i in range(count // 2)] + [f'~$doc{i}*' for i in range(count // 2)]
+    exclude_dirs = [f'cache{i}' for i in range(count // 2)] + \
+                   [f'{WATCH_DIR}/archive/{i}' for i in range(count // 2)]
+    return file_types, exclude_patterns, exclude_dirs
+
+
+def make_paths(number):
+    random.seed(0)
+    components = ['photos', '2024', '2025', 'album', 'archive', 'videos', 'work', 'raw'] + [str(i) for i in range(20)]
+    names = ['IMG_0001.jpg', 'clip.mp4', 'notes.e3', 'draft.tmp7', '~$doc2.docx', 'report.pdf']
+    paths = []
+    for _ in range(number):
+        depth = random.randint(1, 6)
+        paths.append(os.path.join(WATCH_DIR, *random.choices(components, k=depth), random.choice(names)))
+    return paths
+
+
+def _measure(func, paths, rounds=3):
+    """取多轮中的最好成绩，返回每个路径的耗时（微秒）和排除数"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        excluded = sum(1 for path in paths if func(path))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(paths) * 1e6, excluded
+
+
+def run(rules_per_kind=50, number=20000):
+    file_types, exclude_patterns, exclude_dirs = make_rules(rules_per_kind)
+    total_rules = len(file_types) + len(exclude_patterns) + len(exclude_dirs)
+    paths = make_paths(number)
+    print(f"规则 {total_rules} 条，路径 {number} 个")
+
+    legacy, legacy_excluded = _measure(
+        lambda path: legacy_is_excluded(path, WATCH_DIR, file_types, exclude_patterns, exclude_dirs), paths)
+    print(f"逐条匹配  {legacy:8.2f} 微秒/路径（排除 {legacy_excluded}）")
+
+    start = time.perf_counter()
+    rules = ExclusionRules(WATCH_DIR, file_types, exclude_patterns, exclude_dirs)
+    compile_ms = (time.perf_counter() - start) * 1000
+    compiled, compiled_excluded = _measure(rules.is_excluded, paths)
+    print(f"编译规则  {compiled:8.2f} 微秒/路径（排除 {compiled_excluded}，编译耗时 {compile_ms:.1f}毫秒）")
+    print(f"加速比    {legacy / compiled:8.1f}x")
+
+
+if __name__ == '__main__':
+    arguments = [int(arg) for arg in sys.argv[1:]]
+    run(*arguments)
@@ -3,12 +3,33 @@ import os
 import sys
 import time
 import argparse
+import signal
+import asyncio
 from datetime import datetime
 import threading
 import queue
+import stat
 import requests
 from modules import auth
-from modules.upload_new import encrypt_upload, auto_chunked_upload_optimized
+from modules.upload_new import encrypt_upload, auto_chunked_upload_optimized, choose_chunk_size, get_vip_type, \
+    prepare_upload_optimized, transfer_upload, commit_upload, resolve_chunk_size, expected_remote_size, VIP_UPLOAD_LIMITS
+from modules.upload_pipeline import UploadPipeline, DEFAULT_LOOKAHEAD
+from modules.async_upload import AsyncUploadEngine
+from modules.upload_journal import UploadJournal, DEFAULT_JOURNAL_DIR
+from modules.retry_policy import RetryPolicy
+from modules.upload_scheduler import configure_scheduler
+from modules.api_clients import configure_api_clients
+from modules.rate_limiter import configure_bandwidth_limiter
+from modules.encrypt_pool import configure_encryption_pool
+from modules.remote_index import configure_remote_index, get_remote_index, DEFAULT_INDEX_PATH
+from modules.file_state import FileStateStore, DEFAULT_STATE_PATH, upload_mode
+from modules.scanner import DirectoryScanner, DEFAULT_SCAN_WORKERS
+from modules.exclude_rules import ExclusionRules
+from modules.syncignore import DEFAULT_IGNORE_FILE
+from modules.debouncer import Debouncer
+from modules.upload_queue import UploadQueue, DEFAULT_QUEUE_SIZE, QUEUE_ORDERS
+from modules.queue_store import UploadQueueStore, DEFAULT_QUEUE_DB
+from modules.small_file_pack import SmallFilePacker, DEFAULT_PACK_SIZE, DEFAULT_PACK_AGE
 
 # 尝试导入pyinotify，如果不存在则提示安装
 try:
@@ -65,13 +86,47 @@ def refresh_access_token(config: dict) -> str:
         yaml.safe_dump(config, f)
     return access_token
 
-# 文件上传队列
-upload_queue = queue.Queue()
+def bandwidth_settings(config: dict, cli: dict) -> dict:
+    """
+    合并限速设置：命令行参数优先，其次为 config.yaml
+    
+    Args:
+        config (dict): config.yaml 的内容
+        cli (dict): 命令行中的 limit / schedule / burst，未指定的项为 None
+        
+    Returns:
+        dict: configure_bandwidth_limiter 的参数
+    """
+    return {
+        'limit': cli['limit'] if cli['limit'] is not None else config.get('UploadLimit', 0),
+        'schedule': cli['schedule'] or config.get('UploadLimitSchedule'),
+        'burst': cli['burst'] or config.get('UploadBurst'),
+    }
+
+def reload_bandwidth_limit(cli: dict):
+    """
+    重新读取 config.yaml 中的限速设置并立即生效，不需要重启上传线程
+    
+    Args:
+        cli (dict): 命令行中的限速设置，指定了的项仍然优先于配置文件
+    """
+    try:
+        limiter = configure_bandwidth_limiter(**bandwidth_settings(get_config() or {}, cli))
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚦 已重新加载上传限速: {limiter.describe()}")
+    except Exception as e:
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 重新加载上传限速失败: {str(e)}")
+
+# 文件上传队列（启动时按 --queue-size / --queue-order 重新创建）
+upload_queue = UploadQueue()
+
+# 访问令牌的检查间隔（秒）
+TOKEN_CHECK_INTERVAL = 3600
 
 class UploadWorker(threading.Thread):
     """处理上传队列的工作线程"""
     
-    def __init__(self, access_token, remote_base_dir, encrypt=False, password="123456", worker_id=0):
+    def __init__(self, access_token, remote_base_dir, encrypt=False, password="123456", worker_id=0, journal=None,
+                 retry_policy=None, chunk_size=None, packer=None, pipeline=None, segmented=False, file_state=None):
         super().__init__(daemon=True)
         self.access_token = access_token
         self.remote_base_dir = remote_base_dir
@@ -79,65 +134,223 @@ class UploadWorker(threading.Thread):
         self.password = password
         self.running = True
         self.worker_id = worker_id
+        self.journal = journal
+        self.retry_policy = retry_policy
+        self.chunk_size = chunk_size
+        self.packer = packer
+        self.pipeline = pipeline
+        self.segmented = segmented
+        self.file_state = file_state
+        self.upload_mode = upload_mode(encrypt, segmented)
+    
+    def upload_file(self, file_path, remote_path, show_progress=True):
+        """
+        上传单个文件（按设置加密或普通上传）
+        
+        Args:
+            file_path (str): 本地文件路径
+            remote_path (str): 远程文件路径
+            show_progress (bool): 是否显示进度
+            
+        Returns:
+            dict: 上传结果，失败返回 None
+        """
+        if self.encrypt:
+            return encrypt_upload(
+                access_token=self.access_token,
+                local_file_path=file_path,
+                remote_path=remote_path,
+                password=self.password,
+                show_progress=show_progress,
+                journal=self.journal,
+                retry_policy=self.retry_policy,
+                chunk_size=self.chunk_size,
+                segmented=self.segmented
+            )
+        return auto_chunked_upload_optimized(
+            access_token=self.access_token,
+            local_file_path=file_path,
+            remote_path=remote_path,
+            show_progress=show_progress,
+            journal=self.journal,
+            retry_policy=self.retry_policy,
+            chunk_size=self.chunk_size
+        )
+    
+    def resolve_remote_path(self, file_info):
+        """
+        根据队列中的文件信息构建远程路径
+        
+        Args:
+            file_info (tuple | str): (文件路径, 基础目录) 或文件路径
+            
+        Returns:
+            tuple: (本地文件路径, 远程文件路径)
+        """
+        if isinstance(file_info, tuple) and len(file_info) == 2:
+            file_path, base_dir = file_info
+        else:
+            file_path, base_dir = file_info, None
+        
+        # 构建远程路径，保持相对路径结构
+        if base_dir:
+            # 获取相对路径
+            rel_path = os.path.relpath(file_path, base_dir)
+            # 构建远程路径，保持相对路径结构
+            remote_path = os.path.join(self.remote_base_dir, rel_path).replace('\\', '/')
+        else:
+            # 如果没有提供基础目录，只使用文件名（兼容旧版本）
+            file_name = os.path.basename(file_path)
+            remote_path = os.path.join(self.remote_base_dir, file_name).replace('\\', '/')
+        
+        # 确保远程路径以/开头
+        if not remote_path.startswith('/'):
+            remote_path = '/' + remote_path
+        return file_path, remote_path
+    
+    def is_uploaded(self, file_path, remote_path):
+        """
+        根据远程文件索引判断文件是否已上传（远程大小与预期一致且不早于本地修改时间），已上传时返回 True
+        """
+        index = get_remote_index()
+        if index is None:
+            return False
+        entry = index.lookup(remote_path)
+        if entry is None or entry['isdir']:
+            return False
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return False
+        if entry['server_mtime'] < int(file_stat.st_mtime):
+            return False
+        if entry['size'] != expected_remote_size(file_stat.st_size, self.encrypt, self.password, self.segmented):
+            return False
+        self.remember(file_path, file_stat, remote_path, True)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏭️  远程文件已存在，跳过: {remote_path}")
+        return True
+    
+    def stat_file(self, file_path):
+        """上传前记录文件的 stat 信息（用于上传成功后更新文件状态库），文件不存在时返回 None"""
+        if self.file_state is None:
+            return None
+        try:
+            return os.stat(file_path)
+        except OSError:
+            return None
+    
+    def remember(self, file_path, file_stat, remote_path, result, md5=None):
+        """上传成功后删除持久化队列中的记录，并更新文件状态库（下次扫描时跳过未变化的文件）"""
+        if not result:
+            # 失败的文件保留在持久化队列中，下次启动时重新上传
+            return
+        upload_queue.mark_done(file_path)
+        if self.file_state is not None and file_stat is not None:
+            self.file_state.record(file_path, file_stat, remote_path, self.upload_mode, md5)
+    
+    def try_pack(self, file_path, remote_path):
+        """小文件追加到打包文件，整体上传；加入打包时返回 True"""
+        if not (self.packer and self.packer.accepts(file_path)):
+            return False
+        rel_path = remote_path[len(self.remote_base_dir):].lstrip('/') \
+            if remote_path.startswith(self.remote_base_dir) else remote_path.lstrip('/')
+        # 打包文件上传成功后由 packed 回调记录文件状态、删除持久化队列中的记录
+        file_stat = self.stat_file(file_path)
+        source = [file_path, remote_path]
+        if file_stat is not None:
+            source += [file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns]
+        if not self.packer.add(file_path, rel_path, source):
+            return False
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📦 线程-{self.worker_id} 已加入打包: {rel_path}")
+        return True
+    
+    def packed(self, sources):
+        """打包文件上传成功后的回调：记录其中每个文件的状态，并删除持久化队列中的记录"""
+        for file_path, remote_path, *key in sources:
+            file_stat = None
+            if key:
+                dev, inode, size, mtime_ns = key
+                file_stat = os.stat_result((0, inode, dev, 0, 0, 0, size, 0, 0, 0), {'st_mtime_ns': mtime_ns})
+            self.remember(file_path, file_stat, remote_path, True)
+    
+    def prepare(self, file_info):
+        """
+        流水线准备阶段：计算分片摘要并预上传（在流水线的准备线程中执行）
+        
+        Args:
+            file_info (tuple | str): 队列中的文件信息
+            
+        Returns:
+            PreparedUpload: 准备结果，文件已加入打包时返回 None
+        """
+        file_path, remote_path = self.resolve_remote_path(file_info)
+        if self.is_uploaded(file_path, remote_path) or self.try_pack(file_path, remote_path):
+            return None
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 准备上传文件: {file_path} -> {remote_path}")
+        return prepare_upload_optimized(
+            access_token=self.access_token,
+            local_file_path=file_path,
+            remote_path=remote_path,
+            encrypt=self.encrypt,
+            password=self.password,
+            journal=self.journal,
+            chunk_size=self.chunk_size,
+            segmented=self.segmented
+        )
+    
+    def commit(self, prepared):
+        """流水线提交阶段：合并分片（在流水线的提交线程中执行）"""
+        # 准备和提交之间令牌可能已刷新，使用当前令牌
+        prepared.access_token = self.access_token
+        return commit_upload(prepared)
+    
+    def committed(self, prepared, result):
+        """流水线合并完成后的回调"""
+        self.remember(prepared.local_file_path, prepared.file_stat, prepared.remote_path, result, prepared.content_md5)
+        self.report(prepared.local_file_path, result)
+    
+    def report(self, file_path, result):
+        """输出上传结果"""
+        file_name = os.path.basename(file_path)
+        if result:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ 线程-{self.worker_id} 上传成功: {file_name}")
+        else:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 线程-{self.worker_id} 上传失败: {file_name}")
     
     def run(self):
+        if self.pipeline is not None:
+            self.run_pipeline()
+            return
+        
         while self.running:
             try:
                 # 从队列获取文件，如果5秒内没有新文件则继续检查running状态
                 try:
                     # 获取文件路径和基础目录
                     file_info = upload_queue.get(timeout=5)
-                    if isinstance(file_info, tuple) and len(file_info) == 2:
-                        file_path, base_dir = file_info
-                    else:
-                        file_path, base_dir = file_info, None
                 except queue.Empty:
                     continue
                 
-                # 构建远程路径，保持相对路径结构
-                if base_dir:
-                    # 获取相对路径
-                    rel_path = os.path.relpath(file_path, base_dir)
-                    # 构建远程路径，保持相对路径结构
-                    remote_path = os.path.join(self.remote_base_dir, rel_path).replace('\\', '/')
-                else:
-                    # 如果没有提供基础目录，只使用文件名（兼容旧版本）
-                    file_name = os.path.basename(file_path)
-                    remote_path = os.path.join(self.remote_base_dir, file_name).replace('\\', '/')
+                file_path, remote_path = self.resolve_remote_path(file_info)
                 
-                # 确保远程路径以/开头
-                if not remote_path.startswith('/'):
-                    remote_path = '/' + remote_path
+                # 远程已存在的文件直接跳过；小文件追加到打包文件，整体上传
+                if self.is_uploaded(file_path, remote_path) or self.try_pack(file_path, remote_path):
+                    upload_queue.task_done()
+                    continue
                 
                 current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 print(f"[{current_time}] 线程-{self.worker_id} 开始上传文件: {file_path} -> {remote_path}")
                 
                 # 执行上传（加密或普通）
-                if self.encrypt:
-                    result = encrypt_upload(
-                        access_token=self.access_token,
-                        local_file_path=file_path,
-                        remote_path=remote_path,
-                        password=self.password
-                    )
-                else:
-                    result = auto_chunked_upload_optimized(
-                        access_token=self.access_token,
-                        local_file_path=file_path,
-                        remote_path=remote_path
-                    )
+                file_stat = self.stat_file(file_path)
+                result = self.upload_file(file_path, remote_path)
+                self.remember(file_path, file_stat, remote_path, result)
                 
                 # 标记任务完成
                 upload_queue.task_done()
                 
-                # 获取文件名用于输出
-                file_name = os.path.basename(file_path)
-                
                 # 输出上传结果
-                if result:
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ 线程-{self.worker_id} 上传成功: {file_name}")
-                else:
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 线程-{self.worker_id} 上传失败: {file_name}")
+                self.report(file_path, result)
                 
             except Exception as e:
                 print(f"线程-{self.worker_id} 上传过程中出错: {str(e)}  {file_path}")
@@ -148,14 +361,115 @@ class UploadWorker(threading.Thread):
                 except:
                     pass
     
+    def run_pipeline(self):
+        """流水线模式：只负责传输分片，准备和提交由流水线的后台线程完成"""
+        while self.running:
+            try:
+                file_info, prepared = self.pipeline.get(timeout=5)
+            except queue.Empty:
+                continue
+            
+            file_path = prepared.local_file_path
+            try:
+                # 秒传成功或预上传失败，无需传输
+                if prepared.finished:
+                    self.pipeline.done(file_info)
+                    self.remember(file_path, prepared.file_stat, prepared.remote_path, prepared.result,
+                                  prepared.content_md5)
+                    self.report(file_path, prepared.result)
+                    continue
+                
+                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                print(f"[{current_time}] 线程-{self.worker_id} 开始上传文件: {file_path} -> {prepared.remote_path}")
+                
+                prepared.access_token = self.access_token
+                if transfer_upload(prepared, retry_policy=self.retry_policy):
+                    # 合并请求异步执行，立即开始传输下一个文件；prepared 在提交时绑定，
+                    # 回调执行时本线程可能已经在处理下一个文件
+                    self.pipeline.submit_commit(file_info, prepared,
+                                                lambda item, result, prepared=prepared: self.committed(prepared, result))
+                else:
+                    self.pipeline.done(file_info)
+                    self.report(file_path, None)
+            except Exception as e:
+                print(f"线程-{self.worker_id} 上传过程中出错: {str(e)}  {file_path}")
+                self.pipeline.done(file_info)
+    
     def stop(self):
         self.running = False
 
+class AsyncUploadWorker(UploadWorker):
+    """
+    使用异步上传引擎处理上传队列的线程
+    
+    一个线程内的事件循环同时上传多个文件（最多 max_files 个），
+    分片并发数由 max_parts 限制，不再为每个上传槽位创建线程。
+    """
+    
+    def __init__(self, access_token, remote_base_dir, encrypt=False, password="123456", worker_id=0,
+                 retry_policy=None, chunk_size=None, packer=None, max_files=3, max_parts=9, segmented=False,
+                 file_state=None):
+        super().__init__(access_token, remote_base_dir, encrypt, password, worker_id,
+                         retry_policy=retry_policy, chunk_size=chunk_size, packer=packer, segmented=segmented,
+                         file_state=file_state)
+        self.max_files = max_files
+        self.max_parts = max_parts
+    
+    def run(self):
+        asyncio.run(self._serve())
+    
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        async with AsyncUploadEngine(self.access_token, self.max_parts, self.max_files, self.retry_policy) as engine:
+            while self.running:
+                # 正在上传的文件已达上限时先等待其中一个完成
+                if len(tasks) >= self.max_files:
+                    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    file_info = await loop.run_in_executor(None, upload_queue.get, True, 5)
+                except queue.Empty:
+                    continue
+                
+                file_path, remote_path = self.resolve_remote_path(file_info)
+                if await loop.run_in_executor(None, self.is_uploaded, file_path, remote_path) or \
+                        await loop.run_in_executor(None, self.try_pack, file_path, remote_path):
+                    upload_queue.task_done()
+                    continue
+                
+                task = asyncio.create_task(self._upload(engine, file_path, remote_path))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            
+            if tasks:
+                await asyncio.wait(tasks)
+    
+    async def _upload(self, engine, file_path, remote_path):
+        loop = asyncio.get_running_loop()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 异步引擎开始上传文件: {file_path} -> {remote_path}")
+        file_stat = self.stat_file(file_path)
+        try:
+            file_size = os.path.getsize(file_path)
+            chunk_size = await loop.run_in_executor(None, resolve_chunk_size, self.access_token, file_size,
+                                                    self.chunk_size)
+            # 令牌每小时刷新一次（FileMonitor 更新 self.access_token），每次上传使用当前令牌
+            result = await engine.upload(file_path, remote_path, chunk_size, encrypt=self.encrypt,
+                                         password=self.password, segmented=self.segmented,
+                                         access_token=self.access_token)
+        except Exception as e:
+            print(f"异步引擎上传过程中出错: {str(e)}  {file_path}")
+            result = None
+        finally:
+            upload_queue.task_done()
+        self.remember(file_path, file_stat, remote_path, result)
+        self.report(file_path, result)
+
 class FileMonitor:
     """监控目录文件变化的类，使用inotify机制"""
     
     def __init__(self, watch_dir, recursive=True, file_types=None, min_size=0, 
-                 cooldown=2, exclude_patterns=None, exclude_dirs=None, config=None, upload_workers=None):
+                 cooldown=2, exclude_patterns=None, exclude_dirs=None, config=None, upload_workers=None, rules=None):
         """
         初始化文件监控器
         
@@ -164,11 +478,12 @@ class FileMonitor:
             recursive (bool): 是否递归监控子目录
             file_types (list): 要监控的文件类型列表，如['.jpg', '.pdf']，None表示所有类型
             min_size (int): 最小文件大小(字节)，小于此大小的文件不会触发上传
-            cooldown (int): 文件冷却时间(秒)，新文件创建后等待此时间再上传，避免上传未完成的文件
+            cooldown (int): 文件冷却时间(秒)，最后一次写入后等待此时间再上传，避免上传未完成的文件（写入完成的文件立即上传）
             exclude_patterns (list): 要排除的文件名模式列表，支持通配符
             exclude_dirs (list): 要排除的目录名称或路径列表
             config (dict): 配置字典，用于刷新令牌
             upload_workers (list): 上传工作线程列表，用于更新令牌
+            rules (ExclusionRules, optional): 编译好的排除规则（与存量扫描共用），不提供时按上面的参数编译
         """
         self.watch_dir = os.path.abspath(watch_dir)
         self.recursive = recursive
@@ -177,10 +492,14 @@ class FileMonitor:
         self.cooldown = cooldown
         self.exclude_patterns = exclude_patterns or []
         self.exclude_dirs = exclude_dirs or []
-        self.pending_files = {}  # 待处理文件字典 {文件路径: 首次检测时间}
+        # 待处理文件：每次写入事件都推迟截止时间，到期后加入上传队列
+        self.debouncer = Debouncer(self._enqueue_file, cooldown)
+        # 去抖中的文件上一版本上传完成时，保留持久化队列中的记录
+        upload_queue.add_holder(self.debouncer)
         self.config = config
         self.upload_workers = upload_workers
         self.last_token_check = time.time()  # 上次检查令牌的时间
+        self.rules = rules or ExclusionRules(self.watch_dir, file_types, exclude_patterns, exclude_dirs)
         
         # 确保监控目录存在
         if not os.path.exists(self.watch_dir):
@@ -188,82 +507,90 @@ class FileMonitor:
         
         # 创建watch manager
         self.wm = pyinotify.WatchManager()
-        # 监控文件创建和修改事件
-        self.mask = pyinotify.IN_CREATE | pyinotify.IN_CLOSE_WRITE
+        # 监控文件创建、写入和写入完成事件
+        self.mask = pyinotify.IN_CREATE | pyinotify.IN_MODIFY | pyinotify.IN_CLOSE_WRITE
+        # .syncignore 被删除或移动时也需要重新加载规则
+        if self.rules.syncignore is not None:
+            self.mask |= pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO
     
     def _is_excluded(self, file_path):
         """检查文件是否应该被排除"""
-        import fnmatch
-        file_name = os.path.basename(file_path)
-        file_dir = os.path.dirname(file_path)
-        
-        # 检查文件类型
-        if self.file_types and not any(file_name.endswith(ext) for ext in self.file_types):
-            return True
-        
-        # 检查排除模式
-        for pattern in self.exclude_patterns:
-            if fnmatch.fnmatch(file_name, pattern):
-                return True
-        
-        # 检查排除目录
-        for exclude_dir in self.exclude_dirs:
-            # 检查是否为绝对路径
-            if os.path.isabs(exclude_dir):
-                # 如果文件位于排除目录下
-                if file_dir.startswith(exclude_dir):
-                    return True
-            else:
-                # 如果是相对目录名，检查文件的父目录名或路径中是否包含该目录
-                dir_components = file_dir.split(os.path.sep)
-                if exclude_dir in dir_components:
-                    return True
-                
-                # 还需要检查相对于监控目录的路径
-                rel_path = os.path.relpath(file_dir, self.watch_dir)
-                rel_components = rel_path.split(os.path.sep)
-                if exclude_dir in rel_components:
-                    return True
-        
-        return False
+        return self.rules.is_excluded(file_path)
     
-    def _process_pending_files(self):
-        """处理待上传的文件"""
-        current_time = time.time()
-        files_to_remove = []
-        
-        # 检查访问令牌是否过期，每小时检查一次
-        if self.config and self.upload_workers and current_time - self.last_token_check > 3600:
-            self.last_token_check = current_time
-            if is_token_expired(self.config):
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 访问令牌已过期或即将过期，正在刷新...")
-                try:
-                    new_token = refresh_access_token(self.config)
-                    # 更新所有上传工作线程的访问令牌
-                    for worker in self.upload_workers:
-                        worker.access_token = new_token
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 访问令牌已刷新")
-                except Exception as e:
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 刷新访问令牌失败: {e}")
-        
-        for file_path, detected_time in list(self.pending_files.items()):
-            # 检查文件是否已存在足够长时间
-            if current_time - detected_time >= self.cooldown:
-                # 检查文件是否仍然存在
-                if os.path.exists(file_path) and os.path.isfile(file_path):
-                    # 检查文件大小
-                    file_size = os.path.getsize(file_path)
-                    if file_size >= self.min_size:
-                        # 将文件添加到上传队列，同时传递监控目录路径
-                        upload_queue.put((file_path, self.watch_dir))
-                        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 将文件加入上传队列: {file_path}")
-                
-                # 从待处理列表中移除
-                files_to_remove.append(file_path)
+    def _add_watches(self, top):
+        """
+        从 top 开始逐级添加目录监控，被排除的目录整体跳过（既不监控也不遍历）
         
-        # 移除已处理的文件
-        for file_path in files_to_remove:
-            self.pending_files.pop(file_path, None)
+        Returns:
+            int: 新增的监控数
+        """
+        added = 0
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            if self.wm.get_wd(directory) is None:
+                # 之后新建的子目录由 pyinotify 自动添加监控，同样经过排除规则过滤
+                result = self.wm.add_watch(directory, self.mask, rec=False, auto_add=True,
+                                           exclude_filter=self.rules.is_excluded_dir)
+                if result.get(directory, -1) > 0:
+                    added += 1
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False) and \
+                                not self.rules.excludes_subdir(entry.path, entry.name):
+                            stack.append(entry.path)
+            except OSError as e:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️  无法读取目录 {directory}: {e}")
+        return added
+    
+    def reload_ignore_file(self, directory):
+        """
+        某个目录中的 .syncignore 发生变化：重新加载规则，
+        移除新被排除的目录上的监控，为不再被排除的目录添加监控
+        """
+        self.rules.syncignore.invalidate(directory)
+        if not self.recursive:
+            return
+        prefix = directory.rstrip(os.sep) + os.sep
+        removed = 0
+        for wd, watch in list(self.wm.watches.items()):
+            if watch.path.startswith(prefix) and self.rules.is_excluded_dir(watch.path):
+                self.wm.rm_watch(wd)
+                removed += 1
+        added = self._add_watches(directory) if not self.rules.is_excluded_dir(directory) else 0
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 已重新加载 {os.path.join(directory, self.rules.syncignore.file_name)}"
+              f"，移除 {removed} 个目录监控，新增 {added} 个")
+    
+    def _check_token(self):
+        """检查访问令牌是否过期，过期时刷新并更新所有上传工作线程"""
+        if not (self.config and self.upload_workers):
+            return
+        self.last_token_check = time.time()
+        if is_token_expired(self.config):
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 访问令牌已过期或即将过期，正在刷新...")
+            try:
+                new_token = refresh_access_token(self.config)
+                # 更新所有上传工作线程的访问令牌
+                for worker in self.upload_workers:
+                    worker.access_token = new_token
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 访问令牌已刷新")
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 刷新访问令牌失败: {e}")
+    
+    def _enqueue_file(self, file_path):
+        """去抖到期的文件：仍然存在且满足大小要求时加入上传队列（在去抖线程中执行）"""
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            upload_queue.mark_done(file_path)
+            return
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < self.min_size:
+            upload_queue.mark_done(file_path)
+            return
+        # 将文件添加到上传队列，同时传递监控目录路径
+        upload_queue.put((file_path, self.watch_dir))
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 将文件加入上传队列: {file_path}")
     
     def start_monitoring(self):
         """开始监控文件系统事件"""
@@ -275,7 +602,8 @@ class FileMonitor:
         
         # 添加要监控的目录
         if self.recursive:
-            self.wm.add_watch(self.watch_dir, self.mask, rec=True, auto_add=True)
+            watch_count = self._add_watches(self.watch_dir)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 已添加 {watch_count} 个目录监控（被排除的目录不监控）")
         else:
             self.wm.add_watch(self.watch_dir, self.mask)
         
@@ -285,9 +613,10 @@ class FileMonitor:
         print("按 Ctrl+C 停止监控")
         print("-" * 60)
         
-        # 启动处理线程
-        processor_thread = threading.Thread(target=self._pending_file_processor, daemon=True)
-        processor_thread.start()
+        # 启动去抖线程和令牌检查线程
+        self.debouncer.start()
+        token_thread = threading.Thread(target=self._token_checker, daemon=True)
+        token_thread.start()
         
         try:
             # 开始监控循环
@@ -297,12 +626,13 @@ class FileMonitor:
         finally:
             # 确保资源被正确释放
             notifier.stop()
+            self.debouncer.stop()
     
-    def _pending_file_processor(self):
-        """后台线程，定期处理待上传文件"""
+    def _token_checker(self):
+        """后台线程，每小时检查一次访问令牌"""
         while True:
-            self._process_pending_files()
-            time.sleep(1)  # 每秒检查一次
+            time.sleep(TOKEN_CHECK_INTERVAL)
+            self._check_token()
 
 class FileEventHandler(pyinotify.ProcessEvent):
     """处理inotify事件的类"""
@@ -319,30 +649,63 @@ class FileEventHandler(pyinotify.ProcessEvent):
         
         self._handle_file_event(event.pathname)
     
+    def process_IN_MODIFY(self, event):
+        """处理文件写入事件（推迟上传）"""
+        if event.dir:
+            return
+        
+        self._handle_file_event(event.pathname)
+    
     def process_IN_CLOSE_WRITE(self, event):
         """处理文件写入完成事件"""
         # 忽略目录
         if event.dir:
             return
         
-        self._handle_file_event(event.pathname)
+        self._check_ignore_file(event)
+        self._handle_file_event(event.pathname, closed=True)
+    
+    def process_IN_DELETE(self, event):
+        """处理文件删除事件（只关心 .syncignore）"""
+        self._check_ignore_file(event)
+    
+    def process_IN_MOVED_FROM(self, event):
+        self._check_ignore_file(event)
     
-    def _handle_file_event(self, file_path):
+    def process_IN_MOVED_TO(self, event):
+        self._check_ignore_file(event)
+    
+    def _check_ignore_file(self, event):
+        """.syncignore 被修改、删除或移动时重新加载规则"""
+        syncignore = self.monitor.rules.syncignore
+        if not event.dir and syncignore is not None and event.name == syncignore.file_name:
+            self.monitor.reload_ignore_file(event.path)
+    
+    def _handle_file_event(self, file_path, closed=False):
         """处理文件事件的通用方法"""
+        debouncer = self.monitor.debouncer
+        # 正在写入的文件已检查过排除规则，只需推迟截止时间
+        if file_path in debouncer:
+            debouncer.touch(file_path, closed)
+            return
+        
         # 如果文件应该被排除，则忽略
         if self.monitor._is_excluded(file_path):
             return
         
-        # 如果文件不在待处理列表中，添加它
-        if file_path not in self.monitor.pending_files:
-            current_time = time.time()
-            self.monitor.pending_files[file_path] = current_time
+        # 新文件加入待处理列表
+        if debouncer.touch(file_path, closed):
+            # 写入持久化队列，去抖期间进程退出也不会漏传
+            upload_queue.track((file_path, self.monitor.watch_dir))
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 检测到新文件: {file_path}")
 
-def scan_and_upload_existing_files(watch_dir, recursive=True, file_types=None, min_size=0, exclude_patterns=None, exclude_dirs=None):
+def scan_and_upload_existing_files(watch_dir, recursive=True, file_types=None, min_size=0, exclude_patterns=None, exclude_dirs=None,
+                                   file_state=None, workers=DEFAULT_SCAN_WORKERS, rules=None, uploader=None):
     """
     扫描目录中已存在的文件并添加到上传队列
     
+    多个线程并发扫描不同的子目录，找到的文件立即加入上传队列（上传与扫描同时进行）。
+    
     Args:
         watch_dir (str): 要扫描的目录
         recursive (bool): 是否递归扫描子目录
@@ -350,106 +713,36 @@ def scan_and_upload_existing_files(watch_dir, recursive=True, file_types=None, m
         min_size (int): 最小文件大小(字节)，小于此大小的文件不会上传
         exclude_patterns (list): 要排除的文件名模式列表，支持通配符
         exclude_dirs (list): 要排除的目录名称或路径列表
+        file_state (FileStateStore, optional): 文件状态库，提供时跳过上次上传后未变化的文件
+        workers (int): 扫描线程数
+        rules (ExclusionRules, optional): 编译好的排除规则（与文件监控共用），不提供时按上面的参数编译
+        uploader (UploadWorker, optional): 提供远程路径和上传方式，与状态库中的记录比较；
+            不提供时状态库中的记录都视为已变化
         
     Returns:
         int: 添加到上传队列的文件数量
     """
-    import fnmatch
-    
-    def is_excluded(file_path):
-        """检查文件是否应该被排除"""
-        file_name = os.path.basename(file_path)
-        file_dir = os.path.dirname(file_path)
-        
-        # 检查文件类型
-        if file_types and not any(file_name.endswith(ext) for ext in file_types):
-            return True
-        
-        # 检查排除模式
-        for pattern in exclude_patterns or []:
-            if fnmatch.fnmatch(file_name, pattern):
-                return True
-        
-        # 检查排除目录
-        for exclude_dir in exclude_dirs or []:
-            # 检查是否为绝对路径
-            if os.path.isabs(exclude_dir):
-                # 如果文件位于排除目录下
-                if file_dir.startswith(exclude_dir):
-                    return True
-            else:
-                # 如果是相对目录名，检查文件的父目录名或路径中是否包含该目录
-                dir_components = file_dir.split(os.path.sep)
-                if exclude_dir in dir_components:
-                    return True
-                
-                # 还需要检查相对于监控目录的路径
-                rel_path = os.path.relpath(file_dir, watch_dir)
-                rel_components = rel_path.split(os.path.sep)
-                if exclude_dir in rel_components:
-                    return True
-        
-        return False
-    
-    count = 0
     watch_dir = os.path.abspath(watch_dir)
     
-    # 遍历目录
-    for root, dirs, files in os.walk(watch_dir):
-        # 如果不递归且不是根目录，跳过
-        if not recursive and root != watch_dir:
-            continue
-        
-        # 根据排除目录列表从当前搜索中排除目录
-        if exclude_dirs:
-            # 使用副本进行修改，避免影响原始 dirs 列表
-            dirs_to_remove = []
-            for d in dirs:
-                dir_path = os.path.join(root, d)
-                
-                # 检查是否为排除目录
-                for exclude_dir in exclude_dirs:
-                    # 如果是绝对路径
-                    if os.path.isabs(exclude_dir) and dir_path.startswith(exclude_dir):
-                        dirs_to_remove.append(d)
-                        break
-                    
-                    # 如果是相对路径
-                    rel_path = os.path.relpath(dir_path, watch_dir)
-                    rel_components = rel_path.split(os.path.sep)
-                    
-                    if exclude_dir in rel_components or d == exclude_dir:
-                        dirs_to_remove.append(d)
-                        break
-            
-            # 从搜索列表中移除排除目录
-            for d in dirs_to_remove:
-                dirs.remove(d)
-            
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            
-            # 检查排除规则
-            if is_excluded(file_path):
-                continue
-                
-            # 检查文件大小
-            try:
-                file_size = os.path.getsize(file_path)
-                if file_size < min_size:
-                    continue
-            except (OSError, IOError):
-                continue
-                
-            # 添加到上传队列
+    def emit(file_path):
+        # 启动时从持久化队列恢复、仍在等待的文件不再重复加入
+        if file_path not in upload_queue:
             upload_queue.put((file_path, watch_dir))
-            count += 1
-            
-        # 如果不递归，只处理顶级目录后就退出
-        if not recursive:
-            break
-            
-    return count
+    
+    scanner = DirectoryScanner(
+        watch_dir,
+        emit=emit,
+        recursive=recursive,
+        rules=rules or ExclusionRules(watch_dir, file_types, exclude_patterns, exclude_dirs),
+        min_size=min_size,
+        file_state=file_state,
+        workers=workers,
+        remote_path_of=(lambda file_path: uploader.resolve_remote_path((file_path, watch_dir))[1]) if uploader else None,
+        mode=uploader.upload_mode if uploader else None
+    )
+    progress = scanner.run()
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 扫描完成，耗时 {progress.snapshot()['elapsed']:.1f}秒: {progress.describe()}")
+    return progress.enqueued
 
 def if_accesstoken_valid(access_token) -> bool:
     url = f"https://pan.baidu.com/rest/2.0/xpan/nas?access_token={access_token}&method=uinfo&vip_version=v2"
@@ -490,6 +783,8 @@ if __name__ == '__main__':
                         help="百度网盘中的目标目录，默认为/apps/autoSync")
     parser.add_argument("-e", "--encrypt", action="store_true",
                         help="是否加密上传文件",default=False)
+    parser.add_argument("--segmented", action="store_true",
+                        help="加密上传时使用分段加密格式，恢复时可以只下载并解密需要的区间")
     parser.add_argument("-p", "--password", default="123456",
                         help="加密密码，默认为123456")
     parser.add_argument("-n", "--no-recursive", action="store_true",
@@ -499,7 +794,7 @@ if __name__ == '__main__':
     parser.add_argument("-s", "--min-size", type=int, default=0,
                         help="最小文件大小(字节)，小于此大小的文件不会上传")
     parser.add_argument("-c", "--cooldown", type=int, default=2,
-                        help="文件冷却时间(秒)，新文件创建后等待此时间再上传")
+                        help="文件冷却时间(秒)，最后一次写入后等待此时间再上传（写入完成的文件立即上传）")
     parser.add_argument("-x", "--exclude", 
                         help="要排除的文件名模式，逗号分隔，如'*.tmp,~*'")
     parser.add_argument("-X", "--exclude-dirs",
@@ -508,6 +803,54 @@ if __name__ == '__main__':
                         help="是否上传监控目录中已存在的文件",default=False)
     parser.add_argument("-w", "--workers", type=int, default=3,
                         help="上传工作线程数，默认为3")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR,
+                        help=f"断点续传日志目录，默认为{DEFAULT_JOURNAL_DIR}")
+    parser.add_argument("--upload-slots", type=int,
+                        help="全局并发上传的分片数（所有文件共享），默认为工作线程数的3倍")
+    parser.add_argument("--chunk-size", type=int,
+                        help="分片大小(MB)，须为4的整数倍且不超过会员上限(普通4/会员16/超级会员32)，不设置则自动选择")
+    parser.add_argument("--chunk-retries", type=int, default=5,
+                        help="单个分片的最大尝试次数，默认为5")
+    parser.add_argument("--retry-delay", type=float, default=1.0,
+                        help="分片首次重试前的等待时间(秒)，之后按指数退避，默认为1")
+    parser.add_argument("--upload-limit", type=int,
+                        help="上传限速(KB/s)，0表示不限速，也可在config.yaml中设置UploadLimit")
+    parser.add_argument("--upload-limit-schedule",
+                        help="按时间段限速，如'01:00-07:00=0;07:00-01:00=2048'(KB/s，0为不限速)，也可在config.yaml中设置UploadLimitSchedule")
+    parser.add_argument("--upload-burst", type=int,
+                        help="限速时允许的突发流量(KB)，默认为1秒的流量")
+    parser.add_argument("--pack-threshold", type=int, default=0,
+                        help="小于此大小(KB)的文件打包后上传，0表示不打包，默认为0")
+    parser.add_argument("--pack-size", type=int, default=DEFAULT_PACK_SIZE // (1024 * 1024),
+                        help=f"打包文件达到此大小(MB)时上传，默认为{DEFAULT_PACK_SIZE // (1024 * 1024)}")
+    parser.add_argument("--pack-age", type=int, default=DEFAULT_PACK_AGE,
+                        help=f"打包文件最多等待多少秒后上传，默认为{DEFAULT_PACK_AGE}")
+    parser.add_argument("--lookahead", type=int, default=DEFAULT_LOOKAHEAD,
+                        help=f"上传当前文件时提前计算摘要并预上传的文件数，0表示逐个处理，默认为{DEFAULT_LOOKAHEAD}")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread",
+                        help="上传引擎：thread 为多线程（默认，支持断点续传日志），async 为单线程异步引擎（需要 aiohttp）")
+    parser.add_argument("--encrypt-processes", type=int, default=0,
+                        help="加密上传时用于加密分片的进程数，0表示在上传线程中加密，默认为0")
+    parser.add_argument("--remote-index", nargs='?', const=DEFAULT_INDEX_PATH,
+                        help=f"启用远程文件索引（SQLite），跳过网盘中已存在的未修改文件，默认索引为 {DEFAULT_INDEX_PATH}")
+    parser.add_argument("--refresh-index", action="store_true",
+                        help="启动时从网盘重新拉取远程目录的文件列表刷新索引（需要 --remote-index）")
+    parser.add_argument("--file-state", default=DEFAULT_STATE_PATH,
+                        help=f"本地文件状态库路径，-u 扫描时跳过上次上传后未变化的文件，默认为 {DEFAULT_STATE_PATH}")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="-u 扫描时忽略文件状态库，重新上传所有文件")
+    parser.add_argument("--ignore-file", default=DEFAULT_IGNORE_FILE,
+                        help=f"各级目录中的排除规则文件名（gitignore 语法），默认为 {DEFAULT_IGNORE_FILE}，设为空字符串则不使用")
+    parser.add_argument("--scan-workers", type=int, default=DEFAULT_SCAN_WORKERS,
+                        help=f"-u 扫描已存在文件时的并发线程数，默认为{DEFAULT_SCAN_WORKERS}")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"上传队列容量，队列满时暂停扫描和入队，0表示不限制，默认为{DEFAULT_QUEUE_SIZE}")
+    parser.add_argument("--queue-order", choices=QUEUE_ORDERS, default="fifo",
+                        help="上传顺序：fifo 先进先出（默认），smallest 小文件优先，newest 最近修改的优先，prefix 按 --queue-prefixes 的顺序")
+    parser.add_argument("--queue-prefixes",
+                        help="--queue-order prefix 时优先上传的路径前缀，逗号分隔，越靠前越优先，如'./docs,./photos'")
+    parser.add_argument("--queue-db", default=DEFAULT_QUEUE_DB,
+                        help=f"持久化上传队列路径，重启后继续上传未完成的文件，默认为 {DEFAULT_QUEUE_DB}，设为空字符串则不持久化")
     parser.add_argument("--auth-code",
                         help="授权码，用于获取访问令牌")
     
@@ -528,6 +871,12 @@ if __name__ == '__main__':
     if args.exclude_dirs:
         exclude_dirs = [d.strip() for d in args.exclude_dirs.split(',')]
     
+    # 有界的上传队列，须在上传线程启动前创建；未完成的文件同时记录在持久化队列中
+    queue_prefixes = [p.strip() for p in args.queue_prefixes.split(',')] if args.queue_prefixes else []
+    queue_store = UploadQueueStore(args.queue_db) if args.queue_db else None
+    upload_queue = UploadQueue(max(0, args.queue_size), order=args.queue_order, prefixes=queue_prefixes,
+                               store=queue_store)
+    
     try:
         # 获取配置和访问令牌
         config = get_config()
@@ -558,23 +907,143 @@ if __name__ == '__main__':
             access_token = get_access_token(config, args.auth_code)
             
         
+        # 断点续传日志，启动时清理已过期的会话
+        journal = UploadJournal(args.journal_dir)
+        expired_count = journal.expire()
+        if expired_count:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 已清理 {expired_count} 个过期的断点续传会话")
+        
+        # 本地文件状态库：记录已上传文件的 stat 信息
+        file_state = FileStateStore(args.file_state)
+        
+        # 手动指定的分片大小需符合账号会员等级的限制
+        chunk_size = None
+        if args.chunk_size:
+            chunk_size = choose_chunk_size(0, get_vip_type(access_token), args.chunk_size * 1024 * 1024)
+        
+        # 全局分片上传调度器，所有文件共享固定数量的上传连接
+        upload_slots = max(1, args.upload_slots or args.workers * 3)
+        configure_scheduler(upload_slots)
+        # 共享连接池大小与上传槽位数一致，每个槽位都能保持一条 keep-alive 连接
+        configure_api_clients(upload_slots)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 全局上传槽位数: {upload_slots}")
+        
+        # 全局上传限速：命令行参数优先，其次为 config.yaml
+        bandwidth_cli = {'limit': args.upload_limit, 'schedule': args.upload_limit_schedule, 'burst': args.upload_burst}
+        limiter = configure_bandwidth_limiter(**bandwidth_settings(config, bandwidth_cli))
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 上传限速: {limiter.describe()}")
+        # 修改 config.yaml 后发送 SIGHUP 即可调整限速（kill -HUP <pid>）
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: reload_bandwidth_limit(bandwidth_cli))
+        
+        # 加密进程池：每个上传槽位一块共享内存缓冲区，大小按会员的最大分片计算
+        encrypt_processes = args.encrypt_processes or config.get('EncryptProcesses', 0)
+        if args.encrypt and encrypt_processes > 0:
+            slot_size = VIP_UPLOAD_LIMITS[get_vip_type(access_token)][0] + 64
+            configure_encryption_pool(encrypt_processes, slot_size=slot_size, slots=upload_slots)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 加密进程数: {encrypt_processes}")
+        
+        # 远程文件索引：上传成功后增量更新，--refresh-index 时先全量刷新
+        remote_index_path = args.remote_index or config.get('RemoteIndex')
+        if remote_index_path:
+            remote_index = configure_remote_index(remote_index_path)
+            if args.refresh_index:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始刷新远程文件索引: {args.remote_dir}")
+                try:
+                    fetched, removed = remote_index.refresh(access_token, args.remote_dir)
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 远程文件索引刷新完成: {fetched} 个条目，清理 {removed} 条过期记录")
+                except Exception as e:
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 刷新远程文件索引失败，继续使用现有索引: {e}")
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 远程文件索引: {remote_index_path}（{remote_index.count()} 条记录）")
+        
+        # 分片重试策略
+        retry_policy = RetryPolicy(max_attempts=max(1, args.chunk_retries), base_delay=args.retry_delay)
+        
         # 创建多个上传工作线程
         upload_workers = []
         num_workers = max(1, args.workers)  # 至少创建1个线程
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 创建 {num_workers} 个上传工作线程")
+        if args.engine == 'thread':
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 创建 {num_workers} 个上传工作线程")
+        
+        # 不在队列上工作的 UploadWorker，负责上传打包文件以及流水线的准备和提交阶段
+        uploader = UploadWorker(
+            access_token=access_token,
+            remote_base_dir=args.remote_dir,
+            encrypt=args.encrypt,
+            password=args.password,
+            journal=journal,
+            retry_policy=retry_policy,
+            chunk_size=chunk_size,
+            segmented=args.segmented,
+            file_state=file_state
+        )
+        
+        # 小文件打包
+        packer = None
+        if args.pack_threshold > 0:
+            packer = SmallFilePacker(
+                upload_func=lambda local_path, remote_path: uploader.upload_file(local_path, remote_path, False),
+                remote_dir=args.remote_dir,
+                threshold=args.pack_threshold * 1024,
+                pack_size=args.pack_size * 1024 * 1024,
+                max_age=args.pack_age,
+                on_uploaded=uploader.packed
+            )
+            uploader.packer = packer
+            recovered = packer.recover()
+            if recovered:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 已补传 {recovered} 个上次未上传的打包文件")
+            packer.start()
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 小于 {args.pack_threshold}KB 的文件将打包上传")
+        
+        # 前瞻流水线：提前为后面的文件计算摘要并预上传，合并请求异步执行
+        pipeline = None
+        if args.lookahead > 0 and args.engine == 'thread':
+            pipeline = UploadPipeline(upload_queue, uploader.prepare, uploader.commit, lookahead=args.lookahead)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 上传流水线已启用，提前准备 {args.lookahead} 个文件")
         
-        for i in range(num_workers):
+        if args.engine == 'async':
+            # 异步引擎：一个线程内并发上传 num_workers 个文件，分片并发数与全局上传槽位数一致
+            worker = AsyncUploadWorker(
+                access_token=access_token,
+                remote_base_dir=args.remote_dir,
+                encrypt=args.encrypt,
+                password=args.password,
+                worker_id=1,
+                retry_policy=retry_policy,
+                chunk_size=chunk_size,
+                packer=packer,
+                max_files=num_workers,
+                max_parts=upload_slots,
+                segmented=args.segmented,
+                file_state=file_state
+            )
+            worker.start()
+            upload_workers.append(worker)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用异步上传引擎，并发文件数 {num_workers}，并发分片数 {upload_slots}")
+        
+        for i in range(num_workers if args.engine == 'thread' else 0):
             worker = UploadWorker(
                 access_token=access_token,
                 remote_base_dir=args.remote_dir,
                 encrypt=args.encrypt,
                 password=args.password,
-                worker_id=i+1
+                worker_id=i+1,
+                journal=journal,
+                retry_policy=retry_policy,
+                chunk_size=chunk_size,
+                packer=packer,
+                pipeline=pipeline,
+                segmented=args.segmented,
+                file_state=file_state
             )
             worker.start()
             upload_workers.append(worker)
         
         # 创建文件监控器
+        # 排除规则只编译一次，文件监控和存量扫描共用
+        rules = ExclusionRules(args.directory, file_types, exclude_patterns, exclude_dirs, ignore_file=args.ignore_file or None)
+        
         monitor = FileMonitor(
             watch_dir=args.directory,
             recursive=not args.no_recursive,
@@ -584,9 +1053,16 @@ if __name__ == '__main__':
             exclude_patterns=exclude_patterns,
             exclude_dirs=exclude_dirs,
             config=config,
-            upload_workers=upload_workers
+            # 打包文件通过 uploader 上传，它的令牌也需要随工作线程一起刷新
+            upload_workers=upload_workers + [uploader],
+            rules=rules
         )
         
+        # 恢复上次运行时未完成的上传（上传线程已启动，队列满时在此等待）
+        replayed = upload_queue.replay()
+        if replayed:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 已恢复 {replayed} 个上次未完成的上传")
+        
         # 如果指定了上传现有文件
         if args.upload_existing:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始扫描并上传已存在的文件...")
@@ -596,12 +1072,26 @@ if __name__ == '__main__':
                 file_types=file_types,
                 min_size=args.min_size,
                 exclude_patterns=exclude_patterns,
-                exclude_dirs=exclude_dirs
+                exclude_dirs=exclude_dirs,
+                file_state=None if args.full_rescan else file_state,
+                workers=args.scan_workers,
+                rules=rules,
+                uploader=uploader
             )
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 已添加 {uploaded_count} 个现有文件到上传队列")
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📊 {upload_queue.describe()}")
         
         # 启动文件监控
         monitor.start_monitoring()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📊 {upload_queue.describe()}")
+        
+        if packer:
+            packer.stop()
+        configure_encryption_pool(0)
+        configure_remote_index(None)
+        file_state.close()
+        if queue_store is not None:
+            queue_store.close()
         
     except Exception as e:
         print(f"错误: {str(e)}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+共享 API 客户端模块
+为每个百度网盘接口域名维护一个长期存活的 ApiClient，
+复用其中 urllib3 连接池的 keep-alive 连接，避免每个请求都重新进行 TCP 和 TLS 握手。
+"""
+import copy
+import threading
+
+import openapi_client
+
+# 百度网盘开放平台使用的接口域名
+PAN_HOST = 'pan.baidu.com'          # 预上传、合并、文件信息等
+PCS_HOST = 'd.pcs.baidu.com'        # 分片上传
+OAUTH_HOST = 'openapi.baidu.com'    # 授权
+
+# 默认每个域名保持的连接数
+DEFAULT_POOL_SIZE = 10
+
+
+class ApiClientRegistry:
+    """
+    线程安全的 ApiClient 注册表
+
+    每个域名对应一个 ApiClient，其连接池大小与上传并发数一致，
+    所有线程共享同一组连接。ApiClient 的同步请求本身是线程安全的
+    （底层 urllib3.PoolManager 线程安全）。
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, configuration=None):
+        """
+        Args:
+            pool_size (int): 每个域名保持的最大连接数
+            configuration (Configuration, optional): 基础配置，不提供则使用默认配置
+        """
+        self.pool_size = pool_size
+        self.configuration = configuration
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _new_client(self):
+        if self.configuration is not None:
+            configuration = copy.deepcopy(self.configuration)
+        else:
+            configuration = openapi_client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = self.pool_size
+        return openapi_client.ApiClient(configuration)
+
+    def get(self, host=PAN_HOST):
+        """
+        获取指定域名的共享客户端
+
+        Args:
+            host (str): 接口域名
+
+        Returns:
+            ApiClient: 共享客户端，调用方不应关闭
+        """
+        client = self._clients.get(host)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                client = self._new_client()
+                self._clients[host] = client
+            return client
+
+    def close(self):
+        """关闭所有客户端及其连接池"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+                client.rest_client.pool_manager.clear()
+            self._clients.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def configure_api_clients(pool_size):
+    """
+    设置共享客户端每个域名的连接数（一般与全局上传槽位数一致），应在第一次请求前调用
+
+    Args:
+        pool_size (int): 每个域名保持的最大连接数
+
+    Returns:
+        ApiClientRegistry: 全局注册表
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is not None:
+            _registry.close()
+        _registry = ApiClientRegistry(pool_size)
+        return _registry
+
+
+def get_api_client(host=PAN_HOST):
+    """
+    获取指定域名的共享 ApiClient
+
+    Args:
+        host (str): 接口域名，见 PAN_HOST / PCS_HOST / OAUTH_HOST
+
+    Returns:
+        ApiClient: 共享客户端，调用方不应关闭
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ApiClientRegistry()
+    return _registry.get(host)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+异步上传引擎
+在一个 asyncio 事件循环中实现与 auto_chunked_upload 相同的
+预上传 → 分片上传(superfile2) → 合并 流程，并发分片数和并发文件数由信号量限制。
+数百个分片同时上传时只占用一个线程和一个连接池；
+计算分片摘要和加密等 CPU 工作交给线程池执行，不阻塞事件循环。
+
+依赖 aiohttp（可选）: pip install aiohttp
+"""
+import os
+import json
+import time
+import asyncio
+import concurrent.futures
+from urllib.parse import urlencode
+
+import openapi_client
+from openapi_client.api import fileupload_api
+from modules.api_clients import get_api_client, PAN_HOST
+from modules.retry_policy import DEFAULT_RETRY_POLICY
+from modules.rate_limiter import get_bandwidth_limiter
+from modules.remote_index import record_remote_file
+from modules.upload_new import (
+    ContentDigest, ChunkReader, StreamEncryptor, SegmentedEncryptor, split_file_to_chunks,
+    RAPID_UPLOAD_SLICE_SIZE, MIN_CHUNK_SIZE
+)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# 默认最大并发分片数（所有文件共享）
+DEFAULT_MAX_PARTS = 64
+
+# 默认最大并发文件数
+DEFAULT_MAX_FILES = 8
+
+# 单个请求的超时时间（秒）
+DEFAULT_REQUEST_TIMEOUT = 300
+
+
+def _endpoint_url(endpoint):
+    """按生成的接口定义（及全局 Configuration 的服务器设置）得到请求地址"""
+    configuration = openapi_client.Configuration.get_default_copy()
+    host = configuration.get_host_from_settings(0, servers=endpoint.settings['servers'])
+    return host + endpoint.settings['endpoint_path']
+
+
+def _read_chunk(reader, chunk):
+    """在线程池中读取（并加密）分片；线程缓冲区会被复用，因此返回一份拷贝"""
+    return bytes(reader.read(chunk))
+
+
+class AsyncUploadEngine:
+    """
+    基于 asyncio + aiohttp 的上传引擎
+
+    用法:
+        async with AsyncUploadEngine(access_token) as engine:
+            result = await engine.upload(local_path, remote_path)
+    """
+
+    def __init__(self, access_token, max_parts=DEFAULT_MAX_PARTS, max_files=DEFAULT_MAX_FILES, retry_policy=None,
+                 executor=None, request_timeout=DEFAULT_REQUEST_TIMEOUT, ssl=None):
+        """
+        Args:
+            access_token (str): 访问令牌（upload 未指定令牌时使用）
+            max_parts (int): 最大并发分片数（同时也是连接池大小）
+            max_files (int): 最大并发文件数
+            retry_policy (RetryPolicy, optional): 分片重试策略，默认为 DEFAULT_RETRY_POLICY
+            executor (Executor, optional): 计算摘要和加密使用的线程池，默认按CPU核数创建
+            request_timeout (float): 单个请求的超时时间（秒）
+            ssl (ssl.SSLContext, optional): 自定义TLS设置
+        """
+        if aiohttp is None:
+            raise RuntimeError("异步上传引擎需要 aiohttp，请安装: pip install aiohttp")
+        if max_parts < 1 or max_files < 1:
+            raise ValueError(f"并发数必须大于等于1: max_parts={max_parts}, max_files={max_files}")
+        self.access_token = access_token
+        self.max_parts = max_parts
+        self.max_files = max_files
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.request_timeout = request_timeout
+        self.ssl = ssl
+        self._own_executor = executor is None
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 2, thread_name_prefix="async-upload-cpu"
+        )
+        self.session = None
+        self._part_slots = None
+        self._file_slots = None
+
+        api_instance = fileupload_api.FileuploadApi(get_api_client(PAN_HOST))
+        self.precreate_url = _endpoint_url(api_instance.xpanfileprecreate_endpoint)
+        self.upload_url = _endpoint_url(api_instance.pcssuperfile2_endpoint)
+        self.create_url = _endpoint_url(api_instance.xpanfilecreate_endpoint)
+
+    async def start(self):
+        """创建连接池和信号量（必须在事件循环中调用）"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_parts, ssl=self.ssl if self.ssl is not None else True)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+            self._part_slots = asyncio.Semaphore(self.max_parts)
+            self._file_slots = asyncio.Semaphore(self.max_files)
+        return self
+
+    async def close(self):
+        """关闭连接池（以及自行创建的线程池）"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _request(self, url, query, data):
+        """
+        发送 POST 请求并解析 JSON 响应
+
+        网络错误转换为 ConnectionError，非 2xx 响应转换为 ApiException，
+        与同步客户端一致，便于复用 RetryPolicy 的判断逻辑。
+        """
+        url = url + '&' + urlencode(query)
+        try:
+            async with self.session.post(url, data=data) as response:
+                text = await response.text()
+                status, reason = response.status, response.reason
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ConnectionError(f"请求失败: {e!r}") from e
+        if not 200 <= status <= 299:
+            error = openapi_client.ApiException(status=status, reason=reason)
+            error.body = text
+            raise error
+        return json.loads(text) if text else {}
+
+    async def _upload_part(self, reader, chunk, remote_path, uploadid, file_name, show_progress, access_token):
+        """上传一个分片（持有分片信号量期间才读取分片内容，内存占用受 max_parts 限制）"""
+        loop = asyncio.get_running_loop()
+        async with self._part_slots:
+            data = await loop.run_in_executor(self.executor, _read_chunk, reader, chunk)
+
+            limiter = get_bandwidth_limiter()
+            if limiter.rules or limiter.current_limit:
+                await loop.run_in_executor(None, limiter.consume, len(data))
+
+            query = {
+                'access_token': access_token,
+                'partseq': str(chunk.index),
+                'path': remote_path,
+                'uploadid': uploadid,
+                'type': 'tmpfile',
+            }
+
+            async def send():
+                form = aiohttp.FormData()
+                form.add_field('file', data, filename=f"chunk_{chunk.index}.tmp",
+                               content_type='application/octet-stream')
+                return await self._request(self.upload_url, query, form)
+
+            def on_retry(attempt, error, delay):
+                if show_progress:
+                    print(f"⚠️  {file_name} 分片 {chunk.index + 1} 第 {attempt} 次上传失败，{delay:.1f}秒后重试")
+
+            return await self.retry_policy.call_async(send, on_retry=on_retry)
+
+    async def upload(self, local_file_path, remote_path, chunk_size=MIN_CHUNK_SIZE, encrypt=False, password="123456",
+                     rapid_upload=True, rtype=3, show_progress=True, segmented=False, access_token=None):
+        """
+        上传单个文件
+
+        Args:
+            local_file_path (str): 本地文件路径
+            remote_path (str): 远程文件路径
+            chunk_size (int): 分片大小，默认4MB
+            encrypt (bool): 是否加密文件内容
+            password (str): 加密密码，默认为123456
+            rapid_upload (bool): 是否尝试秒传，默认为True
+            rtype (int): 返回类型，默认为3
+            show_progress (bool): 是否输出提示信息
+            segmented (bool): 加密时使用可随机读取的分段加密格式（v3）
+            access_token (str, optional): 本次上传使用的访问令牌，默认为创建引擎时的令牌
+                （长时间运行时令牌会被刷新，由调用方传入当前令牌）
+
+        Returns:
+            dict: 上传结果，失败返回 None
+        """
+        if self.session is None:
+            await self.start()
+        if not os.path.exists(local_file_path):
+            raise FileNotFoundError(f"本地文件不存在: {local_file_path}")
+
+        loop = asyncio.get_running_loop()
+        file_name = os.path.basename(local_file_path)
+        async with self._file_slots:
+            start_time = time.time()
+
+            # 密钥派生（PBKDF2）、分片摘要和加密都在线程池中执行
+            encryptor = None
+            if encrypt and StreamEncryptor is not None:
+                encryptor = await loop.run_in_executor(
+                    self.executor, SegmentedEncryptor if segmented else StreamEncryptor, password
+                )
+            digest = ContentDigest() if rapid_upload else None
+            chunks_info, total_size = await loop.run_in_executor(
+                self.executor, split_file_to_chunks, local_file_path, chunk_size,
+                encryptor is not None, password, encryptor, digest
+            )
+            block_list_json = json.dumps([chunk.md5 for chunk in chunks_info])
+            access_token = access_token or self.access_token
+            query = {'access_token': access_token}
+
+            # 1. 预上传（附带内容摘要时同时尝试秒传）
+            form = {
+                'path': remote_path,
+                'isdir': '0',
+                'size': str(total_size),
+                'autoinit': '1',
+                'block_list': block_list_json,
+                'rtype': str(rtype),
+            }
+            rapid = digest is not None and total_size > RAPID_UPLOAD_SLICE_SIZE
+            if rapid:
+                form['content-md5'] = digest.content_md5
+                form['slice-md5'] = digest.slice_md5
+            try:
+                precreate_response = await self._request(self.precreate_url, query, form)
+            except (openapi_client.ApiException, ConnectionError) as e:
+                if show_progress:
+                    print(f"❌ {file_name} 预上传失败: {e}")
+                return None
+
+            if rapid and precreate_response.get('return_type') == 2:
+                if show_progress:
+                    print(f"⚡ {file_name} 秒传成功")
+                result = precreate_response.get('info') or precreate_response
+                record_remote_file(result)
+                return result
+
+            uploadid = precreate_response.get('uploadid')
+            if not uploadid:
+                print(f"预上传失败，未获取到uploadid: {remote_path}")
+                print(f"预上传响应: {precreate_response}")
+                return None
+
+            # 2. 并发上传分片
+            if total_size > 0:
+                with ChunkReader(local_file_path, encryptor) as reader:
+                    results = await asyncio.gather(
+                        *(self._upload_part(reader, chunk, remote_path, uploadid, file_name, show_progress,
+                                            access_token)
+                          for chunk in chunks_info),
+                        return_exceptions=True
+                    )
+                failed = [chunk.index for chunk, result in zip(chunks_info, results)
+                          if isinstance(result, BaseException)]
+                if failed:
+                    if show_progress:
+                        print(f"❌ {file_name} 有 {len(failed)} 个分片上传失败")
+                    return None
+
+            # 3. 合并
+            form = {
+                'path': remote_path,
+                'isdir': '0',
+                'size': str(total_size),
+                'uploadid': uploadid,
+                'block_list': block_list_json,
+                'rtype': str(rtype),
+            }
+            try:
+                create_response = await self._request(self.create_url, query, form)
+            except (openapi_client.ApiException, ConnectionError) as e:
+                if show_progress:
+                    print(f"❌ {file_name} 文件合并失败: {e}")
+                return None
+            if create_response.get('errno'):
+                if show_progress:
+                    print(f"❌ {file_name} 文件合并失败，errno: {create_response.get('errno')}")
+                return None
+
+            record_remote_file(create_response)
+            if show_progress:
+                print(f"✅ {file_name} 上传完成，总耗时: {time.time() - start_time:.2f}秒")
+            return create_response
+
+    async def upload_many(self, files, **kwargs):
+        """
+        并发上传多个文件（并发文件数受 max_files 限制）
+
+        Args:
+            files (list): [(本地路径, 远程路径), ...]
+            **kwargs: 传给 upload 的其他参数
+
+        Returns:
+            list: 与 files 一一对应的上传结果，失败为 None
+        """
+        async def upload_one(local_path, remote_path):
+            try:
+                return await self.upload(local_path, remote_path, **kwargs)
+            except Exception as e:
+                print(f"❌ {os.path.basename(local_path)} 上传过程中出错: {str(e)}")
+                return None
+
+        return await asyncio.gather(*(upload_one(local, remote) for local, remote in files))
+
+
+def async_upload_files(access_token, files, max_parts=DEFAULT_MAX_PARTS, max_files=DEFAULT_MAX_FILES,
+                       retry_policy=None, **kwargs):
+    """
+    同步调用入口：在新的事件循环中上传一批文件
+
+    Args:
+        access_token (str): 访问令牌
+        files (list): [(本地路径, 远程路径), ...]
+        max_parts (int): 最大并发分片数
+        max_files (int): 最大并发文件数
+        retry_policy (RetryPolicy, optional): 分片重试策略
+        **kwargs: 传给 AsyncUploadEngine.upload 的其他参数
+
+    Returns:
+        list: 上传结果
+    """
+    async def run():
+        async with AsyncUploadEngine(access_token, max_parts, max_files, retry_policy) as engine:
+            return await engine.upload_many(files, **kwargs)
+
+    return asyncio.run(run())
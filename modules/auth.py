@@ -11,6 +11,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 import openapi_client
 from openapi_client.api import auth_api
+from modules.api_clients import get_api_client, OAUTH_HOST
 from openapi_client.model.oauth_token_authorization_code_response import OauthTokenAuthorizationCodeResponse
 from openapi_client.model.oauth_token_refresh_token_response import OauthTokenRefreshTokenResponse
 from pprint import pprint
@@ -27,43 +28,43 @@ def oauthtoken_authorizationcode(config:dict,code:str) -> str:
     authorizationcode
     get token by authorization code
     """
-    # Enter a context with an instance of the API client
-    with openapi_client.ApiClient() as api_client:
-        # Create an instance of the API class
-        api_instance = auth_api.AuthApi(api_client)
-        client_id = config['AppKey'] # str | 
-        client_secret = config['SecretKey'] # str | 
-        redirect_uri = "oob" # str | 
+    # Use the shared API client for the oauth host
+    api_client = get_api_client(OAUTH_HOST)
+    # Create an instance of the API class
+    api_instance = auth_api.AuthApi(api_client)
+    client_id = config['AppKey'] # str | 
+    client_secret = config['SecretKey'] # str | 
+    redirect_uri = "oob" # str | 
 
-        # example passing only required values which don't have defaults set
-        try:
-            api_response = api_instance.oauth_token_code2token(code, client_id, client_secret, redirect_uri)
-            pprint(api_response.refresh_token)
-            return api_response.refresh_token
-        except openapi_client.ApiException as e:
-            print("Exception when calling AuthApi->oauth_token_code2token: %s\n" % e)
+    # example passing only required values which don't have defaults set
+    try:
+        api_response = api_instance.oauth_token_code2token(code, client_id, client_secret, redirect_uri)
+        pprint(api_response.refresh_token)
+        return api_response.refresh_token
+    except openapi_client.ApiException as e:
+        print("Exception when calling AuthApi->oauth_token_code2token: %s\n" % e)
 
 
 def oauthtoken_refreshtoken(config:dict,refresh_token:str) -> str:
     """
     refresh access token
     """
-    # Enter a context with an instance of the API client
-    with openapi_client.ApiClient() as api_client:
-        # Create an instance of the API class
-        api_instance = auth_api.AuthApi(api_client)
-        # refresh_token = "122.5d587a6620cf03ebd221374097d5342a.Y3l9RzmaC4A1xq2F4xQtCnhIb4Ecp0citCARk0T.Uk3m_w" # str | 
-        client_id = config['AppKey'] # str | 
-        client_secret = config['SecretKey'] # str | 
+    # Use the shared API client for the oauth host
+    api_client = get_api_client(OAUTH_HOST)
+    # Create an instance of the API class
+    api_instance = auth_api.AuthApi(api_client)
+    # refresh_token = "122.5d587a6620cf03ebd221374097d5342a.Y3l9RzmaC4A1xq2F4xQtCnhIb4Ecp0citCARk0T.Uk3m_w" # str | 
+    client_id = config['AppKey'] # str | 
+    client_secret = config['SecretKey'] # str | 
 
-        # example passing only required values which don't have defaults set
-        try:
-            api_response = api_instance.oauth_token_refresh_token(refresh_token, client_id, client_secret)
-            print("A:",api_response)
-            print(api_response.access_token,api_response.refresh_token)
-            return api_response.access_token, api_response.refresh_token
-        except openapi_client.ApiException as e:
-            print("Exception when calling AuthApi->oauth_token_refresh_token: %s\n" % e)
+    # example passing only required values which don't have defaults set
+    try:
+        api_response = api_instance.oauth_token_refresh_token(refresh_token, client_id, client_secret)
+        print("A:",api_response)
+        print(api_response.access_token,api_response.refresh_token)
+        return api_response.access_token, api_response.refresh_token
+    except openapi_client.ApiException as e:
+        print("Exception when calling AuthApi->oauth_token_refresh_token: %s\n" % e)
 
 
 
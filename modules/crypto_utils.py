@@ -6,10 +6,45 @@
 import os
 import io
 import hashlib
+import struct
+import threading
+import concurrent.futures
 from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
 from Crypto.Util.Padding import pad, unpad
 import base64
 
+# 密文格式版本
+# v1: 16字节salt + 16字节iv + 加密数据，每个文件都执行一次 PBKDF2
+# v2: 3字节魔数 + 1字节版本 + 4字节密钥ID + 16字节主密钥salt + 24字节文件随机数 + 加密数据，
+#     主密钥由 PBKDF2 派生并在进程内缓存，文件密钥和iv由 HKDF 从主密钥和文件随机数派生
+# v3: 64字节头部 + 分段密文 + 分段认证标签表，明文按固定大小分段，每段独立 AES-256-GCM 加密，
+#     可以单独解密任意区间，各段也可以并行解密（见 SegmentedEncryptor）
+FORMAT_V1 = 1
+FORMAT_V2 = 2
+FORMAT_V3 = 3
+DEFAULT_FORMAT = FORMAT_V2
+
+V1_HEADER_SIZE = 32
+V2_MAGIC = b'BES'
+V2_HEADER_SIZE = 48
+V2_NONCE_SIZE = 24
+V3_HEADER_SIZE = 64
+
+# v3 默认的分段大小（明文），也是随机读取的最小解密单位
+DEFAULT_SEGMENT_SIZE = 1024 * 1024
+GCM_TAG_SIZE = 16
+
+# HKDF 的上下文信息，用于区分用途
+FILE_KEY_CONTEXT = b'baidu-encrypt-sync v2 file key'
+SEGMENT_KEY_CONTEXT = b'baidu-encrypt-sync v3 segment key'
+
+# 主密钥缓存 {(password, salt): key}，以及本进程加密时使用的主密钥salt {password: salt}
+_master_keys = {}
+_process_salts = {}
+_master_lock = threading.Lock()
+
 def derive_key(password, salt=None, iterations=100000):
     """
     从密码派生加密密钥
@@ -30,54 +65,523 @@ def derive_key(password, salt=None, iterations=100000):
     
     return key, salt
 
-def encrypt_data(data, password="123456"):
+def get_master_key(password, salt=None):
+    """
+    获取主密钥
+    
+    同一密码和盐值在进程内只执行一次 PBKDF2；不指定盐值时使用本进程的主密钥盐值
+    （首次调用时随机生成），因此同一进程加密的所有文件共用一个主密钥。
+    
+    Args:
+        password (str): 用户提供的密码
+        salt (bytes, optional): 主密钥盐值
+        
+    Returns:
+        tuple: (key, salt)
+    """
+    with _master_lock:
+        if salt is None:
+            salt = _process_salts.get(password)
+            if salt is None:
+                salt = _process_salts[password] = os.urandom(16)
+        key = _master_keys.get((password, salt))
+        if key is None:
+            key, _ = derive_key(password, salt)
+            _master_keys[(password, salt)] = key
+    return key, salt
+
+def master_key_id(master_key):
+    """主密钥的标识（4字节），用于快速判断密码是否匹配"""
+    return hashlib.sha256(master_key).digest()[:4]
+
+def derive_file_key(master_key, nonce):
+    """
+    由主密钥和文件随机数派生文件密钥和iv（HKDF-SHA256）
+    
+    Returns:
+        tuple: (key, iv)
+    """
+    material = HKDF(master_key, 48, nonce, SHA256, context=FILE_KEY_CONTEXT)
+    return material[:32], material[32:]
+
+def parse_header(data, password="123456"):
+    """
+    解析密文头部，兼容 v1 和 v2 格式
+    
+    Args:
+        data (bytes): 密文开头（至少包含完整头部）
+        password (str): 解密密码
+        
+    Returns:
+        tuple: (key, iv, 头部长度)
+    """
+    if len(data) >= V2_HEADER_SIZE and data[:3] == V2_MAGIC and data[3] == FORMAT_V2:
+        master_key, _ = get_master_key(password, bytes(data[8:24]))
+        if master_key_id(master_key) == data[4:8]:
+            key, iv = derive_file_key(master_key, bytes(data[24:V2_HEADER_SIZE]))
+            return key, iv, V2_HEADER_SIZE
+        # 密钥ID不匹配：密码错误，或是恰好以魔数开头的 v1 密文，按 v1 处理
+    key, _ = derive_key(password, bytes(data[:16]))
+    return key, bytes(data[16:V1_HEADER_SIZE]), V1_HEADER_SIZE
+
+def encrypt_data(data, password="123456", version=DEFAULT_FORMAT):
     """
     加密数据
     
     Args:
         data (bytes): 要加密的数据
         password (str): 加密密码，默认为123456
+        version (int): 密文格式版本，默认为 v2；FORMAT_V3 为可随机读取的分段格式
         
     Returns:
-        bytes: 加密后的数据（格式：salt + iv + 加密数据）
+        bytes: 加密后的数据（格式：头部 + 加密数据）
     """
-    # 派生密钥
-    key, salt = derive_key(password)
-    
-    # 生成随机初始化向量
-    iv = os.urandom(16)
+    if version == FORMAT_V3:
+        encryptor = SegmentedEncryptor(password, plain_size=len(data))
+        return encryptor.encrypt_all(data)
     
-    # 创建AES加密器（CBC模式）
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    
-    # 对数据进行填充并加密
-    padded_data = pad(data, AES.block_size)
-    encrypted_data = cipher.encrypt(padded_data)
+    encryptor = StreamEncryptor(password, version=version)
     
-    # 组合salt、iv和加密数据
-    # 格式：16字节salt + 16字节iv + 加密数据
-    result = salt + iv + encrypted_data
+    # 组合头部和加密数据
+    result = encryptor.header + encryptor.encrypt_segment(data, encryptor.iv, final=True)
     
     return result
 
+class StreamEncryptor:
+    """
+    流式加密器（AES-256-CBC）
+
+    输出格式与 encrypt_data 完全一致（头部 + 加密数据），
+    但允许逐段加密，无需把整个文件读入内存。
+    CBC 模式下每一段只依赖前一段密文的最后一个分组，
+    记录下这个分组即可在任意时刻重新生成某一段密文。
+    """
+
+    def __init__(self, password="123456", salt=None, iv=None, version=DEFAULT_FORMAT, nonce=None):
+        """
+        Args:
+            password (str): 加密密码，默认为123456
+            salt (bytes, optional): 盐值（v2 为主密钥盐值），不提供则随机生成（v2 使用本进程的主密钥盐值）
+            iv (bytes, optional): 初始化向量，仅 v1 使用，不提供则随机生成
+            version (int): 密文格式版本，默认为 v2
+            nonce (bytes, optional): 文件随机数，仅 v2 使用，不提供则随机生成
+        """
+        self.version = version
+        if version == FORMAT_V1:
+            self.key, self.salt = derive_key(password, salt)
+            self.iv = iv if iv is not None else os.urandom(16)
+            self.nonce = None
+        elif version == FORMAT_V2:
+            master_key, self.salt = get_master_key(password, salt)
+            self.key_id = master_key_id(master_key)
+            self.nonce = nonce if nonce is not None else os.urandom(V2_NONCE_SIZE)
+            self.key, self.iv = derive_file_key(master_key, self.nonce)
+        else:
+            raise ValueError(f"不支持的密文格式版本: {version}")
+
+    @classmethod
+    def from_header(cls, header, password="123456"):
+        """
+        按已有的密文头部重建加密器（断点续传时重新生成相同的密文）
+
+        Args:
+            header (bytes): encryptor.header
+            password (str): 加密密码
+
+        Returns:
+            StreamEncryptor: 加密器（v3 头部返回 SegmentedEncryptor）
+        """
+        if len(header) == V3_HEADER_SIZE and header[:3] == V2_MAGIC and header[3] == FORMAT_V3:
+            return SegmentedEncryptor.from_header(header, password)
+        if len(header) == V2_HEADER_SIZE and header[:3] == V2_MAGIC:
+            return cls(password, header[8:24], version=header[3], nonce=header[24:V2_HEADER_SIZE])
+        return cls(password, header[:16], header[16:V1_HEADER_SIZE], version=FORMAT_V1)
+
+    @property
+    def header(self):
+        """密文头部（v1: salt + iv；v2: 魔数 + 版本 + 密钥ID + 主密钥salt + 文件随机数）"""
+        if self.version == FORMAT_V1:
+            return self.salt + self.iv
+        return V2_MAGIC + bytes([self.version]) + self.key_id + self.salt + self.nonce
+
+    def encrypted_size(self, plain_size):
+        """根据明文大小计算密文总大小（含头部和PKCS7填充）"""
+        return len(self.header) + (plain_size // AES.block_size + 1) * AES.block_size
+
+    def encrypt_segment(self, data, chain_iv, final=False):
+        """
+        加密一段明文
+
+        Args:
+            data (bytes): 明文，非末段时长度必须是16的整数倍
+            chain_iv (bytes): 前一段密文的最后16字节，首段为 self.iv
+            final (bool): 是否为最后一段，最后一段会进行填充
+
+        Returns:
+            bytes: 该段密文（不含头部）
+        """
+        cipher = AES.new(self.key, AES.MODE_CBC, chain_iv)
+        if final:
+            data = pad(bytes(data), AES.block_size)
+        return cipher.encrypt(data)
+
+    def encrypt_segment_into(self, buffer, plain_size, chain_iv, final=False):
+        """
+        原地加密缓冲区中的一段明文，避免额外的内存分配
+
+        Args:
+            buffer (bytearray/memoryview): 前 plain_size 字节为明文，
+                最后一段时需额外预留至多16字节用于填充
+            plain_size (int): 明文长度
+            chain_iv (bytes): 前一段密文的最后16字节，首段为 self.iv
+            final (bool): 是否为最后一段
+
+        Returns:
+            int: 密文长度
+        """
+        size = plain_size
+        if final:
+            padding = AES.block_size - plain_size % AES.block_size
+            buffer[plain_size:plain_size + padding] = bytes([padding]) * padding
+            size += padding
+        view = memoryview(buffer)[:size]
+        cipher = AES.new(self.key, AES.MODE_CBC, chain_iv)
+        cipher.encrypt(view, output=view)
+        return size
+
+def encrypt_segments_into(key, nonce_prefix, segment_size, buffer, plain_offset, size):
+    """
+    按分段加密格式（v3）原地加密从 plain_offset 开始的一段明文（只需要派生后的密钥，可在加密子进程中调用）
+
+    Args:
+        key (bytes): 分段密钥
+        nonce_prefix (bytes): 8字节 nonce 前缀
+        segment_size (int): 分段大小
+        buffer (bytearray/memoryview): 前 size 字节为明文
+        plain_offset (int): 明文偏移，必须是16的整数倍
+        size (int): 长度
+    """
+    if size and plain_offset % AES.block_size != 0:
+        raise ValueError(f"明文偏移必须是16的整数倍: {plain_offset}")
+    view = memoryview(buffer)
+    position = 0
+    while position < size:
+        offset = plain_offset + position
+        index, within = divmod(offset, segment_size)
+        n = min(size - position, segment_size - within)
+        piece = view[position:position + n]
+        # GCM 使用 96 位 nonce 时，首个数据分组的计数器为2
+        cipher = AES.new(key, AES.MODE_CTR, nonce=nonce_prefix + struct.pack('>I', index),
+                         initial_value=2 + within // AES.block_size)
+        cipher.encrypt(piece, output=piece)
+        position += n
+
+
+class SegmentedEncryptor:
+    """
+    分段加密器（格式 v3，AES-256-GCM）
+
+    密文 = 64字节头部 + 各段密文（与明文等长）+ 认证标签表（每段16字节），头部结构:
+        3字节魔数 + 1字节版本 + 4字节密钥ID + 16字节主密钥salt + 24字节文件随机数
+        + 4字节分段大小 + 8字节明文大小 + 4字节保留
+    第 i 段使用 nonce = HKDF 派生的8字节前缀 + 4字节段号，并以整个头部作为附加认证数据，
+    因此明文偏移 p 对应密文偏移 64 + p，任意区间只需读取并校验它所在的分段。
+    GCM 的密文部分即 CTR 模式，上传时可以从任意16字节对齐的位置重新生成密文。
+    """
+
+    header_size = V3_HEADER_SIZE
+    version = FORMAT_V3
+    # 分段格式不使用 CBC 初始化向量
+    iv = None
+
+    def __init__(self, password="123456", salt=None, nonce=None, segment_size=DEFAULT_SEGMENT_SIZE, plain_size=0):
+        """
+        Args:
+            password (str): 加密密码，默认为123456
+            salt (bytes, optional): 主密钥盐值，不提供则使用本进程的主密钥盐值
+            nonce (bytes, optional): 文件随机数，不提供则随机生成
+            segment_size (int): 分段大小（明文），必须是16的整数倍
+            plain_size (int): 明文大小（写入头部）
+        """
+        if segment_size <= 0 or segment_size % AES.block_size != 0:
+            raise ValueError(f"分段大小必须是16的正整数倍: {segment_size}")
+        master_key, self.salt = get_master_key(password, salt)
+        self.key_id = master_key_id(master_key)
+        self.nonce = nonce if nonce is not None else os.urandom(V2_NONCE_SIZE)
+        material = HKDF(master_key, 40, self.nonce, SHA256, context=SEGMENT_KEY_CONTEXT)
+        self.key, self.nonce_prefix = material[:32], material[32:]
+        self.segment_size = segment_size
+        self.plain_size = plain_size
+        # 认证标签表，由上传前的分片过程填充
+        self.tags = None
+
+    @classmethod
+    def from_header(cls, header, password="123456"):
+        """
+        解析 v3 头部得到加密器
+
+        Raises:
+            ValueError: 不是 v3 头部或密码不匹配
+        """
+        header = bytes(header[:V3_HEADER_SIZE])
+        if len(header) != V3_HEADER_SIZE or header[:3] != V2_MAGIC or header[3] != FORMAT_V3:
+            raise ValueError("不是分段加密格式")
+        segment_size, plain_size = struct.unpack('>IQ', header[48:60])
+        encryptor = cls(password, header[8:24], header[24:48], segment_size, plain_size)
+        if encryptor.key_id != header[4:8]:
+            raise ValueError("密码错误或文件已损坏")
+        return encryptor
+
+    @property
+    def header(self):
+        """密文头部（64字节）"""
+        return (V2_MAGIC + bytes([FORMAT_V3]) + self.key_id + self.salt + self.nonce
+                + struct.pack('>IQ', self.segment_size, self.plain_size) + bytes(4))
+
+    def segment_count(self, plain_size=None):
+        """分段数（空文件没有分段）"""
+        if plain_size is None:
+            plain_size = self.plain_size
+        return (plain_size + self.segment_size - 1) // self.segment_size
+
+    def encrypted_size(self, plain_size):
+        """根据明文大小计算密文总大小（含头部和认证标签表）"""
+        return V3_HEADER_SIZE + plain_size + self.segment_count(plain_size) * GCM_TAG_SIZE
+
+    def segment_cipher(self, index):
+        """第 index 段的 GCM 加密器（已加入附加认证数据）"""
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=self.nonce_prefix + struct.pack('>I', index),
+                         mac_len=GCM_TAG_SIZE)
+        cipher.update(self.header)
+        return cipher
+
+    def encrypt_range_into(self, buffer, plain_offset, size):
+        """
+        原地加密从 plain_offset 开始的一段明文（结果与按段 GCM 加密的密文部分一致）
+
+        Args:
+            buffer (bytearray/memoryview): 前 size 字节为明文
+            plain_offset (int): 明文偏移，必须是16的整数倍
+            size (int): 长度
+        """
+        encrypt_segments_into(self.key, self.nonce_prefix, self.segment_size, buffer, plain_offset, size)
+
+    def encrypt_all(self, data):
+        """
+        一次性加密全部明文
+
+        Returns:
+            bytes: 头部 + 密文 + 认证标签表
+        """
+        self.plain_size = len(data)
+        parts = [self.header]
+        tags = []
+        for index in range(self.segment_count()):
+            segment = data[index * self.segment_size:(index + 1) * self.segment_size]
+            ciphertext, tag = self.segment_cipher(index).encrypt_and_digest(segment)
+            parts.append(ciphertext)
+            tags.append(tag)
+        self.tags = b''.join(tags)
+        return b''.join(parts) + self.tags
+
+    def decrypt_segment(self, index, ciphertext, tag):
+        """
+        解密并校验一个分段
+
+        Raises:
+            ValueError: 认证失败（密文被篡改或密码错误）
+        """
+        return self.segment_cipher(index).decrypt_and_verify(ciphertext, tag)
+
+def _open_segmented(data, password):
+    """数据以 v3 头部开头时返回对应的 SegmentedEncryptor，否则返回 None"""
+    if len(data) >= V3_HEADER_SIZE and data[:3] == V2_MAGIC and data[3] == FORMAT_V3:
+        try:
+            return SegmentedEncryptor.from_header(data, password)
+        except ValueError:
+            # 密钥ID不匹配：密码错误，或是恰好以魔数开头的 v1 密文
+            return None
+    return None
+
+def decrypt_range(read_at, offset, length, password="123456", max_workers=1):
+    """
+    解密任意一段明文，适用于本地文件、内存数据或 HTTP Range 请求
+
+    v3 格式只读取并校验覆盖该区间的分段（可并行解密）；
+    v1/v2 格式（CBC）只读取覆盖该区间的分组及其前一个分组。
+
+    Args:
+        read_at (callable): read_at(位置, 长度) -> bytes，读取密文的一段
+        offset (int): 明文起始偏移
+        length (int): 明文长度，超出明文末尾的部分会被截断（仅 v3）
+        password (str): 解密密码，默认为123456
+        max_workers (int): 并行解密分段的线程数（仅 v3）
+
+    Returns:
+        bytes: 该段明文
+
+    Raises:
+        ValueError: 区间超出文件大小，或分段认证失败
+    """
+    if length <= 0:
+        return b''
+    head = read_at(0, V3_HEADER_SIZE)
+    encryptor = _open_segmented(head, password)
+    if encryptor is None:
+        return _decrypt_cbc_range(read_at, head, offset, length, password)
+
+    plain_size = encryptor.plain_size
+    length = min(length, plain_size - offset)
+    if offset < 0 or length <= 0:
+        return b''
+    segment_size = encryptor.segment_size
+    first = offset // segment_size
+    last = (offset + length - 1) // segment_size
+    data_start = first * segment_size
+    data_end = min(plain_size, (last + 1) * segment_size)
+    ciphertext = read_at(V3_HEADER_SIZE + data_start, data_end - data_start)
+    tags = read_at(V3_HEADER_SIZE + plain_size + first * GCM_TAG_SIZE, (last - first + 1) * GCM_TAG_SIZE)
+    if len(ciphertext) != data_end - data_start or len(tags) != (last - first + 1) * GCM_TAG_SIZE:
+        raise ValueError("密文不完整")
+
+    def decrypt_one(index):
+        start = (index - first) * segment_size
+        tag_start = (index - first) * GCM_TAG_SIZE
+        return encryptor.decrypt_segment(index, ciphertext[start:start + segment_size],
+                                         tags[tag_start:tag_start + GCM_TAG_SIZE])
+
+    indexes = range(first, last + 1)
+    if max_workers > 1 and len(indexes) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            plaintext = b''.join(executor.map(decrypt_one, indexes))
+    else:
+        plaintext = b''.join(decrypt_one(index) for index in indexes)
+    start = offset - data_start
+    return plaintext[start:start + length]
+
+def _decrypt_cbc_range(read_at, head, offset, length, password):
+    """v1/v2 格式的区间解密：CBC 模式下解密任意分组只需要它前一个分组的密文"""
+    block = AES.block_size
+    first = offset // block
+    last = (offset + length - 1) // block
+    key, iv, header_size = parse_header(head, password)
+    if first > 0:
+        iv = read_at(header_size + (first - 1) * block, block)
+    encrypted_data = read_at(header_size + first * block, (last - first + 1) * block)
+    if len(encrypted_data) != (last - first + 1) * block:
+        raise ValueError("解密范围超出文件大小")
+
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    decrypted = cipher.decrypt(encrypted_data)
+    start = offset - first * block
+    return decrypted[start:start + length]
+
+def decrypt_stream(read_at, total_size, write, password="123456", block_size=DEFAULT_SEGMENT_SIZE, ready=None):
+    """
+    按顺序解密整个密文并逐段输出明文，内存占用与文件大小无关
+
+    Args:
+        read_at (callable): read_at(位置, 长度) -> bytes，读取密文的一段
+        total_size (int): 密文总大小
+        write (callable): write(bytes)，按顺序接收明文
+        password (str): 解密密码，默认为123456
+        block_size (int): v1/v2 格式每次解密的大小，必须是16的整数倍
+        ready (callable, optional): ready(起始位置, 结束位置)，读取密文区间前调用，
+            可阻塞等待该区间下载完成（边下载边解密）
+
+    Returns:
+        int: 明文大小
+
+    Raises:
+        ValueError: 密码错误、数据不完整或认证失败
+    """
+    def read(position, size):
+        if ready is not None:
+            ready(position, position + size)
+        data = read_at(position, size)
+        if len(data) != size:
+            raise ValueError("密文不完整")
+        return data
+
+    head = read(0, min(V3_HEADER_SIZE, total_size))
+    encryptor = _open_segmented(head, password)
+    if encryptor is not None:
+        # 认证标签表位于密文末尾，先读出再逐段解密校验
+        plain_size = encryptor.plain_size
+        tags = read(V3_HEADER_SIZE + plain_size, encryptor.segment_count() * GCM_TAG_SIZE)
+        for index in range(encryptor.segment_count()):
+            start = index * encryptor.segment_size
+            size = min(encryptor.segment_size, plain_size - start)
+            write(encryptor.decrypt_segment(index, read(V3_HEADER_SIZE + start, size),
+                                            tags[index * GCM_TAG_SIZE:(index + 1) * GCM_TAG_SIZE]))
+        return plain_size
+
+    key, iv, header_size = parse_header(head, password)
+    if (total_size - header_size) % AES.block_size != 0 or total_size <= header_size:
+        raise ValueError("密文不完整")
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    position = header_size
+    plain_size = 0
+    while position < total_size:
+        size = min(block_size, total_size - position)
+        plaintext = cipher.decrypt(read(position, size))
+        position += size
+        if position == total_size:
+            plaintext = unpad(plaintext, AES.block_size)
+        write(plaintext)
+        plain_size += len(plaintext)
+    return plain_size
+
+def decrypted_size(read_at, total_size, password="123456"):
+    """
+    根据密文头部和密文总大小计算明文大小
+
+    Args:
+        read_at (callable): read_at(位置, 长度) -> bytes
+        total_size (int): 密文总大小
+        password (str): 解密密码
+
+    Returns:
+        int: 明文大小
+    """
+    head = read_at(0, V3_HEADER_SIZE)
+    encryptor = _open_segmented(head, password)
+    if encryptor is not None:
+        return encryptor.plain_size
+    key, iv, header_size = parse_header(head, password)
+    # 最后一个分组含有填充
+    last_iv = read_at(total_size - 2 * AES.block_size, AES.block_size) if total_size - header_size > 16 else iv
+    last = AES.new(key, AES.MODE_CBC, last_iv).decrypt(read_at(total_size - AES.block_size, AES.block_size))
+    return total_size - header_size - last[-1]
+
+def _file_reader(f):
+    """把文件对象包装成 read_at"""
+    def read_at(position, size):
+        f.seek(position)
+        return f.read(size)
+    return read_at
+
 def decrypt_data(encrypted_data, password="123456"):
     """
     解密数据
     
     Args:
-        encrypted_data (bytes): 加密的数据（格式：salt + iv + 加密数据）
+        encrypted_data (bytes): 加密的数据（v1、v2 或 v3 格式）
         password (str): 解密密码，默认为123456
         
     Returns:
         bytes: 解密后的原始数据
     """
-    # 从加密数据中提取salt和iv
-    salt = encrypted_data[:16]
-    iv = encrypted_data[16:32]
-    actual_encrypted_data = encrypted_data[32:]
+    # 分段格式逐段解密并校验
+    encryptor = _open_segmented(encrypted_data, password)
+    if encryptor is not None:
+        view = memoryview(encrypted_data)
+        return decrypt_range(lambda position, size: bytes(view[position:position + size]),
+                             0, encryptor.plain_size, password)
     
-    # 派生密钥
-    key, _ = derive_key(password, salt)
+    # 从头部得到密钥和iv
+    key, iv, header_size = parse_header(encrypted_data, password)
+    actual_encrypted_data = encrypted_data[header_size:]
     
     # 创建AES解密器
     cipher = AES.new(key, AES.MODE_CBC, iv)
@@ -88,6 +592,25 @@ def decrypt_data(encrypted_data, password="123456"):
     
     return decrypted_data
 
+def decrypt_file_range(input_file_path, offset, length, password="123456", max_workers=1):
+    """
+    只解密加密文件中的一段明文
+
+    无需解密整个文件即可取出其中一段，详见 decrypt_range。
+
+    Args:
+        input_file_path (str): 加密文件路径（v1、v2 或 v3 格式）
+        offset (int): 明文起始偏移
+        length (int): 明文长度，offset + length 不能超过明文大小
+        password (str): 解密密码，默认为123456
+        max_workers (int): 并行解密分段的线程数（仅 v3）
+
+    Returns:
+        bytes: 该段明文
+    """
+    with open(input_file_path, 'rb') as f:
+        return decrypt_range(_file_reader(f), offset, length, password, max_workers)
+
 def encrypt_file(input_file_path, output_file_path=None, password="123456"):
     """
     加密文件
@@ -134,16 +657,9 @@ def decrypt_file(input_file_path, output_file_path=None, password="123456"):
         else:
             output_file_path = input_file_path + '.dec'
     
-    # 读取加密文件内容
-    with open(input_file_path, 'rb') as f:
-        encrypted_data = f.read()
-    
-    # 解密数据
-    decrypted_data = decrypt_data(encrypted_data, password)
-    
-    # 写入解密文件
-    with open(output_file_path, 'wb') as f:
-        f.write(decrypted_data)
+    # 逐段解密并写入，不把整个文件读入内存
+    with open(input_file_path, 'rb') as f, open(output_file_path, 'wb') as out:
+        decrypt_stream(_file_reader(f), os.fstat(f.fileno()).st_size, out.write, password)
     
     return output_file_path
 
@@ -211,7 +727,10 @@ def create_decrypt_script(file_path, output_dir=None, password="123456"):
 """
 import os
 import sys
+import struct
 from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
 from Crypto.Util.Padding import unpad
 import hashlib
 
@@ -219,6 +738,33 @@ def derive_key(password, salt, iterations=100000):
     """从密码派生密钥"""
     return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations, dklen=32)
 
+def parse_header(data, password):
+    """解析密文头部，返回 (key, iv, 头部长度)"""
+    if data[:3] == {V2_MAGIC!r} and data[3] == {FORMAT_V2}:
+        master_key = derive_key(password, data[8:24])
+        if hashlib.sha256(master_key).digest()[:4] == data[4:8]:
+            material = HKDF(master_key, 48, data[24:{V2_HEADER_SIZE}], SHA256, context={FILE_KEY_CONTEXT!r})
+            return material[:32], material[32:], {V2_HEADER_SIZE}
+    return derive_key(password, data[:16]), data[16:32], 32
+
+def decrypt_segmented(data, password):
+    """解密分段格式（v3），密码错误或数据被篡改时抛出 ValueError"""
+    master_key = derive_key(password, data[8:24])
+    if hashlib.sha256(master_key).digest()[:4] != data[4:8]:
+        raise ValueError("密码错误")
+    material = HKDF(master_key, 40, data[24:48], SHA256, context={SEGMENT_KEY_CONTEXT!r})
+    key, prefix = material[:32], material[32:]
+    segment_size, plain_size = struct.unpack('>IQ', data[48:60])
+    count = (plain_size + segment_size - 1) // segment_size
+    body, tags = data[{V3_HEADER_SIZE}:{V3_HEADER_SIZE} + plain_size], data[{V3_HEADER_SIZE} + plain_size:]
+    result = []
+    for index in range(count):
+        cipher = AES.new(key, AES.MODE_GCM, nonce=prefix + struct.pack('>I', index), mac_len=16)
+        cipher.update(data[:{V3_HEADER_SIZE}])
+        result.append(cipher.decrypt_and_verify(body[index * segment_size:(index + 1) * segment_size],
+                                                tags[index * 16:(index + 1) * 16]))
+    return b''.join(result)
+
 def decrypt_file(input_file, output_file=None, password="{password}"):
     """解密文件"""
     if not output_file:
@@ -230,18 +776,17 @@ def decrypt_file(input_file, output_file=None, password="{password}"):
     with open(input_file, 'rb') as f:
         data = f.read()
     
-    # 提取salt和iv
-    salt = data[:16]
-    iv = data[16:32]
-    encrypted_data = data[32:]
-    
-    # 派生密钥
-    key = derive_key(password, salt)
-    
-    # 解密数据
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    decrypted_padded = cipher.decrypt(encrypted_data)
-    decrypted = unpad(decrypted_padded, AES.block_size)
+    if data[:3] == {V2_MAGIC!r} and data[3] == {FORMAT_V3}:
+        decrypted = decrypt_segmented(data, password)
+    else:
+        # 从头部得到密钥和iv
+        key, iv, header_size = parse_header(data, password)
+        encrypted_data = data[header_size:]
+        
+        # 解密数据
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+        decrypted_padded = cipher.decrypt(encrypted_data)
+        decrypted = unpad(decrypted_padded, AES.block_size)
     
     with open(output_file, 'wb') as f:
         f.write(decrypted)
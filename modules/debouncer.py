@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+文件事件去抖模块
+每个路径记录一个截止时间：每次写入事件（IN_CREATE / IN_MODIFY）都把截止时间推迟到 当前时间 + 冷却时间，
+收到 IN_CLOSE_WRITE 后立即到期。到期的路径交给回调处理（加入上传队列）。
+
+截止时间保存在最小堆中，后台线程只在最早的截止时间到达时醒来，没有待处理文件时不占用 CPU。
+推迟截止时间不会向堆中插入新元素：堆顶元素到期时如果发现截止时间已被推迟，再按新的截止时间放回堆中，
+因此持续写入的大文件在堆中始终只有一个元素。
+"""
+import time
+import heapq
+import threading
+from datetime import datetime
+
+
+class Debouncer:
+    """
+    基于最小堆的文件事件去抖器
+
+    回调在去抖线程中执行，执行期间不持有锁。
+    """
+
+    def __init__(self, callback, cooldown=2, close_delay=0):
+        """
+        Args:
+            callback (callable): 路径到期时调用 callback(路径)
+            cooldown (float): 最后一次写入事件之后的等待时间（秒）
+            close_delay (float): 收到 IN_CLOSE_WRITE 后的等待时间（秒），默认立即处理
+        """
+        self.callback = callback
+        self.cooldown = cooldown
+        self.close_delay = close_delay
+        self._deadlines = {}  # {路径: 截止时间}
+        self._heap = []  # [(截止时间, 序号, 路径)]
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        # 正在执行回调的路径
+        self._current = None
+
+    def _push(self, deadline, path):
+        self._sequence += 1
+        heapq.heappush(self._heap, (deadline, self._sequence, path))
+        # 只有新元素成为堆顶（比线程正在等待的时间更早）时才需要唤醒去抖线程
+        if self._heap[0][1] == self._sequence:
+            self._condition.notify()
+
+    def touch(self, path, closed=False):
+        """
+        记录一个文件事件
+
+        Args:
+            path (str): 文件路径
+            closed (bool): 是否为 IN_CLOSE_WRITE 事件（写入已完成）
+
+        Returns:
+            bool: 该路径此前不在等待中时返回 True
+        """
+        now = time.monotonic()
+        deadline = now + (self.close_delay if closed else self.cooldown)
+        with self._condition:
+            current = self._deadlines.get(path)
+            self._deadlines[path] = deadline
+            if current is None or deadline < current:
+                # 截止时间提前（或新路径）时需要新的堆元素；推迟时等旧元素到期后再放回
+                self._push(deadline, path)
+            return current is None
+
+    def discard(self, path):
+        """取消等待中的路径"""
+        with self._condition:
+            self._deadlines.pop(path, None)
+
+    def __contains__(self, path):
+        """路径是否在等待中（包括正在执行回调）"""
+        with self._condition:
+            return path in self._deadlines or path == self._current
+
+    def __len__(self):
+        with self._condition:
+            return len(self._deadlines)
+
+    def _next_due(self):
+        """取出一个已到期的路径；没有时返回距离最早截止时间的秒数（堆为空时为 None）"""
+        while self._heap:
+            deadline, _, path = self._heap[0]
+            current = self._deadlines.get(path)
+            if current is None or current < deadline:
+                # 已处理、已取消，或有更早的堆元素
+                heapq.heappop(self._heap)
+                continue
+            if current > deadline:
+                # 截止时间已被推迟，按新的截止时间放回
+                heapq.heapreplace(self._heap, (current, self._heap[0][1], path))
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                return remaining
+            heapq.heappop(self._heap)
+            del self._deadlines[path]
+            return path
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._running:
+                        return
+                    due = self._next_due()
+                    if isinstance(due, str):
+                        self._current = due
+                        break
+                    self._condition.wait(due)
+            try:
+                self.callback(due)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 处理文件 {due} 时出错: {e}")
+            finally:
+                with self._condition:
+                    self._current = None
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='debouncer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+下载与恢复模块
+通过 xpanmultimediafilemetas(dlink=1) 获取下载地址，用多个并发的 HTTP Range 请求
+把文件下载到预先分配好大小的临时文件中，每个连接边接收边写入（pwrite），内存占用恒定。
+
+下载进度记录在旁路状态文件（<输出文件>.part.json）中，中断后重新运行只下载缺失的区间。
+加密文件在下载的同时按顺序解密：解密线程等待所需的密文区间下载完成后立即解密写出，
+下载完成时明文也基本解密完毕。
+
+用法:
+    python -m modules.download /apps/autoSync/video.mp4 -o video.mp4 -p 密码
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+import urllib3
+
+import openapi_client
+from openapi_client.api import multimediafile_api, fileinfo_api
+from modules.api_clients import get_api_client, PAN_HOST
+from modules.retry_policy import DEFAULT_RETRY_POLICY
+from modules.remote_index import get_remote_index, configure_remote_index, DEFAULT_INDEX_PATH
+
+# 默认并发连接数
+DEFAULT_CONNECTIONS = 8
+
+# 默认每个 Range 请求的大小
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+# 每次从连接读取并写入文件的大小
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+# 下载 dlink 时百度网盘要求的 User-Agent
+DLINK_USER_AGENT = 'pan.baidu.com'
+
+# 临时文件和状态文件的后缀
+PART_SUFFIX = '.part'
+STATE_SUFFIX = '.part.json'
+CIPHER_SUFFIX = '.enc.part'
+
+# 单个请求的超时时间（连接, 读取）
+DEFAULT_TIMEOUT = urllib3.Timeout(connect=30, read=120)
+
+
+def find_fs_id(access_token, remote_path):
+    """
+    根据远程路径查找文件的 fs_id
+
+    启用了远程文件索引时先查询本地索引，索引中没有时再列出父目录查找。
+
+    Args:
+        access_token (str): 访问令牌
+        remote_path (str): 远程文件路径
+
+    Returns:
+        int: fs_id
+
+    Raises:
+        FileNotFoundError: 文件不存在
+    """
+    index = get_remote_index()
+    if index is not None:
+        entry = index.lookup(remote_path)
+        if entry is not None and entry['fs_id'] and not entry['isdir']:
+            return entry['fs_id']
+    api_instance = fileinfo_api.FileinfoApi(get_api_client(PAN_HOST))
+    parent = os.path.dirname(remote_path) or '/'
+    start, limit = 0, 1000
+    while True:
+        response = api_instance.xpanfilelist(access_token=access_token, dir=parent, start=str(start), limit=limit)
+        entries = response.get('list') or []
+        for entry in entries:
+            if entry.get('path') == remote_path and not entry.get('isdir'):
+                return entry['fs_id']
+        if len(entries) < limit:
+            raise FileNotFoundError(f"远程文件不存在: {remote_path}")
+        start += limit
+
+
+def get_download_meta(access_token, fs_id):
+    """
+    获取文件信息和下载地址（dlink）
+
+    Args:
+        access_token (str): 访问令牌
+        fs_id (int): 文件 fs_id
+
+    Returns:
+        dict: 包含 fs_id、path、size、md5、dlink 的文件信息
+    """
+    api_instance = multimediafile_api.MultimediafileApi(get_api_client(PAN_HOST))
+    response = api_instance.xpanmultimediafilemetas(access_token=access_token, fsids=json.dumps([int(fs_id)]),
+                                                    dlink="1")
+    entries = response.get('list') or []
+    if not entries or not entries[0].get('dlink'):
+        raise FileNotFoundError(f"无法获取下载地址: fs_id={fs_id}, 响应: {response}")
+    return entries[0]
+
+
+class RangeDownload:
+    """
+    多连接分段下载
+
+    文件按 part_size 分段，connections 个线程各自领取分段并发送 Range 请求，
+    响应体按 DOWNLOAD_BLOCK_SIZE 边读边写入预分配文件的对应位置。
+    每完成一个分段就更新状态文件，其他线程可以通过 wait_range 等待某个区间下载完成。
+    """
+
+    def __init__(self, url, size, part_path, state_path, identity, connections=DEFAULT_CONNECTIONS,
+                 part_size=DEFAULT_PART_SIZE, headers=None, retry_policy=None, on_progress=None):
+        """
+        Args:
+            url (str): 下载地址
+            size (int): 文件大小
+            part_path (str): 临时文件路径（预分配为 size 字节）
+            state_path (str): 状态文件路径
+            identity (dict): 文件标识（如 fs_id、md5），与状态文件记录不一致时重新下载
+            connections (int): 并发连接数
+            part_size (int): 每个 Range 请求的大小
+            headers (dict, optional): 附加的请求头
+            retry_policy (RetryPolicy, optional): 分段重试策略，默认为 DEFAULT_RETRY_POLICY
+            on_progress (callable, optional): 每写入一块数据后调用 on_progress(字节数)
+        """
+        if connections < 1:
+            raise ValueError(f"并发连接数必须大于等于1: {connections}")
+        self.url = url
+        self.size = size
+        self.part_path = part_path
+        self.state_path = state_path
+        self.identity = dict(identity, size=size, part_size=part_size)
+        self.connections = connections
+        self.part_size = part_size
+        self.headers = dict(headers or {})
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.on_progress = on_progress
+        self.part_count = (size + part_size - 1) // part_size
+        self.done = set()
+        self.error = None
+        self._pending = []
+        self._condition = threading.Condition()
+        self._threads = []
+        self._http = urllib3.PoolManager(maxsize=connections, timeout=DEFAULT_TIMEOUT)
+
+    def _load_state(self):
+        """读取状态文件，文件标识一致且临时文件存在时返回已完成的分段"""
+        if not os.path.exists(self.part_path):
+            return set()
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get('identity') != self.identity:
+            return set()
+        return set(state.get('done', []))
+
+    def _save_state(self):
+        """原子地写入状态文件（调用方持有锁）"""
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'identity': self.identity, 'done': sorted(self.done)}, f)
+        os.replace(temp_path, self.state_path)
+
+    def resolve(self):
+        """跟随一次 dlink 的跳转，之后所有分段直接请求最终地址"""
+        response = self._http.request('GET', self.url, headers=dict(self.headers, Range='bytes=0-0'),
+                                      redirect=False, preload_content=False)
+        try:
+            location = response.get_redirect_location()
+        finally:
+            response.release_conn()
+        if location:
+            self.url = location
+
+    def start(self, first=None):
+        """
+        预分配临时文件并启动下载线程
+
+        Args:
+            first (list, optional): 优先下载的分段序号（如加密文件末尾的认证标签表）
+
+        Returns:
+            int: 已从状态文件恢复的字节数
+        """
+        self.done = self._load_state()
+        self.fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size != self.size:
+            os.ftruncate(self.fd, self.size)
+        with self._condition:
+            self._save_state()
+
+        order = [index for index in (first or []) if 0 <= index < self.part_count]
+        order += [index for index in range(self.part_count) if index not in order]
+        # 倒序存放，线程从末尾 pop
+        self._pending = [index for index in reversed(order) if index not in self.done]
+
+        if self._pending:
+            self.resolve()
+        for i in range(min(self.connections, len(self._pending))):
+            thread = threading.Thread(target=self._worker, name=f"download-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return sum(min(self.part_size, self.size - index * self.part_size) for index in self.done)
+
+    def _fetch_part(self, index):
+        """下载一个分段，失败时抛出异常由重试策略处理"""
+        start = index * self.part_size
+        end = min(self.size, start + self.part_size) - 1
+        response = self._http.request('GET', self.url, headers=dict(self.headers, Range=f'bytes={start}-{end}'),
+                                      preload_content=False)
+        try:
+            if response.status != 206 and not (response.status == 200 and start == 0 and end == self.size - 1):
+                raise openapi_client.ApiException(status=response.status, reason=response.reason)
+            position = start
+            for block in response.stream(DOWNLOAD_BLOCK_SIZE):
+                if position + len(block) > end + 1:
+                    raise ConnectionError(f"响应长度超出请求区间: bytes={start}-{end}")
+                os.pwrite(self.fd, block, position)
+                position += len(block)
+                if self.on_progress is not None:
+                    self.on_progress(len(block))
+            if position != end + 1:
+                raise ConnectionError(f"连接提前关闭: bytes={start}-{end}，只收到 {position - start} 字节")
+        finally:
+            response.release_conn()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                if not self._pending or self.error is not None:
+                    return
+                index = self._pending.pop()
+
+            def on_retry(attempt, error, delay):
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️  分段 {index + 1} 第 {attempt} 次下载失败，"
+                      f"{delay:.1f}秒后重试: {error}")
+
+            try:
+                self.retry_policy.call(self._fetch_part, index, on_retry=on_retry)
+            except Exception as e:
+                with self._condition:
+                    if self.error is None:
+                        self.error = e
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self.done.add(index)
+                self._save_state()
+                self._condition.notify_all()
+
+    def wait_range(self, start, end):
+        """
+        阻塞直到 [start, end) 区间全部下载完成
+
+        Raises:
+            分段下载失败时抛出该异常
+        """
+        if end <= start:
+            return
+        needed = range(start // self.part_size, (end - 1) // self.part_size + 1)
+        with self._condition:
+            while True:
+                if all(index in self.done for index in needed):
+                    return
+                if self.error is not None:
+                    raise self.error
+                self._condition.wait()
+
+    def read_at(self, position, size):
+        """从临时文件读取已下载的数据"""
+        return os.pread(self.fd, size, position)
+
+    def join(self):
+        """
+        等待所有分段下载完成
+
+        Returns:
+            bool: 全部成功返回 True
+        """
+        for thread in self._threads:
+            thread.join()
+        return self.error is None and len(self.done) == self.part_count
+
+    def close(self, remove=False):
+        """
+        关闭临时文件和连接池
+
+        Args:
+            remove (bool): 是否删除状态文件（下载完成后）
+        """
+        if getattr(self, 'fd', None) is not None:
+            os.close(self.fd)
+            self.fd = None
+        self._http.clear()
+        if remove and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+
+class _ProgressPrinter:
+    """按固定间隔输出下载进度"""
+
+    def __init__(self, name, total, initial=0, interval=5):
+        self.name = name
+        self.total = total
+        self.received = initial
+        self.interval = interval
+        self.start_time = time.time()
+        self._last = self.start_time
+        self._lock = threading.Lock()
+
+    def __call__(self, n):
+        with self._lock:
+            self.received += n
+            now = time.time()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+        percent = self.received * 100 / self.total if self.total else 100
+        speed = self.received / max(now - self.start_time, 0.001) / (1024 * 1024)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⬇️  {self.name}: {percent:.1f}% ({speed:.1f}MB/s)")
+
+
+def download_file(access_token, output_path, remote_path=None, fs_id=None, password=None,
+                  connections=DEFAULT_CONNECTIONS, part_size=DEFAULT_PART_SIZE, retry_policy=None, show_progress=True):
+    """
+    下载（并解密）网盘中的文件，支持断点续传
+
+    未加密文件直接下载到 <输出文件>.part，完成后改名；
+    加密文件的密文下载到 <输出文件>.enc.part，同时解密线程按顺序把明文写入 <输出文件>.part，
+    全部完成并校验通过后改名为输出文件并删除临时文件。
+
+    Args:
+        access_token (str): 访问令牌
+        output_path (str): 本地输出文件路径
+        remote_path (str, optional): 远程文件路径（与 fs_id 二选一）
+        fs_id (int, optional): 文件 fs_id
+        password (str, optional): 加密上传时使用的密码，提供时下载后解密
+        connections (int): 并发连接数
+        part_size (int): 每个 Range 请求的大小
+        retry_policy (RetryPolicy, optional): 分段重试策略
+        show_progress (bool): 是否输出进度
+
+    Returns:
+        str: 输出文件路径；下载失败返回 None（已下载的分段保留，下次运行时续传）
+    """
+    if fs_id is None:
+        if remote_path is None:
+            raise ValueError("remote_path 和 fs_id 必须提供一个")
+        fs_id = find_fs_id(access_token, remote_path)
+    meta = get_download_meta(access_token, fs_id)
+    size = int(meta['size'])
+    name = os.path.basename(output_path)
+    url = meta['dlink'] + ('&' if '?' in meta['dlink'] else '?') + f"access_token={access_token}"
+
+    encrypted = password is not None
+    data_path = output_path + (CIPHER_SUFFIX if encrypted else PART_SUFFIX)
+    progress = _ProgressPrinter(name, size) if show_progress else None
+    download = RangeDownload(
+        url, size, data_path, output_path + STATE_SUFFIX,
+        identity={'fs_id': int(fs_id), 'md5': meta.get('md5'), 'encrypted': encrypted},
+        connections=connections, part_size=part_size, headers={'User-Agent': DLINK_USER_AGENT},
+        retry_policy=retry_policy, on_progress=progress
+    )
+
+    start_time = time.time()
+    try:
+        # 加密文件优先下载末尾分段（分段格式的认证标签表、CBC 的填充分组都在末尾）
+        part_count = (size + part_size - 1) // part_size
+        restored = download.start(first=[part_count - 1] if encrypted else None)
+        if progress is not None:
+            progress.received = restored
+        if show_progress:
+            resumed = f"，已续传 {restored / (1024 * 1024):.1f}MB" if restored else ""
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⬇️  开始下载: {meta.get('path', fs_id)} "
+                  f"({size / (1024 * 1024):.1f}MB，{connections} 个连接{resumed})")
+
+        if encrypted:
+            from modules.crypto_utils import decrypt_stream
+            plain_path = output_path + PART_SUFFIX
+            try:
+                with open(plain_path, 'wb') as out:
+                    decrypt_stream(download.read_at, size, out.write, password, ready=download.wait_range)
+            except Exception as e:
+                # 已下载的密文保留在临时文件中，修正密码或网络恢复后重新运行即可续传
+                download.join()
+                os.remove(plain_path)
+                reason = download.error or e
+                action = "下载" if download.error is not None else "解密"
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ {name} {action}失败: {reason}")
+                return None
+
+        if not download.join():
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ {name} 下载失败: {download.error}")
+            return None
+    finally:
+        download.close()
+
+    if encrypted:
+        os.replace(output_path + PART_SUFFIX, output_path)
+        os.remove(data_path)
+    else:
+        os.replace(data_path, output_path)
+    os.remove(output_path + STATE_SUFFIX)
+
+    if show_progress:
+        elapsed = time.time() - start_time
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ {name} 下载完成，耗时 {elapsed:.2f}秒"
+              f"（{size / max(elapsed, 0.001) / (1024 * 1024):.1f}MB/s）")
+    return output_path
+
+
+def _load_access_token(config_path='config/config.yaml'):
+    """从配置文件读取访问令牌"""
+    import yaml
+    with open(config_path) as f:
+        return (yaml.safe_load(f) or {}).get('AccessToken')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="从百度网盘下载（并解密）文件，支持多连接和断点续传")
+    parser.add_argument("remote_path", help="网盘中的文件路径")
+    parser.add_argument("-o", "--output",
+                        help="本地输出文件路径，默认为当前目录下的同名文件（去掉.enc后缀）")
+    parser.add_argument("-p", "--password",
+                        help="加密上传时使用的密码，提供时下载后解密")
+    parser.add_argument("-c", "--connections", type=int, default=DEFAULT_CONNECTIONS,
+                        help=f"并发连接数，默认为{DEFAULT_CONNECTIONS}")
+    parser.add_argument("--part-size", type=int, default=DEFAULT_PART_SIZE // (1024 * 1024),
+                        help=f"每个 Range 请求的大小(MB)，默认为{DEFAULT_PART_SIZE // (1024 * 1024)}")
+    parser.add_argument("--access-token",
+                        help="访问令牌，默认读取 config/config.yaml 中的 AccessToken")
+    parser.add_argument("--index", nargs='?', const=DEFAULT_INDEX_PATH,
+                        help=f"先在远程文件索引中查找文件，默认索引为 {DEFAULT_INDEX_PATH}")
+    args = parser.parse_args()
+    if args.index:
+        configure_remote_index(args.index)
+
+    output = args.output
+    if not output:
+        output = os.path.basename(args.remote_path)
+        if output.endswith('.enc'):
+            output = output[:-4]
+    try:
+        access_token = args.access_token or _load_access_token()
+        result = download_file(access_token, output, remote_path=args.remote_path, password=args.password,
+                               connections=args.connections, part_size=args.part_size * 1024 * 1024)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        sys.exit(1)
+    sys.exit(0 if result else 1)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+多进程加密模块
+上传加密分片时，由进程池中的子进程读取明文并原地加密，
+分片数据通过 multiprocessing.shared_memory 共享内存缓冲区在进程间传递，不经过 pickle。
+
+得益于分片描述符中记录的 CBC 链接向量（分段加密格式则是 CTR 计数器），每个分片都可以独立加密，
+加密吞吐量可以随 CPU 核数扩展。
+"""
+import os
+import queue
+import threading
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
+
+from Crypto.Cipher import AES
+
+from modules.crypto_utils import encrypt_segments_into
+
+# 默认共享内存缓冲区大小（超级会员的最大分片为32MB）
+DEFAULT_SLOT_SIZE = 32 * 1024 * 1024
+
+# 子进程中已映射的共享内存 {名称: SharedMemory}
+_worker_segments = {}
+
+
+def _attach_segment(name):
+    """子进程中按名称映射共享内存（只映射一次）"""
+    segment = _worker_segments.get(name)
+    if segment is None:
+        # 子进程与父进程共用同一个 resource_tracker，重复登记不会导致提前回收
+        segment = shared_memory.SharedMemory(name=name)
+        _worker_segments[name] = segment
+    return segment
+
+
+def _read_plain(file_path, body, offset, plain_size):
+    """读取 plain_size 字节明文到 body"""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        total = 0
+        while total < plain_size:
+            n = os.preadv(fd, [body[total:plain_size]], offset + total)
+            if n == 0:
+                break
+            total += n
+    finally:
+        os.close(fd)
+    if total != plain_size:
+        raise IOError(f"读取分片失败，文件可能已被修改: {file_path}")
+
+
+def _encrypt_into_segment(name, file_path, key, header, offset, plain_size, chain_iv, final, with_header):
+    """
+    在子进程中执行：读取明文到共享内存并原地加密
+
+    Returns:
+        int: 共享内存中密文分片的长度（含头部）
+    """
+    buffer = _attach_segment(name).buf
+    start = len(header) if with_header else 0
+    body = buffer[start:]
+    _read_plain(file_path, body, offset, plain_size)
+
+    size = plain_size
+    if final:
+        padding = AES.block_size - plain_size % AES.block_size
+        body[plain_size:plain_size + padding] = bytes([padding]) * padding
+        size += padding
+    view = body[:size]
+    cipher = AES.new(key, AES.MODE_CBC, chain_iv)
+    cipher.encrypt(view, output=view)
+    if with_header:
+        buffer[:start] = header
+    return start + size
+
+
+def _encrypt_segmented_into_segment(name, file_path, key, nonce_prefix, segment_size, header_part, offset, plain_size,
+                                    table_part):
+    """
+    在子进程中执行：按分段加密格式（v3）生成一个密文分片（头部片段 + 密文 + 认证标签表片段）
+
+    Returns:
+        int: 共享内存中密文分片的长度
+    """
+    buffer = _attach_segment(name).buf
+    start = len(header_part)
+    buffer[:start] = header_part
+    body = buffer[start:start + plain_size]
+    _read_plain(file_path, body, offset, plain_size)
+    encrypt_segments_into(key, nonce_prefix, segment_size, body, offset, plain_size)
+    end = start + plain_size + len(table_part)
+    buffer[start + plain_size:end] = table_part
+    return end
+
+
+class SegmentLease:
+    """租用的共享内存缓冲区，使用完毕后必须调用 release 归还"""
+
+    def __init__(self, pool, index, view):
+        self.pool = pool
+        self.index = index
+        self.view = view
+
+    def release(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+            self.pool._release(self.index)
+
+
+class EncryptionPool:
+    """
+    加密进程池
+
+    持有 slots 块共享内存缓冲区，每个正在上传的加密分片占用一块，
+    上传完成（StreamingFile 关闭）后归还；缓冲区用完时调用方等待。
+    """
+
+    def __init__(self, processes=None, slot_size=DEFAULT_SLOT_SIZE, slots=None):
+        """
+        Args:
+            processes (int, optional): 加密进程数，默认为CPU核数
+            slot_size (int): 每块缓冲区的大小，必须不小于最大分片大小
+            slots (int, optional): 缓冲区数量（即同时在途的加密分片数），默认为进程数的2倍
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.slot_size = slot_size
+        slots = slots or self.processes * 2
+        self._segments = [shared_memory.SharedMemory(create=True, size=slot_size) for _ in range(slots)]
+        self._free = queue.Queue()
+        for index in range(slots):
+            self._free.put(index)
+        # spawn 启动的子进程不继承上传线程等父进程状态
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def fits(self, size):
+        """分片能否放入缓冲区"""
+        return size <= self.slot_size
+
+    def encrypt_chunk(self, file_path, encryptor, chunk):
+        """
+        在子进程中读取并加密一个分片
+
+        Args:
+            file_path (str): 明文文件路径
+            encryptor (StreamEncryptor): 文件的流式加密器（提供密钥和头部）
+            chunk (EncryptedChunkDescriptor): 分片描述符
+
+        Returns:
+            SegmentLease: 密文位于 lease.view，用完后调用 lease.release()
+        """
+        return self._run(_encrypt_into_segment, file_path, encryptor.key, encryptor.header,
+                         chunk.offset, chunk.plain_size, chunk.iv, chunk.final, chunk.index == 0)
+
+    def encrypt_segmented_chunk(self, file_path, encryptor, chunk):
+        """
+        在子进程中生成一个分段加密格式（v3）的密文分片
+
+        Args:
+            file_path (str): 明文文件路径
+            encryptor (SegmentedEncryptor): 文件的分段加密器（认证标签表已在分片时计算）
+            chunk (SegmentedChunkDescriptor): 分片描述符
+
+        Returns:
+            SegmentLease: 密文位于 lease.view，用完后调用 lease.release()
+        """
+        return self._run(_encrypt_segmented_into_segment, file_path, encryptor.key, encryptor.nonce_prefix,
+                         encryptor.segment_size, encryptor.header[:chunk.header_size], chunk.offset,
+                         chunk.plain_size, encryptor.tags[chunk.table_offset:chunk.table_offset + chunk.table_size])
+
+    def _run(self, func, *args):
+        """租用一块缓冲区并在子进程中执行 func(缓冲区名称, *args)"""
+        index = self._free.get()
+        segment = self._segments[index]
+        try:
+            size = self._executor.submit(func, segment.name, *args).result()
+        except BaseException:
+            self._free.put(index)
+            raise
+        return SegmentLease(self, index, segment.buf[:size])
+
+    def _release(self, index):
+        self._free.put(index)
+
+    def close(self):
+        """关闭进程池并释放共享内存"""
+        self._executor.shutdown(wait=True)
+        for segment in self._segments:
+            try:
+                segment.close()
+            except BufferError:
+                # 仍有未释放的视图，只解除链接
+                pass
+            segment.unlink()
+        self._segments = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_encryption_pool(processes, slot_size=DEFAULT_SLOT_SIZE, slots=None):
+    """
+    启用全局加密进程池
+
+    Args:
+        processes (int): 加密进程数，0 表示关闭（在上传线程中加密）
+        slot_size (int): 每块共享内存缓冲区的大小
+        slots (int, optional): 缓冲区数量，一般与全局上传槽位数一致
+
+    Returns:
+        EncryptionPool: 全局加密进程池，关闭时返回 None
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if processes and processes > 0:
+            _pool = EncryptionPool(processes, slot_size, slots)
+        return _pool
+
+
+def get_encryption_pool():
+    """获取全局加密进程池，未启用时返回 None"""
+    return _pool
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+排除规则模块
+启动时把文件类型、文件名通配符和排除目录一次性编译为查找结构，由文件监控（inotify 事件）和存量扫描共用：
+    - 文件类型：按后缀长度分组的 frozenset，每种长度只需一次切片和一次集合查找
+    - 通配符：所有模式合并为一个正则表达式，一次匹配
+    - 排除目录：不含路径分隔符的名称放入 frozenset，匹配监控目录下任意一级目录名；
+      绝对路径和含分隔符的相对路径（相对于监控目录）放入按路径分量组织的前缀树
+    - 各级目录中的 .syncignore（见 syncignore 模块），按目录缓存
+"""
+import os
+import re
+import fnmatch
+
+from modules.syncignore import SyncIgnore
+
+
+class ExclusionRules:
+    """编译后的排除规则（只读，可在多个线程中共用）"""
+
+    def __init__(self, watch_dir, file_types=None, exclude_patterns=None, exclude_dirs=None, ignore_file=None):
+        """
+        Args:
+            watch_dir (str): 监控目录，相对路径的排除目录以它为基准
+            file_types (list): 要处理的文件类型列表，如['.jpg', '.pdf']，None表示所有类型
+            exclude_patterns (list): 要排除的文件名模式列表，支持通配符
+            exclude_dirs (list): 要排除的目录名称或路径列表
+            ignore_file (str, optional): 分层规则文件名（如 .syncignore），不提供则不读取
+        """
+        self.watch_dir = os.path.abspath(watch_dir)
+        self._watch_prefix = self.watch_dir.rstrip(os.sep) + os.sep
+
+        # 文件类型：{后缀长度: 后缀集合}，与 str.endswith 的语义一致
+        self.file_types = None
+        if file_types and all(file_types):
+            by_length = {}
+            for ext in file_types:
+                by_length.setdefault(len(ext), set()).add(ext)
+            self.file_types = tuple((length, frozenset(exts)) for length, exts in sorted(by_length.items()))
+
+        # 通配符：合并为一个正则表达式（fnmatch.translate 生成的每个子表达式都匹配到结尾）
+        patterns = [pattern for pattern in exclude_patterns or [] if pattern]
+        self._pattern = re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns)) if patterns else None
+
+        # 排除目录：目录名集合 + 路径分量前缀树（节点为 dict，'' 键表示该路径被排除）
+        names = set()
+        self._trie = {}
+        self._excluded_paths = set()
+        for exclude_dir in exclude_dirs or []:
+            exclude_dir = exclude_dir.rstrip(os.sep)
+            if not exclude_dir:
+                continue
+            if not os.path.isabs(exclude_dir) and os.sep not in exclude_dir:
+                names.add(exclude_dir)
+                continue
+            path = os.path.normpath(os.path.join(self.watch_dir, exclude_dir))
+            self._excluded_paths.add(path)
+            node = self._trie
+            for component in filter(None, path.split(os.sep)):
+                node = node.setdefault(component, {})
+            node[''] = True
+        self.exclude_names = frozenset(names)
+        self._excluded_paths = frozenset(self._excluded_paths)
+
+        self.syncignore = SyncIgnore(self.watch_dir, ignore_file) if ignore_file else None
+
+    def excludes_name(self, file_name):
+        """按文件名判断（文件类型和通配符），不考虑所在目录"""
+        if self.file_types is not None:
+            for length, exts in self.file_types:
+                if file_name[-length:] in exts:
+                    break
+            else:
+                return True
+        return self._pattern is not None and self._pattern.match(file_name) is not None
+
+    def excludes_file(self, file_path, file_name):
+        """逐级遍历目录树时判断文件是否应被排除（所在目录已经检查过）"""
+        if self.excludes_name(file_name):
+            return True
+        return self.syncignore is not None and self.syncignore.is_ignored(file_path, False)
+
+    def excludes_subdir(self, dir_path, dir_name):
+        """
+        逐级遍历目录树时判断子目录是否应被剪枝（上级目录已经检查过，只需检查这一级）
+
+        Args:
+            dir_path (str): 子目录的绝对路径
+            dir_name (str): 子目录名
+        """
+        if dir_name in self.exclude_names or dir_path in self._excluded_paths:
+            return True
+        return self.syncignore is not None and self.syncignore.is_ignored(dir_path, True)
+
+    def is_excluded_dir(self, dir_path):
+        """
+        判断目录（及其下的所有内容）是否被排除
+
+        Args:
+            dir_path (str): 目录的绝对路径
+        """
+        if self._trie:
+            node = self._trie
+            if '' in node:
+                return True
+            for component in filter(None, dir_path.split(os.sep)):
+                node = node.get(component)
+                if node is None:
+                    break
+                if '' in node:
+                    return True
+        if self.exclude_names and dir_path.startswith(self._watch_prefix):
+            for component in dir_path[len(self._watch_prefix):].split(os.sep):
+                if component in self.exclude_names:
+                    return True
+        return self.syncignore is not None and self.syncignore.is_ignored_tree(dir_path)
+
+    def is_excluded(self, file_path):
+        """
+        判断文件是否应被排除（文件名规则和所在目录规则）
+
+        Args:
+            file_path (str): 文件的绝对路径
+        """
+        file_dir, file_name = os.path.split(file_path)
+        if self.excludes_name(file_name) or self.is_excluded_dir(file_dir):
+            return True
+        return self.syncignore is not None and self.syncignore.is_ignored(file_path, False)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+本地文件状态模块
+在 SQLite 数据库（WAL 模式）中记录每个已上传文件的 (设备号, inode, 大小, 修改时间, 内容MD5, 远程路径, 上传方式, 上传时间)。
+启动时扫描已存在的文件（-u）只需比较 stat 信息、远程路径和上传方式，未变化的文件既不读取内容也不再入队，
+容器重启后不会重新上传整个目录；更换远程目录或开关加密后则会重新上传。
+"""
+import os
+import time
+import sqlite3
+import threading
+
+# 默认状态数据库（位于配置目录下，Docker 部署时随配置一起持久化）
+DEFAULT_STATE_PATH = os.path.join('config', 'file_state.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_state (
+    path TEXT PRIMARY KEY,
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    md5 TEXT,
+    remote_path TEXT NOT NULL,
+    mode TEXT,
+    uploaded REAL NOT NULL
+);
+"""
+
+
+def upload_mode(encrypt, segmented=False):
+    """
+    上传方式标记，记录在状态库中，与当前设置不同的文件需要重新上传
+
+    Returns:
+        str: plain（不加密）、encrypted（整体加密）或 segmented（分段加密）
+    """
+    if not encrypt:
+        return 'plain'
+    return 'segmented' if segmented else 'encrypted'
+
+
+class FileStateStore:
+    """
+    本地文件状态库
+
+    以绝对路径为键。所有线程共用一个 SQLite 连接，写操作由锁串行化，
+    每次记录都是一个独立的事务，进程崩溃时 WAL 保证已提交的记录不会丢失。
+    """
+
+    def __init__(self, db_path=DEFAULT_STATE_PATH):
+        """
+        Args:
+            db_path (str): 状态数据库路径
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        # 旧版本的状态库没有 mode 列，其中的记录上传方式未知，下次扫描时重新上传
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(file_state)')]
+        if 'mode' not in columns:
+            self.conn.execute('ALTER TABLE file_state ADD COLUMN mode TEXT')
+
+    def is_unchanged(self, path, file_stat, remote_path, mode):
+        """
+        文件自上次上传后是否未发生变化（只比较 stat 信息，不读取文件内容）
+
+        Args:
+            path (str): 本地文件路径
+            file_stat (os.stat_result): 文件当前的 stat 信息
+            remote_path (str): 按当前设置应上传到的远程路径
+            mode (str): 当前的上传方式（upload_mode 的返回值）
+
+        Returns:
+            bool: 设备号、inode、大小、修改时间、远程路径和上传方式都与记录一致时返回 True
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT dev, inode, size, mtime_ns, remote_path, mode FROM file_state WHERE path = ?',
+                (os.path.abspath(path),)
+            ).fetchone()
+        return row is not None and row == (file_stat.st_dev, file_stat.st_ino, file_stat.st_size,
+                                           file_stat.st_mtime_ns, remote_path, mode)
+
+    def record(self, path, file_stat, remote_path, mode, md5=None):
+        """
+        记录一个上传成功的文件
+
+        Args:
+            path (str): 本地文件路径
+            file_stat (os.stat_result): 开始上传前的 stat 信息（上传期间文件被修改时下次扫描仍会重新上传）
+            remote_path (str): 远程文件路径
+            mode (str): 上传方式（upload_mode 的返回值）
+            md5 (str, optional): 上传内容的MD5（加密上传时为密文的MD5）
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO file_state (path, dev, inode, size, mtime_ns, md5, remote_path, mode, uploaded) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (os.path.abspath(path), file_stat.st_dev, file_stat.st_ino, file_stat.st_size,
+                 file_stat.st_mtime_ns, md5, remote_path, mode, time.time())
+            )
+
+    def lookup(self, path):
+        """
+        查询文件的上传记录
+
+        Returns:
+            dict: 上传记录，没有记录时返回 None
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT dev, inode, size, mtime_ns, md5, remote_path, mode, uploaded FROM file_state WHERE path = ?',
+                (os.path.abspath(path),)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('dev', 'inode', 'size', 'mtime_ns', 'md5', 'remote_path', 'mode', 'uploaded'), row))
+
+    def remove(self, path):
+        """删除文件的上传记录"""
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM file_state WHERE path = ?', (os.path.abspath(path),))
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM file_state').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
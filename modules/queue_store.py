@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+持久化上传队列模块
+在 SQLite 数据库（WAL 模式）中记录已检测到但尚未上传成功的文件。
+文件被检测到或加入上传队列时写入记录，合并（xpanfilecreate）成功后删除；
+进程崩溃或容器重启后只需重新加入这些记录，恢复耗时与未完成的文件数成正比，而不是整个目录树。
+
+写操作先缓存在内存中，由后台线程每隔 flush_interval 秒（或积累 batch_size 条时）在一个事务中批量提交，
+扫描百万个文件时不会为每个文件单独提交一次事务。进程崩溃时最多丢失最近 flush_interval 秒内的记录。
+"""
+import os
+import time
+import sqlite3
+import threading
+
+# 默认队列数据库（位于配置目录下，Docker 部署时随配置一起持久化）
+DEFAULT_QUEUE_DB = os.path.join('config', 'upload_queue.db')
+
+# 默认批量提交间隔（秒）
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# 积累多少条写操作时立即提交
+DEFAULT_BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_uploads (
+    path TEXT PRIMARY KEY,
+    base_dir TEXT,
+    enqueued REAL NOT NULL
+);
+"""
+
+
+class UploadQueueStore:
+    """
+    未完成上传的持久化记录
+
+    以文件路径为键，同一文件多次加入只保留一条记录（保留最早的入队时间）。
+    写操作按调用顺序批量执行，先加入后删除的记录不会被误恢复。
+    """
+
+    def __init__(self, db_path=DEFAULT_QUEUE_DB, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            db_path (str): 队列数据库路径
+            flush_interval (float): 批量提交间隔（秒）
+            batch_size (int): 积累多少条写操作时立即提交
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._operations = []  # [(sql, 参数)]
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, name='queue-store', daemon=True)
+        self._thread.start()
+
+    def _append(self, sql, params):
+        with self._condition:
+            self._operations.append((sql, params))
+            if len(self._operations) >= self.batch_size:
+                self._condition.notify()
+
+    def add(self, path, base_dir=None):
+        """
+        记录一个待上传的文件（已有记录时不变）
+
+        Args:
+            path (str): 本地文件路径
+            base_dir (str, optional): 基础目录（用于构建远程路径）
+        """
+        self._append('INSERT OR IGNORE INTO pending_uploads (path, base_dir, enqueued) VALUES (?, ?, ?)',
+                     (os.path.abspath(path), base_dir, time.time()))
+
+    def remove(self, path):
+        """文件已上传成功（或不再需要上传），删除记录"""
+        self._append('DELETE FROM pending_uploads WHERE path = ?', (os.path.abspath(path),))
+
+    def flush(self):
+        """立即提交缓存的写操作"""
+        # 取出和执行都在 self.lock 内，多个线程同时 flush 时各批次仍按顺序执行
+        with self.lock:
+            with self._condition:
+                operations, self._operations = self._operations, []
+            if not operations:
+                return
+            with self.conn:
+                for sql, params in operations:
+                    self.conn.execute(sql, params)
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                if self._running and len(self._operations) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                running = self._running
+            self.flush()
+            if not running:
+                return
+
+    def pending(self):
+        """
+        所有未完成的文件（按入队时间排序）
+
+        Returns:
+            list: [(文件路径, 基础目录), ...]
+        """
+        self.flush()
+        with self.lock:
+            return self.conn.execute('SELECT path, base_dir FROM pending_uploads ORDER BY enqueued').fetchall()
+
+    def count(self):
+        self.flush()
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM pending_uploads').fetchone()[0]
+
+    def close(self):
+        """提交剩余的写操作并关闭数据库"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+上传限速模块
+全局令牌桶限速器，作用在分片上传的字节流上（每发送一个数据块前先取令牌），
+所有上传线程共享同一个令牌桶；支持按时间段切换限速值，并可在运行时调整。
+"""
+import re
+import threading
+import time
+from datetime import datetime
+
+# 未设置突发量时，令牌桶容量至少能容纳一个发送块
+MIN_BURST = 64 * 1024
+
+# 按时间段限速时，重新计算当前限速值的间隔（秒）
+SCHEDULE_CHECK_INTERVAL = 30
+
+_RULE_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\d+)\s*$')
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+
+    令牌以 rate 字节/秒的速度补充，最多积累 capacity 字节（即突发量）。
+    单次取用超过容量时允许欠账，长期平均速率仍为 rate。
+    """
+
+    def __init__(self, rate=0, burst=None):
+        """
+        Args:
+            rate (float): 速率（字节/秒），0 表示不限速
+            burst (int, optional): 令牌桶容量（字节），默认为1秒的流量
+        """
+        self._cond = threading.Condition()
+        self.rate = 0
+        self.capacity = MIN_BURST
+        self.tokens = MIN_BURST
+        self.updated = time.monotonic()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """
+        调整速率，正在等待的线程会按新速率重新计算等待时间
+
+        Args:
+            rate (float): 速率（字节/秒），0 表示不限速
+            burst (int, optional): 令牌桶容量（字节），默认为1秒的流量
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            unlimited = self.rate <= 0
+            self.rate = max(0, rate)
+            self.capacity = max(MIN_BURST, int(burst or self.rate))
+            # 从不限速切换过来时令牌桶是满的
+            self.tokens = self.capacity if unlimited else min(self.tokens, self.capacity)
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        else:
+            self.tokens = self.capacity
+        self.updated = now
+
+    def consume(self, n):
+        """
+        取用 n 字节的令牌，令牌不足时阻塞等待
+
+        Args:
+            n (int): 字节数
+        """
+        with self._cond:
+            while True:
+                if self.rate <= 0:
+                    return
+                self._refill(time.monotonic())
+                need = min(n, self.capacity)
+                if self.tokens >= need:
+                    self.tokens -= n
+                    return
+                self._cond.wait((need - self.tokens) / self.rate)
+
+
+def parse_schedule(spec):
+    """
+    解析按时间段限速的规则
+
+    规则格式为 "开始-结束=限速KB/s"，多条规则用分号或逗号分隔，
+    也可以是规则字符串组成的列表；限速为0表示不限速，结束时间早于开始时间表示跨越午夜。
+    例如 "01:00-07:00=0;07:00-01:00=2048"。
+
+    Args:
+        spec (str | list): 规则
+
+    Returns:
+        list: [(开始分钟, 结束分钟, 限速KB/s), ...]
+    """
+    if not spec:
+        return []
+    if isinstance(spec, str):
+        spec = re.split(r'[;,]', spec)
+
+    rules = []
+    for item in spec:
+        if not str(item).strip():
+            continue
+        match = _RULE_PATTERN.match(str(item))
+        if not match:
+            raise ValueError(f"无效的限速时间段规则: {item}（格式应为 HH:MM-HH:MM=KB/s）")
+        start_h, start_m, end_h, end_m, limit = (int(g) for g in match.groups())
+        if start_h > 24 or end_h > 24 or start_m > 59 or end_m > 59:
+            raise ValueError(f"无效的限速时间段规则: {item}")
+        rules.append((start_h * 60 + start_m, end_h * 60 + end_m, limit))
+    return rules
+
+
+def _rule_matches(rule, minute):
+    start, end, _ = rule
+    if start <= end:
+        return start <= minute < end
+    # 跨越午夜
+    return minute >= start or minute < end
+
+
+class BandwidthLimiter:
+    """
+    上传带宽限速器
+
+    默认限速对全部时间生效，命中时间段规则时使用规则中的限速（先匹配的规则优先）。
+    """
+
+    def __init__(self, limit=0, schedule=None, burst=None):
+        """
+        Args:
+            limit (int): 默认限速（KB/s），0 表示不限速
+            schedule (str | list, optional): 时间段规则，见 parse_schedule
+            burst (int, optional): 突发量（KB），默认为1秒的流量
+        """
+        self.bucket = TokenBucket()
+        self._lock = threading.Lock()
+        self.current_limit = 0
+        self.configure(limit, schedule, burst)
+
+    def configure(self, limit=0, schedule=None, burst=None):
+        """
+        修改限速设置，立即对正在进行的上传生效
+
+        Args:
+            limit (int): 默认限速（KB/s），0 表示不限速
+            schedule (str | list, optional): 时间段规则，见 parse_schedule
+            burst (int, optional): 突发量（KB），默认为1秒的流量
+        """
+        rules = parse_schedule(schedule)
+        with self._lock:
+            self.limit = max(0, int(limit or 0))
+            self.rules = rules
+            self.burst = int(burst) if burst else None
+            self._next_check = 0
+        self._apply(force=True)
+
+    def limit_at(self, moment=None):
+        """
+        计算某一时刻生效的限速值
+
+        Args:
+            moment (datetime, optional): 时刻，默认为当前时间
+
+        Returns:
+            int: 限速（KB/s），0 表示不限速
+        """
+        moment = moment or datetime.now()
+        minute = moment.hour * 60 + moment.minute
+        for rule in self.rules:
+            if _rule_matches(rule, minute):
+                return rule[2]
+        return self.limit
+
+    def _apply(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + SCHEDULE_CHECK_INTERVAL
+            limit = self.limit_at()
+            if not force and limit == self.current_limit:
+                return
+            self.current_limit = limit
+            burst = self.burst * 1024 if self.burst else None
+        self.bucket.set_rate(limit * 1024, burst)
+        if not force:
+            label = f"{limit}KB/s" if limit else "不限速"
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🚦 上传限速切换为 {label}")
+
+    def consume(self, n):
+        """
+        发送 n 字节前调用，超出限速时阻塞
+
+        Args:
+            n (int): 即将发送的字节数
+        """
+        if self.rules:
+            self._apply()
+        self.bucket.consume(n)
+
+    def describe(self):
+        """返回当前限速设置的可读描述"""
+        def label(limit):
+            return f"{limit}KB/s" if limit else "不限速"
+        parts = [f"默认 {label(self.limit)}"]
+        for start, end, limit in self.rules:
+            parts.append(f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d} {label(limit)}")
+        return "，".join(parts)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def configure_bandwidth_limiter(limit=0, schedule=None, burst=None):
+    """
+    设置全局上传限速，可在运行时重复调用以调整限速
+
+    Args:
+        limit (int): 默认限速（KB/s），0 表示不限速
+        schedule (str | list, optional): 时间段规则，见 parse_schedule
+        burst (int, optional): 突发量（KB）
+
+    Returns:
+        BandwidthLimiter: 全局限速器
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = BandwidthLimiter(limit, schedule, burst)
+        else:
+            _limiter.configure(limit, schedule, burst)
+        return _limiter
+
+
+def get_bandwidth_limiter():
+    """获取全局限速器，未配置时返回不限速的限速器"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = BandwidthLimiter()
+        return _limiter
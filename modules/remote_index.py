@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+远程文件索引模块
+在本地 SQLite 数据库中维护一份网盘目录树的镜像（路径、fs_id、大小、MD5、服务端修改时间、类别），
+上传前判断远程文件是否已存在、恢复时列出目录和查找 fs_id 都只需查询本地数据库，不再逐个调用接口。
+
+索引通过分页的 xpanfilelistall（递归）或 xpanfilelist（单个目录）按需全量刷新，
+平时由上传成功后的 create 响应增量更新。
+
+用法:
+    python -m modules.remote_index refresh /apps/autoSync
+    python -m modules.remote_index ls /apps/autoSync/photos
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+import openapi_client
+from openapi_client.api import multimediafile_api, fileinfo_api
+from modules.api_clients import get_api_client, PAN_HOST
+from modules.retry_policy import DEFAULT_RETRY_POLICY
+
+# 默认索引数据库（位于配置目录下，Docker 部署时随配置一起持久化）
+DEFAULT_INDEX_PATH = os.path.join('config', 'remote_index.db')
+
+# 列表接口每页的最大条目数
+LIST_PAGE_SIZE = 1000
+
+# 索引记录的字段（与接口返回的字段同名）
+FIELDS = ('path', 'fs_id', 'size', 'md5', 'server_mtime', 'category', 'isdir')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS remote_files (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    fs_id INTEGER,
+    size INTEGER NOT NULL DEFAULT 0,
+    md5 TEXT,
+    server_mtime INTEGER NOT NULL DEFAULT 0,
+    category INTEGER NOT NULL DEFAULT 0,
+    isdir INTEGER NOT NULL DEFAULT 0,
+    refreshed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS remote_files_parent ON remote_files (parent);
+CREATE INDEX IF NOT EXISTS remote_files_fs_id ON remote_files (fs_id);
+"""
+
+
+def _subtree_range(path):
+    """path 下所有后代路径的范围 [low, high)，'0' 是 '/' 之后的下一个字符"""
+    path = path.rstrip('/')
+    return path + '/', path + '0'
+
+
+class RemoteIndex:
+    """
+    远程文件索引
+
+    所有线程共用一个 SQLite 连接（WAL 模式），写操作由锁串行化。
+    全量刷新时先写入新记录，完成后再删除本次没有出现的旧记录，刷新过程中索引始终可用。
+    """
+
+    def __init__(self, db_path=DEFAULT_INDEX_PATH):
+        """
+        Args:
+            db_path (str): 索引数据库路径
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    def _upsert(self, entries, refreshed):
+        rows = []
+        for entry in entries:
+            path = entry.get('path')
+            if not path:
+                continue
+            rows.append((
+                path, os.path.dirname(path) or '/', entry.get('fs_id'), entry.get('size') or 0,
+                entry.get('md5'), entry.get('server_mtime') or 0, entry.get('category') or 0,
+                1 if entry.get('isdir') else 0, refreshed
+            ))
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO remote_files '
+            '(path, parent, fs_id, size, md5, server_mtime, category, isdir, refreshed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+        )
+        return len(rows)
+
+    def record(self, entry):
+        """
+        记录一个新建的远程文件（上传成功后用 create / 秒传的响应增量更新）
+
+        Args:
+            entry (dict): 包含 path 的文件信息，缺少 server_mtime 时使用当前时间
+        """
+        if not entry or not entry.get('path'):
+            return
+        entry = {field: entry.get(field) for field in FIELDS}
+        if not entry['server_mtime']:
+            entry['server_mtime'] = int(time.time())
+        with self.lock, self.conn:
+            self._upsert([entry], time.time())
+
+    def remove(self, path):
+        """删除一个路径及其下的所有记录"""
+        low, high = _subtree_range(path)
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM remote_files WHERE path = ? OR (path >= ? AND path < ?)',
+                              (path, low, high))
+
+    def lookup(self, path):
+        """
+        查询远程路径
+
+        Args:
+            path (str): 远程路径
+
+        Returns:
+            dict: 文件信息（FIELDS 中的字段），不存在时返回 None
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT path, fs_id, size, md5, server_mtime, category, isdir FROM remote_files WHERE path = ?',
+                (path,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def exists(self, path, size=None):
+        """远程文件是否存在（指定 size 时还要求大小一致）"""
+        entry = self.lookup(path)
+        return entry is not None and not entry['isdir'] and (size is None or entry['size'] == size)
+
+    def list_dir(self, path, recursive=False):
+        """
+        列出目录内容
+
+        Args:
+            path (str): 远程目录
+            recursive (bool): 是否包含所有子目录中的内容
+
+        Returns:
+            list: 按路径排序的文件信息列表
+        """
+        columns = 'path, fs_id, size, md5, server_mtime, category, isdir'
+        with self.lock:
+            if recursive:
+                low, high = _subtree_range(path)
+                rows = self.conn.execute(
+                    f'SELECT {columns} FROM remote_files WHERE path >= ? AND path < ? ORDER BY path', (low, high)
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    f'SELECT {columns} FROM remote_files WHERE parent = ? ORDER BY path', (path.rstrip('/') or '/',)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM remote_files').fetchone()[0]
+
+    def _refresh(self, fetch_page, scope, params, show_progress):
+        """分页拉取列表并替换 scope 条件内的旧记录（任何一页出错都会抛出异常，不删除旧记录）"""
+        def fetch_checked(start, limit):
+            response = fetch_page(start=start, limit=limit)
+            # 业务错误以 HTTP 200 返回，按 ApiException 抛出，交给重试策略根据 errno 判断是否重试
+            if response.get('errno'):
+                error = openapi_client.ApiException(status=200, reason=f"errno {response.get('errno')}")
+                error.body = json.dumps(response)
+                raise error
+            return response
+
+        started = time.time()
+        start, total = 0, 0
+        while True:
+            response = DEFAULT_RETRY_POLICY.call(fetch_checked, start=start, limit=LIST_PAGE_SIZE)
+            entries = response.get('list') or []
+            with self.lock, self.conn:
+                total += self._upsert(entries, started)
+            if show_progress:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🗂️  已索引 {total} 个远程条目")
+            if 'has_more' in response:
+                if not response.get('has_more'):
+                    break
+                start = response.get('cursor') or start + len(entries)
+            else:
+                if len(entries) < LIST_PAGE_SIZE:
+                    break
+                start += len(entries)
+        # 本次刷新没有出现的记录已在云端删除（刷新期间由 record 写入的记录时间更新，不受影响）
+        with self.lock, self.conn:
+            removed = self.conn.execute(f'DELETE FROM remote_files WHERE ({scope}) AND refreshed < ?',
+                                        params + (started,)).rowcount
+        return total, removed
+
+    def refresh(self, access_token, path, show_progress=True):
+        """
+        通过 xpanfilelistall 递归刷新目录下的全部记录
+
+        Args:
+            access_token (str): 访问令牌
+            path (str): 远程目录
+            show_progress (bool): 是否显示进度
+
+        Returns:
+            tuple: (拉取的条目数, 删除的过期记录数)
+        """
+        api_instance = multimediafile_api.MultimediafileApi(get_api_client(PAN_HOST))
+
+        def fetch_page(start, limit):
+            return api_instance.xpanfilelistall(access_token=access_token, path=path, recursion=1,
+                                                start=start, limit=limit)
+
+        low, high = _subtree_range(path)
+        return self._refresh(fetch_page, 'path >= ? AND path < ?', (low, high), show_progress)
+
+    def refresh_dir(self, access_token, path, show_progress=False):
+        """
+        通过 xpanfilelist 只刷新一个目录的直接子项
+
+        Args:
+            access_token (str): 访问令牌
+            path (str): 远程目录
+            show_progress (bool): 是否显示进度
+
+        Returns:
+            tuple: (拉取的条目数, 删除的过期记录数)
+        """
+        api_instance = fileinfo_api.FileinfoApi(get_api_client(PAN_HOST))
+
+        def fetch_page(start, limit):
+            return api_instance.xpanfilelist(access_token=access_token, dir=path, start=str(start), limit=limit)
+
+        return self._refresh(fetch_page, 'parent = ?', (path.rstrip('/') or '/',), show_progress)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def configure_remote_index(db_path=DEFAULT_INDEX_PATH):
+    """
+    启用全局远程文件索引
+
+    Args:
+        db_path (str): 索引数据库路径，为 None 时关闭
+
+    Returns:
+        RemoteIndex: 全局远程文件索引，关闭时返回 None
+    """
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+            _index = None
+        if db_path:
+            _index = RemoteIndex(db_path)
+        return _index
+
+
+def get_remote_index():
+    """获取全局远程文件索引，未启用时返回 None"""
+    return _index
+
+
+def record_remote_file(response):
+    """上传成功后把 create / 秒传响应写入全局索引（未启用索引时什么也不做）"""
+    if _index is not None and response and not response.get('errno'):
+        try:
+            _index.record(response)
+        except sqlite3.Error as e:
+            print(f"⚠️  更新远程文件索引失败: {e}")
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+if __name__ == '__main__':
+    from modules.download import _load_access_token
+
+    parser = argparse.ArgumentParser(description='维护本地的远程文件索引')
+    parser.add_argument('command', choices=['refresh', 'ls'], help='refresh: 从网盘刷新索引；ls: 列出索引中的目录')
+    parser.add_argument('path', help='远程目录，如 /apps/autoSync')
+    parser.add_argument('--db', default=DEFAULT_INDEX_PATH, help=f'索引数据库路径，默认 {DEFAULT_INDEX_PATH}')
+    parser.add_argument('-R', '--recursive', action='store_true', help='ls 时列出所有子目录中的内容')
+    parser.add_argument('--access-token', help='访问令牌，默认从 config/config.yaml 读取')
+    args = parser.parse_args()
+
+    index = RemoteIndex(args.db)
+    if args.command == 'refresh':
+        token = args.access_token or _load_access_token()
+        if not token:
+            print("❌ 未找到访问令牌，请先运行 main.py 完成授权或使用 --access-token 指定")
+            sys.exit(1)
+        fetched, removed = index.refresh(token, args.path)
+        print(f"✅ 索引刷新完成: {fetched} 个条目，清理 {removed} 条过期记录，共 {index.count()} 条")
+    else:
+        for entry in index.list_dir(args.path, args.recursive):
+            mtime = datetime.fromtimestamp(entry['server_mtime']).strftime('%Y-%m-%d %H:%M')
+            size = '<目录>' if entry['isdir'] else _format_size(entry['size'])
+            print(f"{mtime}  {size:>10}  {entry['path']}")
+    index.close()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+分片级重试策略模块
+区分可重试和致命错误，对可重试错误按指数退避（带随机抖动）重试，
+避免单个分片的偶发失败导致整个文件上传失败。
+"""
+import asyncio
+import json
+import random
+import time
+
+import urllib3
+import openapi_client
+
+# 可重试的HTTP状态码（0 表示 SSL 等连接层错误）
+RETRYABLE_STATUSES = frozenset({0, 408, 429, 500, 502, 503, 504})
+
+# 致命的百度网盘错误码，重试也不会成功
+#   -6: 身份验证失败  -7: 文件或目录名错误或无权访问  -8: 文件或目录已存在
+#   31024: 没有申请上传权限  31299: 第一个分片的大小小于4MB
+#   31363: 分片缺失  31364: 超出分片大小限制  31365: 文件总大小超限
+FATAL_ERRNOS = frozenset({-6, -7, -8, 31024, 31299, 31363, 31364, 31365})
+
+# 可重试的百度网盘错误码
+#   31034: 命中接口频控
+RETRYABLE_ERRNOS = frozenset({31034})
+
+
+def _parse_errno(exception):
+    """从 ApiException 的响应体中解析百度网盘错误码，解析失败返回 None"""
+    body = getattr(exception, 'body', None)
+    if not body:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    errno = data.get('errno', data.get('error_code'))
+    try:
+        return int(errno) if errno is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    分片上传重试策略
+
+    第 n 次重试前等待 min(max_delay, base_delay * 2^(n-1)) 秒，
+    并乘以 [1 - jitter, 1] 之间的随机系数，避免多个分片同时重试。
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0, jitter=0.5,
+                 retryable_statuses=RETRYABLE_STATUSES, fatal_errnos=FATAL_ERRNOS,
+                 retryable_errnos=RETRYABLE_ERRNOS):
+        """
+        Args:
+            max_attempts (int): 最大尝试次数（含首次），1 表示不重试
+            base_delay (float): 首次重试前的等待时间（秒）
+            max_delay (float): 单次等待时间上限（秒）
+            jitter (float): 随机抖动比例，0 表示不抖动
+            retryable_statuses (set): 可重试的HTTP状态码
+            fatal_errnos (set): 致命的百度网盘错误码
+            retryable_errnos (set): 可重试的百度网盘错误码
+        """
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts 必须大于等于1: {max_attempts}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retryable_statuses = frozenset(retryable_statuses)
+        self.fatal_errnos = frozenset(fatal_errnos)
+        self.retryable_errnos = frozenset(retryable_errnos)
+
+    def is_retryable(self, exception):
+        """
+        判断异常是否值得重试
+
+        Args:
+            exception (Exception): 上传分片时抛出的异常
+
+        Returns:
+            bool: 可重试返回 True
+        """
+        if isinstance(exception, openapi_client.ApiException):
+            errno = _parse_errno(exception)
+            if errno in self.fatal_errnos:
+                return False
+            if errno in self.retryable_errnos:
+                return True
+            return exception.status in self.retryable_statuses
+        # 连接被重置、超时等网络层错误
+        if isinstance(exception, (urllib3.exceptions.HTTPError, ConnectionError, TimeoutError)):
+            return True
+        return False
+
+    def delay(self, attempt):
+        """
+        计算第 attempt 次失败后的等待时间
+
+        Args:
+            attempt (int): 已失败的次数，从1开始
+
+        Returns:
+            float: 等待秒数
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * (1 - self.jitter * random.random())
+
+    def call(self, func, *args, on_retry=None, **kwargs):
+        """
+        按策略执行 func，可重试的错误会在退避后重新调用
+
+        Args:
+            func (callable): 要执行的函数
+            on_retry (callable, optional): 每次重试前调用 on_retry(attempt, exception, delay)
+
+        Returns:
+            func 的返回值；致命错误或重试次数用尽时抛出最后一次的异常
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.is_retryable(e):
+                    raise
+                delay = self.delay(attempt)
+                if on_retry is not None:
+                    on_retry(attempt, e, delay)
+                time.sleep(delay)
+
+    async def call_async(self, func, *args, on_retry=None, **kwargs):
+        """
+        call 的协程版本，func 为协程函数，退避期间不阻塞事件循环
+
+        Args:
+            func (callable): 要执行的协程函数
+            on_retry (callable, optional): 每次重试前调用 on_retry(attempt, exception, delay)
+
+        Returns:
+            func 的返回值；致命错误或重试次数用尽时抛出最后一次的异常
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.is_retryable(e):
+                    raise
+                delay = self.delay(attempt)
+                if on_retry is not None:
+                    on_retry(attempt, e, delay)
+                await asyncio.sleep(delay)
+
+
+# 默认策略：最多尝试5次
+DEFAULT_RETRY_POLICY = RetryPolicy()
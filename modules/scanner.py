@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+目录扫描模块
+启动时扫描监控目录中已存在的文件（-u）。每个目录是一个独立的任务，由线程池并发执行 os.scandir，
+子目录作为新任务提交，网络存储或机械硬盘上多个目录的读取可以同时进行。
+
+文件的类型、大小等判断直接使用 DirEntry 提供的信息（每个文件只 stat 一次），
+找到的文件立即交给回调（放入上传队列），上传线程无需等待扫描结束。
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from modules.exclude_rules import ExclusionRules
+
+# 默认扫描线程数
+DEFAULT_SCAN_WORKERS = 8
+
+# 默认进度输出间隔（秒）
+DEFAULT_PROGRESS_INTERVAL = 10
+
+
+class ScanProgress:
+    """扫描进度计数器（线程安全，每个目录扫描完后合并一次）"""
+
+    FIELDS = ('dirs', 'files', 'enqueued', 'unchanged', 'excluded', 'errors')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.end_time = None
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def add(self, **counts):
+        with self.lock:
+            for field, value in counts.items():
+                setattr(self, field, getattr(self, field) + value)
+
+    def snapshot(self):
+        """
+        当前进度
+
+        Returns:
+            dict: 各项计数，以及 elapsed（秒）和 files_per_second（每秒扫描的文件数）
+        """
+        with self.lock:
+            result = {field: getattr(self, field) for field in self.FIELDS}
+        elapsed = (self.end_time or time.time()) - self.start_time
+        result['elapsed'] = elapsed
+        result['files_per_second'] = result['files'] / elapsed if elapsed > 0 else 0.0
+        return result
+
+    def describe(self):
+        p = self.snapshot()
+        return (f"已扫描 {p['dirs']} 个目录、{p['files']} 个文件（{p['files_per_second']:.0f} 个/秒），"
+                f"入队 {p['enqueued']}，未变化 {p['unchanged']}，排除 {p['excluded']}，错误 {p['errors']}")
+
+
+class DirectoryScanner:
+    """
+    并行目录扫描器
+
+    与 os.walk(followlinks=False) 一致：不进入指向目录的符号链接，指向文件的符号链接按文件处理。
+    """
+
+    def __init__(self, root, emit, recursive=True, rules=None, min_size=0, file_state=None,
+                 workers=DEFAULT_SCAN_WORKERS, remote_path_of=None, mode=None):
+        """
+        Args:
+            root (str): 要扫描的目录
+            emit (callable): 找到需要上传的文件时调用 emit(文件路径)，可能在多个扫描线程中同时调用
+            recursive (bool): 是否递归扫描子目录
+            rules (ExclusionRules, optional): 排除规则，默认不排除任何文件
+            min_size (int): 最小文件大小(字节)
+            file_state (FileStateStore, optional): 文件状态库，提供时跳过上次上传后未变化的文件
+            workers (int): 扫描线程数
+            remote_path_of (callable, optional): remote_path_of(文件路径) 返回文件按当前设置应上传到的远程路径，
+                与状态库中记录的远程路径不同的文件重新上传
+            mode (str, optional): 当前的上传方式，与状态库中记录的不同的文件重新上传
+        """
+        self.root = os.path.abspath(root)
+        self.emit = emit
+        self.recursive = recursive
+        self.rules = rules or ExclusionRules(self.root)
+        self.min_size = min_size
+        self.file_state = file_state
+        self.remote_path_of = remote_path_of
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.progress = ScanProgress()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._finished = threading.Event()
+        self._executor = None
+
+    def _submit(self, path):
+        with self._pending_lock:
+            self._pending += 1
+        self._executor.submit(self._scan_dir, path)
+
+    def _scan_dir(self, path):
+        files = enqueued = unchanged = excluded = errors = 0
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if self.recursive and not entry.is_symlink():
+                                # 逐级剪枝，上级目录已经检查过
+                                if self.rules.excludes_subdir(entry.path, entry.name):
+                                    excluded += 1
+                                else:
+                                    self._submit(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        files += 1
+                        if self.rules.excludes_file(entry.path, entry.name):
+                            excluded += 1
+                            continue
+                        file_stat = entry.stat()
+                        if file_stat.st_size < self.min_size:
+                            continue
+                        if self.file_state is not None and self.file_state.is_unchanged(
+                                entry.path, file_stat,
+                                self.remote_path_of(entry.path) if self.remote_path_of else None, self.mode):
+                            unchanged += 1
+                            continue
+                        self.emit(entry.path)
+                        enqueued += 1
+                    except OSError:
+                        errors += 1
+        except OSError as e:
+            errors += 1
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️  无法读取目录 {path}: {e}")
+        except Exception as e:
+            errors += 1
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 扫描目录 {path} 时出错: {e}")
+        finally:
+            self.progress.add(dirs=1, files=files, enqueued=enqueued, unchanged=unchanged,
+                              excluded=excluded, errors=errors)
+            with self._pending_lock:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._finished.set()
+
+    def run(self, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        """
+        扫描整个目录树，所有文件处理完后返回
+
+        Args:
+            progress_interval (float): 进度输出间隔（秒），0 表示不输出
+
+        Returns:
+            ScanProgress: 最终的扫描计数
+        """
+        if self.rules.is_excluded_dir(self.root):
+            self.progress.end_time = time.time()
+            return self.progress
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scanner') as executor:
+            self._executor = executor
+            self._submit(self.root)
+            while not self._finished.wait(progress_interval or None):
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔍 {self.progress.describe()}")
+        self._executor = None
+        self.progress.end_time = time.time()
+        return self.progress
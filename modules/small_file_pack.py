@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+小文件打包模块
+小于阈值的文件不再单独上传（每个文件都要预上传、上传分片、创建文件三次请求），
+而是依次追加到本地的打包文件中，按大小或时间整体上传。
+每个打包文件配一个索引，记录其中每个文件的相对路径、偏移、长度和修改时间，
+恢复时根据索引从打包文件中取出单个文件。
+调用方可以为每个文件附带一条来源信息（只保存在本地暂存目录），打包文件上传成功后通过 on_uploaded 回调取回，
+用于记录哪些本地文件已经真正上传。
+
+加密上传时打包文件和索引都经过加密（与普通文件相同的密文格式），
+恢复单个文件时只需解密它所在的区间。
+
+用法（恢复）:
+    python -m modules.small_file_pack <索引文件> <打包文件> [-f 相对路径] [-o 输出目录] [-p 密码]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+# 默认打包暂存目录（位于配置目录下，Docker 部署时随配置一起持久化）
+DEFAULT_STAGING_DIR = os.path.join('config', 'pack_staging')
+
+# 网盘中存放打包文件的子目录
+REMOTE_PACK_DIR = '.packs'
+
+DEFAULT_PACK_THRESHOLD = 256 * 1024        # 小于该大小的文件进入打包
+DEFAULT_PACK_SIZE = 64 * 1024 * 1024       # 打包文件达到该大小时上传
+DEFAULT_PACK_AGE = 300                     # 打包文件最多等待多少秒后上传
+
+INDEX_VERSION = 1
+
+PACK_SUFFIX = '.pack'
+INDEX_SUFFIX = '.idx'
+SOURCE_SUFFIX = '.src'
+
+
+class _OpenPack:
+    """正在写入的打包文件"""
+
+    def __init__(self, staging_dir, name):
+        self.name = name
+        self.path = os.path.join(staging_dir, name + PACK_SUFFIX)
+        self.file = open(self.path, 'wb')
+        self.size = 0
+        self.entries = []   # [相对路径, 偏移, 长度, 修改时间]
+        self.sources = []   # add 时传入的来源信息
+        self.created = time.monotonic()
+
+    def append(self, rel_path, data, mtime, source=None):
+        self.file.write(data)
+        self.entries.append([rel_path, self.size, len(data), mtime])
+        if source is not None:
+            self.sources.append(source)
+        self.size += len(data)
+
+
+class SmallFilePacker:
+    """
+    小文件打包器（线程安全）
+
+    多个上传线程可以同时调用 add；打包文件达到 pack_size 时由触发的线程上传，
+    后台线程负责上传存在时间超过 max_age 的打包文件。
+    """
+
+    def __init__(self, upload_func, remote_dir, staging_dir=DEFAULT_STAGING_DIR, threshold=DEFAULT_PACK_THRESHOLD,
+                 pack_size=DEFAULT_PACK_SIZE, max_age=DEFAULT_PACK_AGE, on_uploaded=None):
+        """
+        Args:
+            upload_func (callable): upload_func(本地路径, 远程路径)，成功时返回真值；
+                负责加密（如果启用），打包文件和索引都通过它上传
+            remote_dir (str): 网盘中的同步根目录，打包文件存放在其下的 .packs 目录
+            staging_dir (str): 本地暂存目录
+            threshold (int): 小于该大小（字节）的文件进入打包
+            pack_size (int): 打包文件达到该大小（字节）时上传
+            max_age (int): 打包文件最多等待多少秒后上传
+            on_uploaded (callable, optional): 打包文件和索引都上传成功后调用 on_uploaded(来源信息列表)，
+                列表为该打包中各文件 add 时传入的 source（重启后补传的打包文件同样会回调）
+        """
+        self.upload_func = upload_func
+        self.remote_dir = remote_dir.rstrip('/')
+        self.staging_dir = staging_dir
+        self.threshold = threshold
+        self.pack_size = pack_size
+        self.max_age = max_age
+        self.on_uploaded = on_uploaded
+        self.lock = threading.Lock()
+        self.upload_lock = threading.Lock()
+        self._pack = None
+        self._sequence = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def accepts(self, file_path):
+        """
+        判断文件是否应该进入打包
+
+        Args:
+            file_path (str): 本地文件路径
+
+        Returns:
+            bool: 文件小于阈值时返回 True
+        """
+        try:
+            return os.path.getsize(file_path) < self.threshold
+        except OSError:
+            return False
+
+    def _new_pack_name(self):
+        self._sequence += 1
+        return f"pack-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}"
+
+    def add(self, file_path, rel_path, source=None):
+        """
+        将文件追加到当前打包文件
+
+        Args:
+            file_path (str): 本地文件路径
+            rel_path (str): 文件相对同步根目录的路径，恢复时使用
+            source (optional): 来源信息（可 JSON 序列化），打包文件上传成功后传给 on_uploaded
+
+        Returns:
+            bool: 是否成功加入（上传在之后进行）
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            mtime = int(os.stat(file_path).st_mtime)
+        except OSError as e:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 读取待打包文件失败: {file_path} ({str(e)})")
+            return False
+
+        sealed = None
+        with self.lock:
+            if self._pack is None:
+                self._pack = _OpenPack(self.staging_dir, self._new_pack_name())
+            self._pack.append(rel_path.replace('\\', '/'), data, mtime, source)
+            if self._pack.size >= self.pack_size:
+                sealed = self._seal()
+        if sealed:
+            self._upload_sealed(sealed)
+        return True
+
+    def _seal(self):
+        """关闭当前打包文件并写出本地索引；调用方需持有锁"""
+        pack = self._pack
+        self._pack = None
+        if pack is None:
+            return None
+        pack.file.close()
+        if not pack.entries:
+            os.unlink(pack.path)
+            return None
+        index = {
+            'version': INDEX_VERSION,
+            'pack': pack.name + PACK_SUFFIX,
+            'size': pack.size,
+            'files': pack.entries,
+        }
+        if pack.sources:
+            # 来源信息只保存在本地，须在索引之前写出
+            source_path = os.path.join(self.staging_dir, pack.name + SOURCE_SUFFIX)
+            with open(source_path + '.tmp', 'w') as f:
+                json.dump(pack.sources, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(source_path + '.tmp', source_path)
+        index_path = os.path.join(self.staging_dir, pack.name + INDEX_SUFFIX)
+        temp_path = index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        # 写出索引即表示打包完成，之后即使进程退出也会在下次启动时补传
+        os.replace(temp_path, index_path)
+        return pack.name
+
+    def _upload_sealed(self, name):
+        """上传一个已完成的打包文件及其索引，成功后删除暂存文件"""
+        pack_path = os.path.join(self.staging_dir, name + PACK_SUFFIX)
+        index_path = os.path.join(self.staging_dir, name + INDEX_SUFFIX)
+        source_path = os.path.join(self.staging_dir, name + SOURCE_SUFFIX)
+        remote_base = f"{self.remote_dir}/{REMOTE_PACK_DIR}/{name}"
+        with self.upload_lock:
+            if not os.path.exists(index_path):
+                # 已由其他线程上传
+                return True
+            with open(index_path) as f:
+                count = len(json.load(f)['files'])
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📦 上传打包文件 {name}（{count} 个文件）")
+            if not self.upload_func(pack_path, remote_base + PACK_SUFFIX):
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 打包文件上传失败，保留在暂存目录等待重试: {name}")
+                return False
+            if not self.upload_func(index_path, remote_base + INDEX_SUFFIX):
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 打包索引上传失败，保留在暂存目录等待重试: {name}")
+                return False
+            # 先回调再删除暂存文件：回调前进程退出时只会重复上传，不会漏记
+            if os.path.exists(source_path):
+                with open(source_path) as f:
+                    sources = json.load(f)
+                if self.on_uploaded is not None:
+                    try:
+                        self.on_uploaded(sources)
+                    except Exception as e:
+                        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 处理已上传的打包文件 {name} 时出错: {e}")
+                os.unlink(source_path)
+            os.unlink(pack_path)
+            os.unlink(index_path)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ 打包文件上传完成: {name}（{count} 个文件）")
+            return True
+
+    def flush(self):
+        """立即上传当前打包文件以及暂存目录中所有未上传的打包文件"""
+        with self.lock:
+            self._seal()
+        for name in self.pending():
+            self._upload_sealed(name)
+
+    def pending(self):
+        """
+        暂存目录中已完成但尚未上传的打包文件
+
+        Returns:
+            list: 打包文件名（不含后缀）
+        """
+        names = []
+        for entry in sorted(os.listdir(self.staging_dir)):
+            if entry.endswith(INDEX_SUFFIX):
+                names.append(entry[:-len(INDEX_SUFFIX)])
+        return names
+
+    def recover(self):
+        """
+        启动时处理上次运行遗留的暂存文件：
+        已完成的打包文件重新上传，未完成的（没有索引）直接删除；
+        其中的文件尚未通过 on_uploaded 标记为已上传，会在恢复上传队列或重新扫描时再次打包
+
+        Returns:
+            int: 重新上传的打包文件数
+        """
+        pending = set(self.pending())
+        with self.lock:
+            current = self._pack.name if self._pack else None
+        for entry in os.listdir(self.staging_dir):
+            if entry.endswith(PACK_SUFFIX) or entry.endswith(SOURCE_SUFFIX):
+                name = os.path.splitext(entry)[0]
+                if name not in pending and name != current:
+                    os.unlink(os.path.join(self.staging_dir, entry))
+            elif entry.endswith('.tmp'):
+                os.unlink(os.path.join(self.staging_dir, entry))
+        for name in sorted(pending):
+            self._upload_sealed(name)
+        return len(pending)
+
+    def _flush_loop(self):
+        interval = max(1, min(self.max_age, 30))
+        while not self._stopped.wait(interval):
+            sealed = None
+            with self.lock:
+                if self._pack is not None and time.monotonic() - self._pack.created >= self.max_age:
+                    sealed = self._seal()
+            if sealed:
+                self._upload_sealed(sealed)
+            else:
+                # 重试之前上传失败的打包文件
+                with self.lock:
+                    current = self._pack.name if self._pack else None
+                for name in self.pending():
+                    if name != current:
+                        self._upload_sealed(name)
+
+    def start(self):
+        """启动按时间上传的后台线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name="small-file-packer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台线程并封存当前打包文件，未上传的打包文件在下次启动时由 recover 补传"""
+        self._stopped.set()
+        with self.lock:
+            self._seal()
+
+
+def load_pack_index(index_path, password=None):
+    """
+    读取打包索引
+
+    Args:
+        index_path (str): 从网盘下载的索引文件
+        password (str, optional): 加密上传时的密码，未加密时不提供
+
+    Returns:
+        dict: {'version', 'pack', 'size', 'files': [[相对路径, 偏移, 长度, 修改时间], ...]}
+    """
+    with open(index_path, 'rb') as f:
+        data = f.read()
+    if password is not None:
+        from modules.crypto_utils import decrypt_data
+        data = decrypt_data(data, password)
+    index = json.loads(data.decode('utf-8'))
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError(f"不支持的打包索引版本: {index.get('version')}")
+    return index
+
+
+def extract_from_pack(index, pack_path, rel_path, output_path, password=None):
+    """
+    从打包文件中取出单个文件
+
+    Args:
+        index (dict): load_pack_index 的返回值
+        pack_path (str): 从网盘下载的打包文件
+        rel_path (str): 文件相对路径（与索引中记录的一致）
+        output_path (str): 输出文件路径
+        password (str, optional): 加密上传时的密码，未加密时不提供
+
+    Returns:
+        str: 输出文件路径
+    """
+    for path, offset, length, mtime in index['files']:
+        if path == rel_path:
+            break
+    else:
+        raise KeyError(f"打包文件中没有该文件: {rel_path}")
+
+    if password is not None:
+        from modules.crypto_utils import decrypt_file_range
+        data = decrypt_file_range(pack_path, offset, length, password)
+    else:
+        with open(pack_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        if len(data) != length:
+            raise ValueError(f"打包文件不完整: {pack_path}")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    os.utime(output_path, (mtime, mtime))
+    return output_path
+
+
+def restore_pack(index_path, pack_path, output_dir, password=None, rel_paths=None):
+    """
+    根据索引从打包文件中恢复文件
+
+    Args:
+        index_path (str): 索引文件路径
+        pack_path (str): 打包文件路径
+        output_dir (str): 输出目录，文件按相对路径还原
+        password (str, optional): 加密上传时的密码
+        rel_paths (list, optional): 只恢复这些文件，不提供则恢复全部
+
+    Returns:
+        list: 恢复出的文件路径
+    """
+    index = load_pack_index(index_path, password)
+    if rel_paths is None:
+        rel_paths = [entry[0] for entry in index['files']]
+    restored = []
+    for rel_path in rel_paths:
+        output_path = os.path.join(output_dir, *rel_path.lstrip('/').split('/'))
+        restored.append(extract_from_pack(index, pack_path, rel_path, output_path, password))
+    return restored
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="从小文件打包中恢复文件")
+    parser.add_argument("index", help="从网盘下载的索引文件(.idx)")
+    parser.add_argument("pack", help="从网盘下载的打包文件(.pack)")
+    parser.add_argument("-f", "--file", action="append",
+                        help="要恢复的文件相对路径，可重复指定，不指定则恢复全部")
+    parser.add_argument("-o", "--output-dir", default=".",
+                        help="输出目录，默认为当前目录")
+    parser.add_argument("-p", "--password",
+                        help="加密上传时使用的密码，未加密时不需要")
+    parser.add_argument("-l", "--list", action="store_true",
+                        help="只列出打包中的文件")
+    args = parser.parse_args()
+
+    try:
+        if args.list:
+            for path, offset, length, mtime in load_pack_index(args.index, args.password)['files']:
+                print(f"{datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')}  {length:>10}  {path}")
+        else:
+            for path in restore_pack(args.index, args.pack, args.output_dir, args.password, args.file):
+                print(f"已恢复: {path}")
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+.syncignore 模块
+监控目录及其任意子目录中都可以放置 .syncignore 文件，语法与 .gitignore 相同：
+    - 空行和以 # 开头的行被忽略，以 ! 开头的规则重新包含之前被排除的路径
+    - 以 / 结尾的规则只匹配目录
+    - 包含 /（结尾除外）的规则相对于 .syncignore 所在目录匹配，否则匹配任意一级的文件名或目录名
+    - * 和 ? 不匹配 /，** 匹配任意多级目录
+子目录中的规则优先于上级目录，同一文件中后面的规则优先于前面的。
+被排除的目录整体跳过（与 .gitignore 一样，不能在其中重新包含文件）。
+
+每个目录的规则只读取和编译一次，.syncignore 变化时调用 invalidate 重新加载。
+"""
+import os
+import re
+import threading
+
+# 默认的规则文件名
+DEFAULT_IGNORE_FILE = '.syncignore'
+
+
+def _translate(pattern):
+    """把 gitignore 通配符转换为正则表达式（匹配以 / 分隔的相对路径）"""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                # '**/' 匹配零或多级目录，结尾的 '/**' 匹配其下的所有内容
+                if pattern.startswith('**/', i):
+                    parts.append('(?:.*/)?')
+                    i += 3
+                    continue
+                parts.append('.*')
+                i += 2
+                continue
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            # 紧跟在 '[' 或 '[!' 之后的 ']' 是普通字符
+            start = i + 2 if pattern[i + 1:i + 2] in ('!', '^') else i + 1
+            end = pattern.find(']', start + 1)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body[0] in '!^':
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return ''.join(parts)
+
+
+class IgnoreRule:
+    """一条编译后的规则"""
+
+    __slots__ = ('regex', 'negate', 'dir_only', 'anchored')
+
+    def __init__(self, pattern):
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        self.anchored = '/' in pattern
+        self.regex = re.compile(_translate(pattern.lstrip('/')) + r'\Z', re.DOTALL)
+
+    def matches(self, rel_path, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.match(rel_path if self.anchored else name) is not None
+
+
+def parse_ignore_file(path):
+    """
+    读取并编译一个 .syncignore 文件
+
+    Returns:
+        tuple: IgnoreRule 列表，文件不存在或无法读取时为空
+    """
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return ()
+    rules = []
+    for line in lines:
+        # 行尾未转义的空格被忽略
+        line = line[:-2] + ' ' if line.endswith('\\ ') else line.rstrip(' ')
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('\\#') or line.startswith('\\!'):
+            line = line[1:]
+        if line.strip('/!'):
+            rules.append(IgnoreRule(line))
+    return tuple(rules)
+
+
+class SyncIgnore:
+    """
+    分层的 .syncignore 规则（可在多个线程中共用）
+
+    _rules 缓存每个目录自己的规则，_chains 缓存每个目录生效的 [(规则所在目录, 规则), ...]（从上到下）。
+    """
+
+    def __init__(self, root, file_name=DEFAULT_IGNORE_FILE):
+        """
+        Args:
+            root (str): 监控目录（最上层的 .syncignore 所在目录）
+            file_name (str): 规则文件名
+        """
+        self.root = os.path.abspath(root)
+        self._root_prefix = self.root.rstrip(os.sep) + os.sep
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self._rules = {}
+        self._chains = {}
+
+    def _dir_rules(self, directory):
+        rules = self._rules.get(directory)
+        if rules is None:
+            rules = parse_ignore_file(os.path.join(directory, self.file_name))
+            with self.lock:
+                self._rules[directory] = rules
+        return rules
+
+    def _chain(self, directory):
+        """directory 中的路径适用的所有规则（从监控目录到 directory）"""
+        chain = self._chains.get(directory)
+        if chain is not None:
+            return chain
+        if directory == self.root:
+            parent_chain = ()
+        elif directory.startswith(self._root_prefix):
+            parent_chain = self._chain(os.path.dirname(directory))
+        else:
+            return ()
+        rules = self._dir_rules(directory)
+        chain = parent_chain + ((directory, rules),) if rules else parent_chain
+        with self.lock:
+            self._chains[directory] = chain
+        return chain
+
+    def is_ignored(self, path, is_dir):
+        """
+        只根据各级 .syncignore 判断 path 本身是否被排除（不检查上级目录是否被排除）
+
+        Args:
+            path (str): 绝对路径
+            is_dir (bool): path 是否为目录
+        """
+        directory, name = os.path.split(path)
+        ignored = False
+        for base, rules in self._chain(directory):
+            rel_path = None
+            for rule in rules:
+                if rule.negate == ignored:
+                    # 只有能改变当前结果的规则才需要匹配
+                    if rel_path is None and rule.anchored:
+                        rel_path = os.path.relpath(path, base).replace(os.sep, '/')
+                    if rule.matches(rel_path, name, is_dir):
+                        ignored = not rule.negate
+        return ignored
+
+    def is_ignored_tree(self, path, is_dir=True):
+        """path 或它在监控目录下的任意一级上级目录被排除时返回 True"""
+        if not path.startswith(self._root_prefix):
+            return False
+        current = self.root
+        rel_parts = path[len(self._root_prefix):].split(os.sep)
+        for index, part in enumerate(rel_parts):
+            current = os.path.join(current, part)
+            last = index == len(rel_parts) - 1
+            if self.is_ignored(current, is_dir if last else True):
+                return True
+        return False
+
+    def invalidate(self, directory):
+        """directory 中的 .syncignore 发生变化，下次使用时重新读取"""
+        directory = os.path.abspath(directory)
+        with self.lock:
+            self._rules.pop(directory, None)
+            # 下级目录的规则链都包含这个目录，全部重新计算
+            self._chains.clear()
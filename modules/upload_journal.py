@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+断点续传日志模块
+将每个文件的分片上传会话（uploadid、分片MD5列表、已完成的分片）持久化到磁盘，
+进程崩溃或容器重启后只需补传缺失的分片即可完成上传。
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+# 默认日志目录（位于配置目录下，Docker 部署时随配置一起持久化）
+DEFAULT_JOURNAL_DIR = os.path.join('config', 'upload_journal')
+
+# uploadid 的保守有效期（秒），超过后云端的临时分片可能已被清理，会话直接作废
+DEFAULT_SESSION_LIFETIME = 24 * 3600
+
+# 已完成分片记录文件的后缀
+PARTS_SUFFIX = '.parts'
+
+
+class UploadJournal:
+    """
+    断点续传日志
+
+    每个上传会话保存为一个 JSON 文件，文件名由本地路径和远程路径的哈希决定，
+    只在开始会话时原子地写入一次（写临时文件后 os.replace）。
+    已完成的分片序号逐行追加到同名的 .parts 文件，读取会话时合并，
+    记录一个分片的开销与分片数量无关。
+    """
+
+    def __init__(self, journal_dir=DEFAULT_JOURNAL_DIR, lifetime=DEFAULT_SESSION_LIFETIME):
+        """
+        Args:
+            journal_dir (str): 日志目录
+            lifetime (int): 会话有效期（秒），超过后自动作废
+        """
+        self.journal_dir = journal_dir
+        self.lifetime = lifetime
+        self.lock = threading.Lock()
+        os.makedirs(self.journal_dir, exist_ok=True)
+
+    def _session_path(self, local_path, remote_path):
+        key = f"{os.path.abspath(local_path)}\n{remote_path}".encode('utf-8')
+        return os.path.join(self.journal_dir, hashlib.sha1(key).hexdigest() + '.json')
+
+    @staticmethod
+    def _parts_path(path):
+        return os.path.splitext(path)[0] + PARTS_SUFFIX
+
+    def _read_parts(self, path):
+        """读取已完成的分片序号（崩溃时可能写了一半的最后一行被忽略）"""
+        try:
+            with open(self._parts_path(path)) as f:
+                lines = f.read().split('\n')
+        except OSError:
+            return set()
+        return {int(line) for line in lines[:-1] if line.isdigit()}
+
+    def _write(self, session):
+        path = self._session_path(session['local_path'], session['remote_path'])
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(temp_path, path)
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _is_expired(self, session, now=None):
+        now = now if now is not None else time.time()
+        return now - session.get('created', 0) > self.lifetime
+
+    def load(self, local_path, remote_path, size, mtime_ns, encrypted=False):
+        """
+        读取可续传的会话
+
+        文件大小、修改时间或加密方式发生变化，以及会话已过期时，
+        旧会话会被删除并返回 None。
+
+        Args:
+            local_path (str): 本地文件路径
+            remote_path (str): 远程文件路径
+            size (int): 当前本地文件大小
+            mtime_ns (int): 当前本地文件修改时间（纳秒）
+            encrypted (bool): 本次是否加密上传
+
+        Returns:
+            dict: 会话信息，没有可续传的会话时返回 None
+        """
+        path = self._session_path(local_path, remote_path)
+        with self.lock:
+            try:
+                with open(path) as f:
+                    session = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+            if (session.get('size') != size or session.get('mtime_ns') != mtime_ns
+                    or session.get('encrypted') != encrypted or self._is_expired(session)):
+                self._remove(path)
+                self._remove(self._parts_path(path))
+                return None
+            session['parts'] = sorted(set(session['parts']) | self._read_parts(path))
+
+        return session
+
+    def begin(self, local_path, remote_path, size, mtime_ns, chunk_size, block_list, uploadid,
+              encrypted=False, salt=None, iv=None, header=None):
+        """
+        记录一个新的上传会话
+
+        Args:
+            local_path (str): 本地文件路径
+            remote_path (str): 远程文件路径
+            size (int): 本地文件大小
+            mtime_ns (int): 本地文件修改时间（纳秒）
+            chunk_size (int): 分片大小
+            block_list (list): 分片MD5列表
+            uploadid (str): 预上传返回的 uploadid
+            encrypted (bool): 是否加密上传
+            salt (bytes, optional): 加密盐值，续传时用于重新生成相同的密文
+            iv (bytes, optional): 加密初始化向量
+            header (bytes, optional): 密文头部，续传时用于重建加密器（包含格式版本）
+
+        Returns:
+            dict: 会话信息
+        """
+        session = {
+            'local_path': os.path.abspath(local_path),
+            'remote_path': remote_path,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'chunk_size': chunk_size,
+            'block_list': block_list,
+            'uploadid': uploadid,
+            'encrypted': encrypted,
+            'salt': salt.hex() if salt else None,
+            'iv': iv.hex() if iv else None,
+            'header': header.hex() if header else None,
+            'parts': [],
+            'created': time.time()
+        }
+        with self.lock:
+            path = self._session_path(local_path, remote_path)
+            self._remove(self._parts_path(path))
+            self._write(session)
+        return session
+
+    def mark_part_done(self, session, partseq):
+        """
+        记录一个已上传完成的分片
+
+        只向 .parts 文件追加一行，不重写会话文件也不持有全局锁；
+        以 O_APPEND 一次写入的短行不会与其他线程的写入交错。
+        """
+        path = self._parts_path(self._session_path(session['local_path'], session['remote_path']))
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, f"{partseq}\n".encode())
+        finally:
+            os.close(fd)
+
+    def finish(self, session):
+        """上传完成（或会话失效）后删除会话"""
+        with self.lock:
+            path = self._session_path(session['local_path'], session['remote_path'])
+            self._remove(path)
+            self._remove(self._parts_path(path))
+
+    def expire(self):
+        """
+        清理所有过期的会话
+
+        Returns:
+            int: 清理的会话数量
+        """
+        count = 0
+        now = time.time()
+        with self.lock:
+            for name in os.listdir(self.journal_dir):
+                path = os.path.join(self.journal_dir, name)
+                if name.endswith('.tmp'):
+                    self._remove(path)
+                    continue
+                if name.endswith(PARTS_SUFFIX):
+                    # 会话已删除后才追加的分片记录
+                    if not os.path.exists(os.path.splitext(path)[0] + '.json'):
+                        self._remove(path)
+                    continue
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(path) as f:
+                        session = json.load(f)
+                except (OSError, ValueError):
+                    session = {}
+                if self._is_expired(session, now):
+                    self._remove(path)
+                    self._remove(self._parts_path(path))
+                    count += 1
+        return count
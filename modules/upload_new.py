@@ -12,22 +12,27 @@ import os
 import sys
 import hashlib
 import json
-import io
-import concurrent.futures
 import threading
 import time
-import tempfile
 from tqdm import tqdm
 
 # BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # sys.path.append(BASE_DIR)
 from pprint import pprint
-from openapi_client.api import fileupload_api
+from openapi_client.api import fileupload_api, userinfo_api
+from openapi_client.streaming_multipart import StreamingFile
 import openapi_client
+from modules.retry_policy import DEFAULT_RETRY_POLICY
+from modules.upload_scheduler import get_scheduler
+from modules.api_clients import get_api_client, PAN_HOST, PCS_HOST
+from modules.rate_limiter import get_bandwidth_limiter
+from modules.encrypt_pool import get_encryption_pool
+from modules.remote_index import record_remote_file
 
 # 导入加密工具
 try:
-    from modules.crypto_utils import encrypt_data, decrypt_data, encrypt_file, decrypt_file
+    from modules.crypto_utils import encrypt_data, decrypt_data, encrypt_file, decrypt_file, StreamEncryptor, \
+        SegmentedEncryptor, FORMAT_V1
 except ImportError:
     print("警告: 加密模块导入失败，加密功能将不可用")
     print("请安装所需依赖: pip install pycryptodome")
@@ -45,6 +50,10 @@ except ImportError:
     def decrypt_file(input_file_path, output_file_path=None, password="123456"):
         return input_file_path
 
+    StreamEncryptor = None
+    SegmentedEncryptor = None
+    FORMAT_V1 = 1
+
 
 
 def calculate_file_md5(file_path):
@@ -56,88 +65,398 @@ def calculate_file_md5(file_path):
     return hash_md5.hexdigest()
 
 
-def split_file_to_chunks(file_path, chunk_size=4*1024*1024, encrypt=False, password="123456"):
+# 秒传校验使用的文件头部切片大小
+RAPID_UPLOAD_SLICE_SIZE = 256 * 1024
+
+
+class ContentDigest:
+    """
+    秒传所需的内容摘要
+    
+    在分片计算MD5的同一次读取中累积整个上传内容的MD5（content-md5）
+    和前256KB的MD5（slice-md5），无需再额外读一遍文件。
+    """
+    
+    def __init__(self):
+        self._content = hashlib.md5()
+        self._slice = hashlib.md5()
+        self._slice_remaining = RAPID_UPLOAD_SLICE_SIZE
+    
+    def update(self, data):
+        self._content.update(data)
+        if self._slice_remaining > 0:
+            head = data[:self._slice_remaining]
+            self._slice.update(head)
+            self._slice_remaining -= len(head)
+    
+    @property
+    def content_md5(self):
+        return self._content.hexdigest()
+    
+    @property
+    def slice_md5(self):
+        return self._slice.hexdigest()
+
+
+class ChunkDescriptor:
+    """
+    分片描述符
+    
+    只记录分片在文件中的位置和MD5，不持有分片内容，
+    上传时由 ChunkReader 按需读取，内存占用与文件大小无关。
+    """
+    __slots__ = ('index', 'offset', 'size', 'md5')
+    
+    def __init__(self, index, offset, size, md5):
+        self.index = index
+        self.offset = offset
+        self.size = size
+        self.md5 = md5
+    
+    def __repr__(self):
+        return f"{type(self).__name__}(index={self.index}, offset={self.offset}, size={self.size}, md5={self.md5!r})"
+
+
+class EncryptedChunkDescriptor(ChunkDescriptor):
+    """
+    加密分片描述符
+    
+    offset 为对应明文的偏移，size 为密文分片大小；
+    iv 为前一分片密文的最后16字节（CBC链接向量），final 表示是否为最后一个分片。
+    """
+    __slots__ = ('plain_size', 'iv', 'final')
+    
+    def __init__(self, index, offset, size, md5, plain_size, iv, final):
+        super().__init__(index, offset, size, md5)
+        self.plain_size = plain_size
+        self.iv = iv
+        self.final = final
+
+
+class SegmentedChunkDescriptor(ChunkDescriptor):
+    """
+    分段加密格式（v3）的分片描述符
+    
+    offset 为对应明文的偏移，size 为密文分片大小；分片依次由三部分组成：
+    头部的前 header_size 字节、plain_size 字节明文对应的密文、认证标签表的 [table_offset, table_offset + table_size) 区间。
+    """
+    __slots__ = ('plain_size', 'header_size', 'table_offset', 'table_size')
+    
+    def __init__(self, index, offset, size, md5, plain_size, header_size, table_offset, table_size):
+        super().__init__(index, offset, size, md5)
+        self.plain_size = plain_size
+        self.header_size = header_size
+        self.table_offset = table_offset
+        self.table_size = table_size
+
+
+_thread_buffers = threading.local()
+
+
+def _get_thread_buffer(size):
+    """获取当前线程复用的读缓冲区，峰值内存 = 线程数 × 分片大小"""
+    buffer = getattr(_thread_buffers, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _thread_buffers.buffer = buffer
+    return buffer
+
+
+def _pread_into(fd, view, offset):
+    """从文件指定偏移读满 view，返回实际读取的字节数"""
+    total = 0
+    while total < len(view):
+        if hasattr(os, 'preadv'):
+            n = os.preadv(fd, [view[total:]], offset + total)
+        else:
+            data = os.pread(fd, len(view) - total, offset + total)
+            n = len(data)
+            view[total:total + n] = data
+        if n == 0:
+            break
+        total += n
+    return total
+
+
+class ChunkReader:
+    """
+    分片读取器
+    
+    持有一个只读文件描述符，线程安全地按偏移读取（pread），
+    读取结果写入当前线程复用的缓冲区；加密分片在缓冲区内原地加密。
+    指定加密进程池时，stream 把加密分片交给子进程在共享内存中加密。
+    """
+    
+    def __init__(self, file_path, encryptor=None, pool=None):
+        self.file_path = file_path
+        self.encryptor = encryptor
+        self.pool = pool
+        self.fd = os.open(file_path, os.O_RDONLY)
+    
+    def read(self, chunk):
+        """
+        读取分片内容
+        
+        Args:
+            chunk (ChunkDescriptor): 分片描述符
+            
+        Returns:
+            memoryview: 分片内容，指向线程缓冲区，下次在同一线程调用 read 前有效
+        """
+        view = memoryview(_get_thread_buffer(chunk.size))[:chunk.size]
+        if chunk.size == 0:
+            return view
+        
+        if isinstance(chunk, SegmentedChunkDescriptor):
+            return self._read_segmented(chunk, view)
+        
+        if not isinstance(chunk, EncryptedChunkDescriptor):
+            n = _pread_into(self.fd, view, chunk.offset)
+            if n != chunk.size:
+                raise IOError(f"读取分片失败，文件可能已被修改: {self.file_path}")
+            return view
+        
+        header = self.encryptor.header
+        body = view[len(header):] if chunk.index == 0 else view
+        n = _pread_into(self.fd, body[:chunk.plain_size], chunk.offset)
+        if n != chunk.plain_size:
+            raise IOError(f"读取分片失败，文件可能已被修改: {self.file_path}")
+        self.encryptor.encrypt_segment_into(body, chunk.plain_size, chunk.iv, chunk.final)
+        if chunk.index == 0:
+            view[:len(header)] = header
+        return view
+    
+    def _read_segmented(self, chunk, view):
+        """按分片的三个组成部分生成分段加密格式的密文"""
+        position = chunk.header_size
+        view[:position] = self.encryptor.header[:position]
+        body = view[position:position + chunk.plain_size]
+        n = _pread_into(self.fd, body, chunk.offset)
+        if n != chunk.plain_size:
+            raise IOError(f"读取分片失败，文件可能已被修改: {self.file_path}")
+        self.encryptor.encrypt_range_into(body, chunk.offset, chunk.plain_size)
+        position += chunk.plain_size
+        view[position:] = self.encryptor.tags[chunk.table_offset:chunk.table_offset + chunk.table_size]
+        return view
+    
+    def stream(self, chunk, name):
+        """
+        以流式文件参数的形式提供分片内容，上传时边读边发送
+        
+        明文分片直接按文件区间 pread 发送，不经过线程缓冲区；
+        加密分片先在线程缓冲区（或加密进程池的共享内存）内原地加密，再以 memoryview 切片发送；
+        使用共享内存时，关闭返回的文件对象才会归还缓冲区。
+        
+        Args:
+            chunk (ChunkDescriptor): 分片描述符
+            name (str): multipart 中的文件名
+            
+        Returns:
+            StreamingFile: 可直接作为 pcssuperfile2 的 file 参数
+        """
+        if isinstance(chunk, (EncryptedChunkDescriptor, SegmentedChunkDescriptor)) and self.pool is not None \
+                and self.pool.fits(chunk.size):
+            if isinstance(chunk, SegmentedChunkDescriptor):
+                lease = self.pool.encrypt_segmented_chunk(self.file_path, self.encryptor, chunk)
+            else:
+                lease = self.pool.encrypt_chunk(self.file_path, self.encryptor, chunk)
+            chunk_file = StreamingFile(lease.view, name=name)
+            chunk_file.on_close = lease.release
+            return chunk_file
+        if isinstance(chunk, (EncryptedChunkDescriptor, SegmentedChunkDescriptor)) or chunk.size == 0:
+            return StreamingFile(self.read(chunk), name=name)
+        return StreamingFile(fd=self.fd, offset=chunk.offset, length=chunk.size, name=name)
+    
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def split_file_to_chunks(file_path, chunk_size=4*1024*1024, encrypt=False, password="123456", encryptor=None,
+                         digest=None):
     """
     将文件分片并计算每个分片的MD5
     
+    只生成分片描述符（偏移、长度、MD5），不保留分片内容；
+    加密时采用流式加密，逐段加密并计算密文分片的MD5。
+    上传时通过 ChunkReader 按描述符重新读取（并加密）分片。
+    
     Args:
         file_path (str): 文件路径
         chunk_size (int): 分片大小，默认4MB
         encrypt (bool): 是否加密文件内容
         password (str): 加密密码，默认为123456
+        encryptor (StreamEncryptor, optional): 流式加密器，不提供则按 password 新建；
+            传入 SegmentedEncryptor 时使用可随机读取的分段加密格式
+        digest (ContentDigest, optional): 提供时同步累积整个上传内容的摘要（用于秒传）
         
     Returns:
         tuple: (chunks_info, total_size)
-            chunks_info: list of dict with keys: 'data', 'md5', 'size', 'index'
-            total_size: 文件总大小
+            chunks_info: list of ChunkDescriptor（加密时为 EncryptedChunkDescriptor 或 SegmentedChunkDescriptor）
+            total_size: 文件总大小（加密时为密文大小）
     """
-    chunks_info = []
-    total_size = 0
-    
     # 检查文件是否为空
     if os.path.getsize(file_path) == 0:
         # 对于空文件，创建一个空的块信息
         empty_md5 = hashlib.md5(b"").hexdigest()
-        chunks_info.append({
-            'data': b"",
-            'md5': empty_md5,
-            'size': 0,
-            'index': 0
-        })
-        return chunks_info, 0
-    
-    # 如果需要加密，先将整个文件加密后再分片
+        return [ChunkDescriptor(0, 0, 0, empty_md5)], 0
+    
     if encrypt:
-        try:
-            # 创建临时文件用于存储加密数据
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                temp_path = temp_file.name
-            
-            # 加密文件内容
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-                
-            encrypted_data = encrypt_data(file_data, password)
-            
-            with open(temp_path, 'wb') as f:
-                f.write(encrypted_data)
-                
-            # 使用加密后的文件进行后续处理
-            file_to_process = temp_path
-        except Exception as e:
-            print(f"加密文件失败: {e}")
-            # 如果加密失败，使用原始文件
-            file_to_process = file_path
-    else:
-        file_to_process = file_path
+        if encryptor is None:
+            encryptor = StreamEncryptor(password)
+        if isinstance(encryptor, SegmentedEncryptor):
+            return _split_segmented_file_to_chunks(file_path, chunk_size, encryptor, digest)
+        return _split_encrypted_file_to_chunks(file_path, chunk_size, encryptor, digest)
     
-    with open(file_to_process, 'rb') as f:
+    chunks_info = []
+    total_size = 0
+    buffer = _get_thread_buffer(chunk_size)
+    
+    with open(file_path, 'rb') as f:
         chunk_index = 0
         while True:
-            chunk_data = f.read(chunk_size)
-            if not chunk_data:
+            n = f.readinto(memoryview(buffer)[:chunk_size])
+            if not n:
                 break
                 
             # 计算分片MD5
+            chunk_data = memoryview(buffer)[:n]
             chunk_md5 = hashlib.md5(chunk_data).hexdigest()
+            if digest is not None:
+                digest.update(chunk_data)
+            chunks_info.append(ChunkDescriptor(chunk_index, total_size, n, chunk_md5))
+            
+            total_size += n
+            chunk_index += 1
+    
+    return chunks_info, total_size
+
+
+def _split_encrypted_file_to_chunks(file_path, chunk_size, encryptor, digest=None):
+    """
+    流式加密并分片，只保留每个密文分片的位置信息和MD5
+    
+    密文流 = 头部(见 crypto_utils 的格式说明) + AES-CBC(明文)，按 chunk_size 切分。
+    第 i 个密文分片对应明文区间 [i*chunk_size - 头部长度, (i+1)*chunk_size - 头部长度)，
+    并记录前一分片密文的最后16字节作为本分片的CBC链接向量。
+    """
+    header = encryptor.header
+    header_size = len(header)
+    if chunk_size % 16 != 0 or chunk_size <= header_size:
+        raise ValueError(f"加密上传的分片大小必须是16的整数倍且大于{header_size}字节: {chunk_size}")
+    
+    file_size = os.path.getsize(file_path)
+    total_size = encryptor.encrypted_size(file_size)
+    chunks_info = []
+    chain_iv = encryptor.iv
+    buffer = _get_thread_buffer(chunk_size)
+    
+    with open(file_path, 'rb') as f:
+        chunk_index = 0
+        while chunk_index * chunk_size < total_size:
+            plain_offset = max(0, chunk_index * chunk_size - header_size)
+            plain_end = min(file_size, (chunk_index + 1) * chunk_size - header_size)
+            final = (chunk_index + 1) * chunk_size >= total_size
             
-            chunks_info.append({
-                'data': chunk_data,
-                'md5': chunk_md5,
-                'size': len(chunk_data),
-                'index': chunk_index
-            })
+            # 首个分片在缓冲区前部预留头部位置
+            start = header_size if chunk_index == 0 else 0
+            body = memoryview(buffer)[start:]
+            plain_size = f.readinto(body[:plain_end - plain_offset])
+            size = start + encryptor.encrypt_segment_into(body, plain_size, chain_iv, final)
+            if chunk_index == 0:
+                buffer[:header_size] = header
+            chunk_data = memoryview(buffer)[:size]
+            if digest is not None:
+                digest.update(chunk_data)
             
-            total_size += len(chunk_data)
+            chunks_info.append(EncryptedChunkDescriptor(
+                chunk_index, plain_offset, size, hashlib.md5(chunk_data).hexdigest(),
+                plain_size, chain_iv, final
+            ))
+            
+            chain_iv = bytes(chunk_data[-16:])
             chunk_index += 1
     
-    # 如果创建了临时文件，删除它
-    if encrypt and 'temp_path' in locals():
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
+    return chunks_info, total_size
+
+
+def _split_segmented_file_to_chunks(file_path, chunk_size, encryptor, digest=None):
+    """
+    按分段加密格式（v3）加密并分片，只保留每个密文分片的位置信息和MD5
+    
+    密文流 = 头部 + 密文（与明文等长）+ 认证标签表，按 chunk_size 切分。
+    各分段的 GCM 加密跨越分片边界连续进行，认证标签依次写入 encryptor.tags，
+    上传时密文部分用 CTR 从分片对应的明文偏移重新生成，标签表直接取自 encryptor.tags。
+    """
+    header_size = encryptor.header_size
+    if chunk_size % 16 != 0 or chunk_size <= header_size:
+        raise ValueError(f"加密上传的分片大小必须是16的整数倍且大于{header_size}字节: {chunk_size}")
+    
+    file_size = os.path.getsize(file_path)
+    encryptor.plain_size = file_size
+    header = encryptor.header
+    segment_size = encryptor.segment_size
+    table_start = header_size + file_size
+    total_size = encryptor.encrypted_size(file_size)
+    tags = bytearray(encryptor.segment_count() * 16)
+    chunks_info = []
+    buffer = _get_thread_buffer(chunk_size)
+    cipher = None
+    
+    with open(file_path, 'rb') as f:
+        chunk_index = 0
+        while chunk_index * chunk_size < total_size:
+            start = chunk_index * chunk_size
+            end = min(total_size, start + chunk_size)
+            view = memoryview(buffer)
+            
+            # 头部
+            header_part = max(0, min(end, header_size) - start)
+            view[:header_part] = header[start:start + header_part]
+            position = header_part
+            
+            # 密文：逐段 GCM 加密，分段结束时记录认证标签
+            plain_offset = min(max(start, header_size), table_start) - header_size
+            plain_end = min(end, table_start) - header_size
+            plain_size = f.readinto(view[position:position + plain_end - plain_offset])
+            if plain_size != plain_end - plain_offset:
+                raise IOError(f"读取文件失败，文件可能已被修改: {file_path}")
+            offset = plain_offset
+            while offset < plain_end:
+                segment_index, within = divmod(offset, segment_size)
+                if within == 0:
+                    cipher = encryptor.segment_cipher(segment_index)
+                n = min(plain_end - offset, segment_size - within)
+                piece = view[position + offset - plain_offset:position + offset - plain_offset + n]
+                cipher.encrypt(piece, output=piece)
+                offset += n
+                if offset % segment_size == 0 or offset == file_size:
+                    tags[segment_index * 16:(segment_index + 1) * 16] = cipher.digest()
+            position += plain_size
+            
+            # 认证标签表（此时所有分段都已加密）
+            table_offset = max(start, table_start) - table_start
+            table_size = max(0, end - max(start, table_start))
+            view[position:position + table_size] = tags[table_offset:table_offset + table_size]
+            position += table_size
+            
+            chunk_data = view[:position]
+            if digest is not None:
+                digest.update(chunk_data)
+            chunks_info.append(SegmentedChunkDescriptor(
+                chunk_index, plain_offset, position, hashlib.md5(chunk_data).hexdigest(),
+                plain_size, header_part, table_offset, table_size
+            ))
+            chunk_index += 1
     
+    encryptor.tags = bytes(tags)
     return chunks_info, total_size
 
 
@@ -182,192 +501,421 @@ class TqdmUploadTracker:
                 print(f"❌ {self.file_name} 上传失败")
 
 
-def auto_chunked_upload(access_token, local_file_path, remote_path, rtype=3, max_workers=3, chunk_size=4*1024*1024, 
-                   show_progress=True, encrypt=False, password="123456"):
+class PreparedUpload:
     """
-    自动分片上传文件到百度网盘（支持并发上传）
+    已完成分片摘要计算和预上传、等待上传分片的文件
+    
+    由 prepare_upload 生成，依次交给 transfer_upload 和 commit_upload。
+    finished 为 True 时（秒传成功或预上传失败）无需再上传分片，结果见 result。
+    """
+    
+    def __init__(self, access_token, local_file_path, remote_path, rtype, chunk_size, journal):
+        self.access_token = access_token
+        self.local_file_path = local_file_path
+        self.remote_path = remote_path
+        self.rtype = rtype
+        self.chunk_size = chunk_size
+        self.journal = journal
+        self.file_name = os.path.basename(local_file_path)
+        self.display_name = self.file_name
+        self.encryptor = None
+        self.chunks_info = []
+        self.total_size = 0
+        self.block_list = []
+        self.session = None
+        self.completed_parts = set()
+        self.uploadid = None
+        self.start_time = time.time()
+        self.finished = False
+        self.result = None
+        self.file_stat = None
+        self.content_md5 = None
+    
+    @property
+    def block_list_json(self):
+        return json.dumps(self.block_list)
+    
+    def finish(self, result):
+        """标记为已结束（不需要再上传分片或合并）"""
+        self.finished = True
+        self.result = result
+        return self
+
+
+def prepare_upload(access_token, local_file_path, remote_path, rtype=3, chunk_size=4*1024*1024, show_progress=True,
+                   encrypt=False, password="123456", rapid_upload=True, journal=None, segmented=False):
+    """
+    上传的第一阶段：分片并计算摘要，然后预上传获取 uploadid
+    
+    启用秒传时，预上传请求会附带 content-md5 / slice-md5，
+    云端已有相同内容时直接完成（return_type == 2），不再上传任何分片。
+    提供断点续传日志时，会话会持久化到磁盘；重启后文件未变化则沿用原 uploadid，跳过预上传。
     
     Args:
         access_token (str): 访问令牌
         local_file_path (str): 本地文件路径
-        remote_path (str): 远程文件路径，如 "/apps/your-app-name/filename.txt"
+        remote_path (str): 远程文件路径
         rtype (int): 返回类型，默认为3
-        max_workers (int): 最大并发线程数，默认为3
         chunk_size (int): 分片大小，默认4MB
-        show_progress (bool): 是否显示进度，默认为True
+        show_progress (bool): 是否显示提示信息，默认为True
         encrypt (bool): 是否加密文件内容
         password (str): 加密密码，默认为123456
+        rapid_upload (bool): 是否尝试秒传，默认为True
+        journal (UploadJournal, optional): 断点续传日志
+        segmented (bool): 加密时使用可随机读取的分段加密格式（v3）
         
     Returns:
-        dict: 上传结果
+        PreparedUpload: 预上传结果
     """
-    
     if not os.path.exists(local_file_path):
         raise FileNotFoundError(f"本地文件不存在: {local_file_path}")
     
-    # 获取文件信息并分片
-    chunks_info, total_size = split_file_to_chunks(local_file_path, chunk_size, encrypt, password)
+    prepared = PreparedUpload(access_token, local_file_path, remote_path, rtype, chunk_size, journal)
+    file_name = prepared.file_name
     
-    file_name = os.path.basename(local_file_path)
+    # 加密模块不可用时退化为普通上传（与 encrypt_data 的兜底行为保持一致）
+    if encrypt and StreamEncryptor is None:
+        encrypt = False
+    
+    # 查找可续传的会话（文件大小和修改时间未变化）
+    file_stat = os.stat(local_file_path)
+    prepared.file_stat = file_stat
+    session = None
+    if journal is not None:
+        session = journal.load(local_file_path, remote_path, file_stat.st_size, file_stat.st_mtime_ns, encrypt)
+        if session is not None and session['chunk_size'] != chunk_size:
+            journal.finish(session)
+            session = None
+    
+    # 续传加密文件时沿用原来的密文头部，才能重新生成完全相同的密文分片
+    encryptor = None
+    if encrypt:
+        if session is not None and session.get('header'):
+            try:
+                encryptor = StreamEncryptor.from_header(bytes.fromhex(session['header']), password)
+            except ValueError:
+                # 密码已更换
+                encryptor = None
+        elif session is not None and not segmented:
+            # 旧版日志只记录了 v1 格式的 salt 和 iv
+            encryptor = StreamEncryptor(password, bytes.fromhex(session['salt']), bytes.fromhex(session['iv']),
+                                        version=FORMAT_V1)
+        # 加密格式与会话记录不一致时放弃续传
+        if session is not None and (encryptor is None or isinstance(encryptor, SegmentedEncryptor) != segmented):
+            journal.finish(session)
+            session = None
+            encryptor = None
+        if encryptor is None:
+            encryptor = SegmentedEncryptor(password) if segmented else StreamEncryptor(password)
+    
+    # 获取文件信息并分片（同一次读取中计算秒传摘要）
+    digest = ContentDigest() if rapid_upload and session is None else None
+    chunks_info, total_size = split_file_to_chunks(local_file_path, chunk_size, encrypt, password, encryptor, digest)
+    if digest is not None:
+        prepared.content_md5 = digest.content_md5
     
     # 如果加密了，文件名添加.enc后缀以标识（仅在显示时，不影响实际上传路径）
-    display_name = file_name
     if encrypt:
-        display_name = file_name + " [已加密]"
+        prepared.display_name = file_name + " [已加密]"
     
     # 构造block_list (MD5列表)
-    block_list = [chunk['md5'] for chunk in chunks_info]
-    block_list_json = json.dumps(block_list)
+    block_list = [chunk.md5 for chunk in chunks_info]
+    
+    # 内容与会话记录不一致（如密码已更换）时放弃续传
+    if session is not None and session['block_list'] != block_list:
+        journal.finish(session)
+        session = None
+    
+    prepared.encryptor = encryptor
+    prepared.chunks_info = chunks_info
+    prepared.total_size = total_size
+    prepared.block_list = block_list
+    prepared.completed_parts = set(session['parts']) if session is not None else set()
+    
+    # 预上传 - 获取uploadid（附带内容摘要时同时尝试秒传）
+    precreate_kwargs = {}
+    if digest is not None and total_size > RAPID_UPLOAD_SLICE_SIZE:
+        precreate_kwargs['content_md5'] = digest.content_md5
+        precreate_kwargs['slice_md5'] = digest.slice_md5
+    if session is not None:
+        # 断点续传：沿用日志中的 uploadid，跳过预上传
+        prepared.session = session
+        prepared.uploadid = session['uploadid']
+        if show_progress:
+            print(f"↩️  {file_name} 断点续传，已完成 {len(prepared.completed_parts)}/{len(chunks_info)} 个分片")
+        return prepared
+    
+    # 使用共享的API客户端（复用 keep-alive 连接）
+    api_instance = fileupload_api.FileuploadApi(get_api_client(PAN_HOST))
+    try:
+        precreate_response = api_instance.xpanfileprecreate(
+            access_token=access_token,
+            path=remote_path,
+            isdir=0,  # 0表示文件，1表示目录
+            size=total_size,
+            autoinit=1,
+            block_list=prepared.block_list_json,
+            rtype=rtype,
+            **precreate_kwargs
+        )
     
-    # 创建进度监控器（如果需要并且文件大小不为0）
+        # 云端已存在相同内容，秒传成功
+        if precreate_kwargs and precreate_response.get('return_type') == 2:
+            if show_progress:
+                print(f"⚡ {file_name} 秒传成功")
+            result = precreate_response.get('info') or precreate_response
+            record_remote_file(result)
+            return prepared.finish(result)
+    
+        # 从响应中获取uploadid
+        uploadid = precreate_response.get('uploadid')
+        if not uploadid:
+            if total_size > 0:  # 只有非空文件才详细输出错误
+                print(f"预上传失败，未获取到uploadid，请检查路径或文件大小: {remote_path}")
+                print(f"文件大小: {total_size} 字节")
+                print(f"分块列表: {block_list}")
+                print(f"预上传响应: {precreate_response}")
+            else:
+                print(f"空文件预上传失败: {remote_path}")
+                print(f"预上传响应: {precreate_response}")
+            raise Exception("预上传失败：未获取到uploadid")
+        prepared.uploadid = uploadid
+    
+        if journal is not None and total_size > 0:
+            prepared.session = journal.begin(
+                local_file_path, remote_path, file_stat.st_size, file_stat.st_mtime_ns, chunk_size,
+                block_list, uploadid, encrypt,
+                encryptor.salt if encryptor else None, encryptor.iv if encryptor else None,
+                encryptor.header if encryptor else None
+            )
+        
+    except openapi_client.ApiException as e:
+        if show_progress:
+            print(f"❌ {prepared.display_name} 预上传失败")
+        return prepared.finish(None)
+    
+    return prepared
+
+
+def transfer_upload(prepared, max_workers=None, show_progress=True, retry_policy=None, scheduler=None):
+    """
+    上传的第二阶段：通过全局调度器并发上传尚未完成的分片
+    
+    Args:
+        prepared (PreparedUpload): prepare_upload 的返回值
+        max_workers (int, optional): 本文件的最大并发分片数，默认不限制（受全局槽位数约束）
+        show_progress (bool): 是否显示进度，默认为True
+        retry_policy (RetryPolicy, optional): 分片重试策略，默认为 DEFAULT_RETRY_POLICY
+        scheduler (UploadScheduler, optional): 分片调度器，默认为全局调度器
+        
+    Returns:
+        bool: 所有分片都上传成功时返回 True
+    """
+    if retry_policy is None:
+        retry_policy = DEFAULT_RETRY_POLICY
+    if scheduler is None:
+        scheduler = get_scheduler()
+    
+    file_name = prepared.file_name
+    display_name = prepared.display_name
+    chunks_info = prepared.chunks_info
+    session = prepared.session
+    
+    # 如果是空文件，跳过分片上传步骤
+    if prepared.total_size == 0:
+        if show_progress:
+            print(f"⬆️  跳过空文件分片上传: {display_name}")
+        return True
+    
+    # 创建进度监控器
     progress_tracker = None
-    if show_progress and total_size > 0:
-        progress_tracker = TqdmUploadTracker(len(chunks_info), display_name, total_size)
-    elif show_progress:
-        print(f"⬆️  上传空文件: {display_name}")
+    if show_progress:
+        progress_tracker = TqdmUploadTracker(len(chunks_info), display_name, prepared.total_size)
+        if prepared.completed_parts:
+            progress_tracker.update(sum(chunk.size for chunk in chunks_info
+                                        if chunk.index in prepared.completed_parts))
     
-    # 创建API客户端
-    with openapi_client.ApiClient() as api_client:
-        api_instance = fileupload_api.FileuploadApi(api_client)
+    upload_start_time = time.time()
+    
+    def send_chunk(chunk_info):
+        """读取并上传一个分片，失败时抛出异常由重试策略处理"""
+        chunk_index = chunk_info.index
+        
+        # 流式分片：请求体边读边发送，不在内存中拼接 multipart 请求体
+        chunk_file = reader.stream(chunk_info, name=f"chunk_{chunk_index}.tmp")
+        # 每发送一个数据块前从全局令牌桶取令牌
+        chunk_file.on_block = get_bandwidth_limiter().consume
         
-        # 1. 预上传 - 获取uploadid
-        start_time = time.time()
+        # 使用分片上传域名的共享客户端（线程安全，复用连接）
+        thread_api_instance = fileupload_api.FileuploadApi(get_api_client(PCS_HOST))
+        
+        # 上传分片
         try:
-            precreate_response = api_instance.xpanfileprecreate(
-                access_token=access_token,
-                path=remote_path,
-                isdir=0,  # 0表示文件，1表示目录
-                size=total_size,
-                autoinit=1,
-                block_list=block_list_json,
-                rtype=rtype
+            upload_response = thread_api_instance.pcssuperfile2(
+                access_token=prepared.access_token,
+                partseq=str(chunk_index),  # 分片序号
+                path=prepared.remote_path,
+                uploadid=prepared.uploadid,
+                type="tmpfile",
+                file=chunk_file
             )
-            
-            # 从响应中获取uploadid
-            uploadid = precreate_response.get('uploadid')
-            if not uploadid:
-                if total_size > 0:  # 只有非空文件才详细输出错误
-                    print(f"预上传失败，未获取到uploadid，请检查路径或文件大小: {remote_path}")
-                    print(f"文件大小: {total_size} 字节")
-                    print(f"分块列表: {block_list}")
-                    print(f"预上传响应: {precreate_response}")
-                else:
-                    print(f"空文件预上传失败: {remote_path}")
-                    print(f"预上传响应: {precreate_response}")
-                raise Exception("预上传失败：未获取到uploadid")
-                
-        except openapi_client.ApiException as e:
-            if show_progress and progress_tracker:
-                progress_tracker.close(False)
-            return None
+        finally:
+            # 归还加密进程池的共享内存缓冲区
+            chunk_file.close()
         
-        # 2. 并发分片上传
-        upload_start_time = time.time()
+        return upload_response
+    
+    def upload_chunk(chunk_info):
+        """上传单个分片的函数（按重试策略在同一 uploadid 下重传失败的分片）"""
+        chunk_index = chunk_info.index
         
-        # 如果是空文件，跳过分片上传步骤
-        if total_size == 0:
+        def on_retry(attempt, error, delay):
             if show_progress:
-                print(f"⬆️  跳过空文件分片上传: {display_name}")
-        else:
-            def upload_chunk(chunk_info):
-                """上传单个分片的函数"""
-                chunk_index = chunk_info['index']
-                chunk_data = chunk_info['data']
-                
-                try:
-                    # 创建新的API客户端实例（线程安全）
-                    with openapi_client.ApiClient() as thread_api_client:
-                        thread_api_instance = fileupload_api.FileuploadApi(thread_api_client)
-                        
-                        # 使用 BytesIO 创建文件对象
-                        chunk_file = io.BytesIO(chunk_data)
-                        chunk_file.seek(0)
-                        # 添加 name 属性，避免 AttributeError
-                        chunk_file.name = f"chunk_{chunk_index}.tmp"
-                        
-                        # 上传分片
-                        upload_response = thread_api_instance.pcssuperfile2(
-                            access_token=access_token,
-                            partseq=str(chunk_index),  # 分片序号
-                            path=remote_path,
-                            uploadid=uploadid,
-                            type="tmpfile",
-                            file=chunk_file
-                        )
-                        
-                        # 关闭文件对象
-                        chunk_file.close()
-                        
-                        # 更新上传进度（如果启用）
-                        if progress_tracker:
-                            progress_tracker.update(len(chunk_data))
-                        
-                        return chunk_index, upload_response
-                        
-                except Exception as e:
-                    if show_progress:
-                        print(f"\n❌ {file_name} 分片 {chunk_index + 1} 上传失败")
-                    return chunk_index, None
-            
-            # 使用线程池并发上传
-            upload_results = {}
-            failed_chunks = []
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交所有上传任务
-                future_to_chunk = {executor.submit(upload_chunk, chunk): chunk for chunk in chunks_info}
-                
-                # 收集结果
-                for future in concurrent.futures.as_completed(future_to_chunk):
-                    chunk_index, result = future.result()
-                    if result is not None:
-                        upload_results[chunk_index] = result
-                    else:
-                        failed_chunks.append(chunk_index)
-            
-            upload_end_time = time.time()
-            upload_duration = upload_end_time - upload_start_time
-            
-            # 关闭进度条
-            if progress_tracker:
-                progress_tracker.close(len(failed_chunks) == 0, upload_duration)
-            
-            # 检查是否有失败的分片
-            if failed_chunks:
-                if show_progress:
-                    print(f"❌ {file_name} 有 {len(failed_chunks)} 个分片上传失败")
-                return None
+                print(f"\n⚠️  {file_name} 分片 {chunk_index + 1} 第 {attempt} 次上传失败，{delay:.1f}秒后重试")
         
-        # 3. 文件合并
         try:
-            create_response = api_instance.xpanfilecreate(
-                access_token=access_token,
-                path=remote_path,
-                isdir=0,
-                size=total_size,
-                uploadid=uploadid,
-                block_list=block_list_json,
-                rtype=rtype
-            )
-            
-            # 输出完成信息
+            upload_response = retry_policy.call(send_chunk, chunk_info, on_retry=on_retry)
+        except Exception as e:
+            if not retry_policy.is_retryable(e):
+                fatal_errors.append(e)
             if show_progress:
-                if total_size == 0:
-                    print(f"✅ 空文件 {file_name} 上传完成")
-                else:
-                    end_time = time.time()
-                    total_duration = end_time - start_time
-                    print(f"✅ {file_name} 上传完成，总耗时: {total_duration:.2f}秒")
-            
-            return create_response
-            
-        except openapi_client.ApiException as e:
+                print(f"\n❌ {file_name} 分片 {chunk_index + 1} 上传失败")
+            return chunk_index, None
+        
+        # 记录到断点续传日志
+        if session is not None:
+            prepared.journal.mark_part_done(session, chunk_index)
+        
+        # 更新上传进度（如果启用）
+        if progress_tracker:
+            progress_tracker.update(chunk_info.size)
+        
+        return chunk_index, upload_response
+    
+    # 交给全局调度器并发上传（与其他文件共享上传槽位）
+    failed_chunks = []
+    fatal_errors = []
+    
+    with ChunkReader(prepared.local_file_path, prepared.encryptor, get_encryption_pool()) as reader:
+        pending_chunks = [chunk for chunk in chunks_info if chunk.index not in prepared.completed_parts]
+        
+        # 收集结果
+        for _, (chunk_index, result) in scheduler.map(prepared.remote_path, upload_chunk, pending_chunks,
+                                                      max_in_flight=max_workers):
+            if result is not None:
+                prepared.completed_parts.add(chunk_index)
+            else:
+                failed_chunks.append(chunk_index)
+    
+    upload_duration = time.time() - upload_start_time
+    
+    # 关闭进度条
+    if progress_tracker:
+        progress_tracker.close(len(failed_chunks) == 0, upload_duration)
+    
+    # 检查是否有失败的分片
+    if failed_chunks:
+        if show_progress:
+            print(f"❌ {file_name} 有 {len(failed_chunks)} 个分片上传失败")
+        # 致命错误（uploadid 失效、分片超限等）下次续传同样会失败，删除会话，下次重新预上传
+        if fatal_errors and session is not None:
+            prepared.journal.finish(session)
+            prepared.session = None
+        return False
+    return True
+
+
+def commit_upload(prepared, show_progress=True):
+    """
+    上传的第三阶段：合并分片，创建网盘文件
+    
+    Args:
+        prepared (PreparedUpload): 分片已全部上传的 prepare_upload 返回值
+        show_progress (bool): 是否显示提示信息，默认为True
+        
+    Returns:
+        dict: 创建文件的响应，失败返回 None
+    """
+    file_name = prepared.file_name
+    api_instance = fileupload_api.FileuploadApi(get_api_client(PAN_HOST))
+    try:
+        create_response = api_instance.xpanfilecreate(
+            access_token=prepared.access_token,
+            path=prepared.remote_path,
+            isdir=0,
+            size=prepared.total_size,
+            uploadid=prepared.uploadid,
+            block_list=prepared.block_list_json,
+            rtype=prepared.rtype
+        )
+        
+        # 合并请求已得到服务端响应，会话不再需要（失败时 uploadid 也已不可再用）
+        if prepared.session is not None:
+            prepared.journal.finish(prepared.session)
+        # 业务错误（如文件名非法、空间不足）同样以 HTTP 200 返回，只体现在 errno 中
+        if create_response.get('errno'):
             if show_progress:
-                print(f"❌ {file_name} 文件合并失败")
+                print(f"❌ {file_name} 文件合并失败，errno: {create_response.get('errno')}")
             return None
+        record_remote_file(create_response)
+        
+        # 输出完成信息
+        if show_progress:
+            if prepared.total_size == 0:
+                print(f"✅ 空文件 {file_name} 上传完成")
+            else:
+                total_duration = time.time() - prepared.start_time
+                print(f"✅ {file_name} 上传完成，总耗时: {total_duration:.2f}秒")
+        
+        return create_response
+        
+    except openapi_client.ApiException as e:
+        if show_progress:
+            print(f"❌ {file_name} 文件合并失败")
+        return None
+
+
+def auto_chunked_upload(access_token, local_file_path, remote_path, rtype=3, max_workers=None, chunk_size=4*1024*1024, 
+                   show_progress=True, encrypt=False, password="123456", rapid_upload=True, journal=None,
+                   retry_policy=None, scheduler=None, segmented=False):
+    """
+    自动分片上传文件到百度网盘（支持并发上传）
+    
+    依次执行 prepare_upload（分片摘要、预上传/秒传）、transfer_upload（分片上传）
+    和 commit_upload（合并）。分片通过进程级的 UploadScheduler 上传，所有文件共享同一组上传槽位。
+    
+    Args:
+        access_token (str): 访问令牌
+        local_file_path (str): 本地文件路径
+        remote_path (str): 远程文件路径，如 "/apps/your-app-name/filename.txt"
+        rtype (int): 返回类型，默认为3
+        max_workers (int, optional): 本文件的最大并发分片数，默认不限制（受全局槽位数约束）
+        chunk_size (int): 分片大小，默认4MB
+        show_progress (bool): 是否显示进度，默认为True
+        encrypt (bool): 是否加密文件内容
+        password (str): 加密密码，默认为123456
+        rapid_upload (bool): 是否尝试秒传，默认为True
+        journal (UploadJournal, optional): 断点续传日志，不提供则不持久化上传会话
+        retry_policy (RetryPolicy, optional): 分片重试策略，默认为 DEFAULT_RETRY_POLICY
+        scheduler (UploadScheduler, optional): 分片调度器，默认为全局调度器
+        segmented (bool): 加密时使用可随机读取的分段加密格式（v3）
+        
+    Returns:
+        dict: 上传结果
+    """
+    prepared = prepare_upload(access_token, local_file_path, remote_path, rtype, chunk_size, show_progress,
+                              encrypt, password, rapid_upload, journal, segmented)
+    if prepared.finished:
+        return prepared.result
+    
+    if not transfer_upload(prepared, max_workers, show_progress, retry_policy, scheduler):
+        return None
+    
+    return commit_upload(prepared, show_progress)
 
 
-def encrypt_upload(access_token, local_file_path, remote_path, password="123456", rtype=3, show_progress=True):
+def encrypt_upload(access_token, local_file_path, remote_path, password="123456", rtype=3, show_progress=True,
+                   journal=None, retry_policy=None, chunk_size=None, segmented=False):
     """
     加密上传文件到百度网盘
     
@@ -378,6 +926,10 @@ def encrypt_upload(access_token, local_file_path, remote_path, password="123456"
         password (str): 加密密码，默认为123456
         rtype (int): 返回类型，默认为3
         show_progress (bool): 是否显示进度，默认为True
+        journal (UploadJournal, optional): 断点续传日志
+        retry_policy (RetryPolicy, optional): 分片重试策略
+        chunk_size (int, optional): 手动指定分片大小，不提供则自动选择
+        segmented (bool): 使用分段加密格式（v3），恢复时可以只下载并解密需要的区间
         
     Returns:
         dict: 上传结果，包含额外的元数据用于解密
@@ -390,7 +942,11 @@ def encrypt_upload(access_token, local_file_path, remote_path, password="123456"
         rtype=rtype,
         show_progress=show_progress,
         encrypt=True,
-        password=password
+        password=password,
+        journal=journal,
+        retry_policy=retry_policy,
+        chunk_size=chunk_size,
+        segmented=segmented
     )
     
     # 如果上传成功，显示加密信息
@@ -401,11 +957,148 @@ def encrypt_upload(access_token, local_file_path, remote_path, password="123456"
     return result
 
 
+def expected_remote_size(file_size, encrypt=False, password="123456", segmented=False):
+    """
+    计算本地文件上传后在网盘中的大小（加密上传时为密文大小）
+    
+    Args:
+        file_size (int): 本地文件大小
+        encrypt (bool): 是否加密上传
+        password (str): 加密密码
+        segmented (bool): 是否使用分段加密格式（v3）
+        
+    Returns:
+        int: 远程文件大小
+    """
+    if not encrypt or StreamEncryptor is None:
+        return file_size
+    encryptor = SegmentedEncryptor(password) if segmented else StreamEncryptor(password)
+    return encryptor.encrypted_size(file_size)
+
+
+# 百度网盘各会员等级的上传限制：vip_type -> (分片大小上限, 单文件大小上限)
+VIP_UPLOAD_LIMITS = {
+    0: (4 * 1024 * 1024, 4 * 1024 * 1024 * 1024),     # 普通用户：分片固定4MB，单文件4GB
+    1: (16 * 1024 * 1024, 10 * 1024 * 1024 * 1024),   # 普通会员：分片最大16MB，单文件10GB
+    2: (32 * 1024 * 1024, 20 * 1024 * 1024 * 1024),   # 超级会员：分片最大32MB，单文件20GB
+}
+
+# 最小分片大小，也是自动选择分片大小时的步长基数
+MIN_CHUNK_SIZE = 4 * 1024 * 1024
+
+# 自动选择分片大小时，期望单个文件的分片数不超过此值
+TARGET_BLOCK_COUNT = 64
+
+_vip_type_cache = {}
+_vip_type_lock = threading.Lock()
+
+
+def get_vip_type(access_token):
+    """
+    获取账号的会员类型（0 普通用户，1 普通会员，2 超级会员）
+    
+    每个访问令牌只查询一次 uinfo 接口，结果缓存在进程内；
+    查询失败时按普通用户处理且不缓存，下次再重试。
+    
+    Args:
+        access_token (str): 访问令牌
+        
+    Returns:
+        int: 会员类型
+    """
+    with _vip_type_lock:
+        if access_token in _vip_type_cache:
+            return _vip_type_cache[access_token]
+        
+        try:
+            api_instance = userinfo_api.UserinfoApi(get_api_client(PAN_HOST))
+            response = api_instance.xpannasuinfo(access_token=access_token)
+            vip_type = int(response.get('vip_type', 0))
+        except Exception as e:
+            print(f"获取会员类型失败，按普通用户分片: {e}")
+            return 0
+        
+        if vip_type not in VIP_UPLOAD_LIMITS:
+            vip_type = 0
+        _vip_type_cache[access_token] = vip_type
+        return vip_type
+
+
+def choose_chunk_size(file_size, vip_type=0, chunk_size=None):
+    """
+    根据文件大小和会员类型选择分片大小
+    
+    从4MB开始按倍数增大，直到分片数不超过 TARGET_BLOCK_COUNT 或达到会员的分片上限，
+    大文件因此用更少、更大的请求上传。
+    
+    Args:
+        file_size (int): 文件大小
+        vip_type (int): 会员类型
+        chunk_size (int, optional): 手动指定的分片大小，会按会员限制校验
+        
+    Returns:
+        int: 分片大小
+    """
+    max_chunk_size, max_file_size = VIP_UPLOAD_LIMITS.get(vip_type, VIP_UPLOAD_LIMITS[0])
+    
+    if file_size > max_file_size:
+        print(f"警告: 文件大小 {file_size} 字节超过当前账号的单文件上限 {max_file_size} 字节，上传可能被拒绝")
+    
+    if chunk_size is not None:
+        if chunk_size % MIN_CHUNK_SIZE != 0 or not MIN_CHUNK_SIZE <= chunk_size <= max_chunk_size:
+            raise ValueError(
+                f"分片大小必须是4MB的整数倍，且不超过当前账号的上限 {max_chunk_size // (1024 * 1024)}MB: {chunk_size}"
+            )
+        return chunk_size
+    
+    chunk_size = MIN_CHUNK_SIZE
+    while (file_size + chunk_size - 1) // chunk_size > TARGET_BLOCK_COUNT and chunk_size * 2 <= max_chunk_size:
+        chunk_size *= 2
+    return chunk_size
+
+
+def resolve_chunk_size(access_token, file_size, chunk_size=None):
+    """
+    确定文件实际使用的分片大小
+    
+    Args:
+        access_token (str): 访问令牌（用于查询会员类型）
+        file_size (int): 文件大小
+        chunk_size (int, optional): 手动指定的分片大小
+        
+    Returns:
+        int: 分片大小
+    """
+    # 小于最小分片的文件只有一个分片，无需查询会员类型
+    if chunk_size is None and file_size <= MIN_CHUNK_SIZE:
+        return MIN_CHUNK_SIZE
+    return choose_chunk_size(file_size, get_vip_type(access_token), chunk_size)
+
+
+def prepare_upload_optimized(access_token, local_file_path, remote_path, rtype=3, show_progress=True,
+                             encrypt=False, password="123456", rapid_upload=True, journal=None, chunk_size=None,
+                             segmented=False):
+    """
+    自动选择分片大小后执行 prepare_upload，供上传流水线提前预上传使用
+    
+    参数含义与 auto_chunked_upload_optimized 相同。
+    
+    Returns:
+        PreparedUpload: 预上传结果
+    """
+    chunk_size = resolve_chunk_size(access_token, os.path.getsize(local_file_path), chunk_size)
+    return prepare_upload(access_token, local_file_path, remote_path, rtype, chunk_size, show_progress,
+                          encrypt, password, rapid_upload, journal, segmented)
+
+
 def auto_chunked_upload_optimized(access_token, local_file_path, remote_path, rtype=3, show_progress=True, 
-                            encrypt=False, password="123456"):
+                            encrypt=False, password="123456", rapid_upload=True, journal=None,
+                            retry_policy=None, chunk_size=None, segmented=False):
     """
     优化版本的自动分片上传（自动调整参数）
     
+    分片大小根据文件大小和账号会员类型自动选择（见 choose_chunk_size）。
+    
     Args:
         access_token (str): 访问令牌
         local_file_path (str): 本地文件路径
@@ -414,19 +1107,22 @@ def auto_chunked_upload_optimized(access_token, local_file_path, remote_path, rt
         show_progress (bool): 是否显示进度，默认为True
         encrypt (bool): 是否加密文件内容
         password (str): 加密密码，默认为123456
+        rapid_upload (bool): 是否尝试秒传，默认为True
+        journal (UploadJournal, optional): 断点续传日志
+        retry_policy (RetryPolicy, optional): 分片重试策略
+        chunk_size (int, optional): 手动指定分片大小，不提供则自动选择
+        segmented (bool): 加密时使用可随机读取的分段加密格式（v3）
         
     Returns:
         dict: 上传结果
     """
-    file_size = os.path.getsize(local_file_path)
     file_name = os.path.basename(local_file_path)
-
-    chunk_size = 4 * 1024 * 1024  # 4MB分片
-    max_workers = 3
+    chunk_size = resolve_chunk_size(access_token, os.path.getsize(local_file_path), chunk_size)
 
     # 添加加密标识到返回的元数据中，以便于后续解密
     metadata = {
         "encrypted": encrypt,
+        "segmented": encrypt and segmented,
         "original_file": file_name
     }
     
@@ -435,11 +1131,14 @@ def auto_chunked_upload_optimized(access_token, local_file_path, remote_path, rt
         local_file_path=local_file_path,
         remote_path=remote_path,
         rtype=rtype,
-        max_workers=max_workers,
         chunk_size=chunk_size,
         show_progress=show_progress,
         encrypt=encrypt,
-        password=password
+        password=password,
+        rapid_upload=rapid_upload,
+        journal=journal,
+        retry_policy=retry_policy,
+        segmented=segmented
     )
     
     # 如果上传成功，添加元数据
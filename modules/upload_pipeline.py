@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+前瞻上传流水线
+把单个文件的上传拆成三个阶段并让相邻文件的阶段重叠：
+    1. 准备：计算分片摘要并预上传（lookahead 个准备线程提前处理队列中后面的文件）
+    2. 传输：上传线程只负责上传分片，链路不会因为计算摘要或等待预上传而空闲
+    3. 提交：合并请求交给后台线程异步执行，上传线程立即开始下一个文件
+"""
+import queue
+import threading
+from datetime import datetime
+
+# 默认提前准备的文件数
+DEFAULT_LOOKAHEAD = 2
+
+# 默认执行合并请求的线程数
+DEFAULT_COMMIT_WORKERS = 2
+
+
+class UploadPipeline:
+    """
+    上传流水线
+
+    准备线程从 source 队列取出文件交给 prepare 处理，结果进入就绪队列；
+    已取出但尚未开始传输的文件最多 lookahead 个。
+    source 中每个文件在提交完成（或失败）后调用一次 task_done。
+    """
+
+    def __init__(self, source, prepare, commit, lookahead=DEFAULT_LOOKAHEAD, commit_workers=DEFAULT_COMMIT_WORKERS):
+        """
+        Args:
+            source (queue.Queue): 待上传文件队列
+            prepare (callable): prepare(item) -> 准备结果；返回 None 表示该文件已处理完毕
+                （如加入了小文件打包），不再进入传输阶段
+            commit (callable): commit(准备结果) -> 上传结果，在提交线程中执行
+            lookahead (int): 最多提前准备的文件数
+            commit_workers (int): 提交线程数
+        """
+        if lookahead < 1:
+            raise ValueError(f"lookahead 必须大于等于1: {lookahead}")
+        self.source = source
+        self.prepare = prepare
+        self.commit = commit
+        self.lookahead = lookahead
+        self._ready = queue.Queue()
+        self._commits = queue.Queue()
+        # 已取出但尚未被上传线程领取的文件数
+        self._slots = threading.Semaphore(lookahead)
+        self._lock = threading.Lock()
+        self._counters = {'prepared': 0, 'committing': 0, 'committed': 0}
+        self._threads = []
+        for i in range(lookahead):
+            self._start(self._prepare_loop, f"upload-prepare-{i + 1}")
+        for i in range(max(1, commit_workers)):
+            self._start(self._commit_loop, f"upload-commit-{i + 1}")
+
+    def _start(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _prepare_loop(self):
+        while True:
+            self._slots.acquire()
+            item = self.source.get()
+            try:
+                prepared = self.prepare(item)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 准备上传时出错: {str(e)}  {item}")
+                prepared = None
+            if prepared is None:
+                self._slots.release()
+                self.source.task_done()
+                continue
+            with self._lock:
+                self._counters['prepared'] += 1
+            self._ready.put((item, prepared))
+
+    def get(self, timeout=None):
+        """
+        领取一个已准备好的文件（由上传线程调用）
+
+        Args:
+            timeout (float, optional): 等待秒数
+
+        Returns:
+            tuple: (item, 准备结果)
+
+        Raises:
+            queue.Empty: 超时
+        """
+        item, prepared = self._ready.get(timeout=timeout)
+        # 腾出位置，准备线程开始准备下一个文件
+        self._slots.release()
+        return item, prepared
+
+    def submit_commit(self, item, prepared, callback=None):
+        """
+        异步提交（合并）一个文件，完成后调用 callback(item, 上传结果)
+
+        Args:
+            item: get 返回的 item
+            prepared: get 返回的准备结果
+            callback (callable, optional): 提交完成后的回调
+        """
+        with self._lock:
+            self._counters['committing'] += 1
+        self._commits.put((item, prepared, callback))
+
+    def done(self, item):
+        """不需要提交的文件（秒传或失败）处理完毕时调用"""
+        self.source.task_done()
+
+    def _commit_loop(self):
+        while True:
+            item, prepared, callback = self._commits.get()
+            try:
+                result = self.commit(prepared)
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ 提交上传时出错: {str(e)}  {item}")
+                result = None
+            try:
+                if callback is not None:
+                    callback(item, result)
+            finally:
+                with self._lock:
+                    self._counters['committing'] -= 1
+                    self._counters['committed'] += 1
+                self.source.task_done()
+
+    def stats(self):
+        """
+        流水线状态快照
+
+        Returns:
+            dict: {'ready': 已准备待传输数, 'prepared': 累计准备数,
+                   'committing': 正在提交数, 'committed': 累计提交数}
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        stats['ready'] = self._ready.qsize()
+        return stats
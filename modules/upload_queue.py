@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+上传队列模块
+有界的上传队列：队列满时 put 阻塞（扫描线程和文件监控的去抖线程随之暂停），
+扫描数百万个文件时内存占用不会无限增长。
+
+出队顺序由排序策略决定：
+    - fifo: 先进先出（默认）
+    - smallest: 小文件优先，大文件不会挡住后面成千上万的小文档
+    - newest: 最近修改的文件优先
+    - prefix: 按路径前缀的优先级，排在前面的前缀先上传，未匹配的路径最后；同一优先级内先进先出
+
+队列元素与原来的 queue.Queue 相同，为 (文件路径, 基础目录) 或文件路径。
+
+提供 UploadQueueStore 时队列内容同时写入磁盘：上传成功后调用 mark_done 删除记录，
+启动时 replay 把上次未完成的文件重新加入队列。
+"""
+import os
+import time
+import heapq
+import queue
+import threading
+from collections import Counter
+
+# 默认队列容量
+DEFAULT_QUEUE_SIZE = 10000
+
+# 支持的排序策略
+QUEUE_ORDERS = ('fifo', 'smallest', 'newest', 'prefix')
+
+
+def _item_path(item):
+    return item[0] if isinstance(item, tuple) else item
+
+
+def _stat_key(item, field, sign):
+    try:
+        return sign * getattr(os.stat(_item_path(item)), field)
+    except OSError:
+        # 文件已不存在，尽快出队（上传线程会处理失败）
+        return float('-inf')
+
+
+def make_order_key(order='fifo', prefixes=None):
+    """
+    构造排序策略的优先级函数
+
+    Args:
+        order (str): 排序策略，见 QUEUE_ORDERS
+        prefixes (list, optional): prefix 策略的路径前缀列表，越靠前优先级越高
+
+    Returns:
+        callable: key(item) -> 优先级（越小越先出队），fifo 策略返回 None
+    """
+    if order == 'fifo':
+        return None
+    if order == 'smallest':
+        return lambda item: _stat_key(item, 'st_size', 1)
+    if order == 'newest':
+        return lambda item: _stat_key(item, 'st_mtime', -1)
+    if order == 'prefix':
+        rules = [os.path.abspath(prefix) for prefix in prefixes or []]
+
+        def key(item):
+            path = _item_path(item)
+            for index, prefix in enumerate(rules):
+                if path == prefix or path.startswith(prefix.rstrip(os.sep) + os.sep):
+                    return index
+            return len(rules)
+        return key
+    raise ValueError(f"不支持的队列排序策略: {order}")
+
+
+class UploadQueue(queue.Queue):
+    """
+    有界、可排序的上传队列（queue.Queue 的子类，接口不变）
+
+    内部是 (优先级, 序号, 入队时间, 元素) 的最小堆，序号保证同一优先级内先进先出。
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, order='fifo', prefixes=None, store=None):
+        """
+        Args:
+            maxsize (int): 队列容量，0 表示不限制
+            order (str): 排序策略，见 QUEUE_ORDERS
+            prefixes (list, optional): prefix 策略的路径前缀列表
+            store (UploadQueueStore, optional): 持久化记录，提供时进程重启后可恢复未完成的文件
+        """
+        self.order = order
+        self.store = store
+        # 仍在队列中等待的路径（同一文件可能被多次加入），以及正在 put（可能因队列已满而阻塞）的路径
+        self._queued = Counter()
+        self._putting = Counter()
+        # 其他持有待上传文件的容器（如文件监控的去抖器），其中的路径不删除持久化记录
+        self._holders = []
+        self._key = make_order_key(order, prefixes)
+        self._stats_lock = threading.Lock()
+        self._sequence = 0
+        self.put_count = 0
+        self.get_count = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.blocked_puts = 0
+        self.blocked_time = 0.0
+        super().__init__(maxsize)
+
+    # queue.Queue 的存储接口（调用时已持有 self.mutex）
+    def _init(self, maxsize):
+        self._heap = []
+
+    def _qsize(self):
+        return len(self._heap)
+
+    def _put(self, entry):
+        heapq.heappush(self._heap, entry)
+        path = _item_path(entry[3])
+        # 与加入堆在同一把锁内从 _putting 转入 _queued，mark_done 不会看到两者都不包含的中间状态
+        self._putting_done(path)
+        self._queued[path] += 1
+        self.put_count += 1
+        self.max_depth = max(self.max_depth, len(self._heap))
+
+    def _get(self):
+        _, _, enqueued, item = heapq.heappop(self._heap)
+        path = _item_path(item)
+        self._queued[path] -= 1
+        if not self._queued[path]:
+            del self._queued[path]
+        wait = time.monotonic() - enqueued
+        self.get_count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return item
+
+    def put(self, item, block=True, timeout=None):
+        """
+        加入队列，队列已满时阻塞（背压）
+
+        优先级在加锁之前计算（smallest / newest 策略需要 stat 文件）。
+        持久化记录在阻塞之前写入，阻塞期间进程退出也能恢复；因队列已满而失败时删除记录。
+        """
+        priority = self._key(item) if self._key is not None else 0
+        path = _item_path(item)
+        with self.mutex:
+            self._putting[path] += 1
+        self.track(item)
+        with self._stats_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        start = time.monotonic()
+        blocked = self.maxsize > 0 and self.full()
+        try:
+            super().put((priority, sequence, start, item), block, timeout)
+        except queue.Full:
+            with self.mutex:
+                self._putting_done(path)
+            self.mark_done(path)
+            raise
+        if blocked:
+            with self._stats_lock:
+                self.blocked_puts += 1
+                self.blocked_time += time.monotonic() - start
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def _putting_done(self, path):
+        # 调用时已持有 self.mutex
+        self._putting[path] -= 1
+        if not self._putting[path]:
+            del self._putting[path]
+
+    def __contains__(self, path):
+        """path 是否仍在队列中等待（包括正在加入队列）"""
+        with self.mutex:
+            return path in self._queued or path in self._putting
+
+    def add_holder(self, holder):
+        """
+        登记一个持有待上传文件的容器（支持 in 判断，如 Debouncer）
+
+        文件上传完成时如果同一路径又在容器中等待（上传期间文件被再次修改），保留持久化记录。
+        """
+        self._holders.append(holder)
+
+    def track(self, item):
+        """
+        把尚未加入队列的文件（如文件监控中正在去抖的文件）写入持久化记录，崩溃后也能恢复
+
+        Args:
+            item (tuple | str): (文件路径, 基础目录) 或文件路径
+        """
+        if self.store is not None:
+            if isinstance(item, tuple):
+                self.store.add(*item)
+            else:
+                self.store.add(item)
+
+    def mark_done(self, path):
+        """
+        文件已上传成功（或不再需要上传），删除持久化记录
+
+        同一文件又被加入队列或在 add_holder 登记的容器中等待时保留记录，由后一次上传完成时删除。
+        """
+        if self.store is None or path in self:
+            return
+        if any(path in holder for holder in self._holders):
+            return
+        self.store.remove(path)
+
+    def replay(self):
+        """
+        把上次运行时未完成的文件重新加入队列（须在上传线程启动后调用，队列满时阻塞）
+
+        Returns:
+            int: 重新加入的文件数（已不存在的文件直接删除记录）
+        """
+        if self.store is None:
+            return 0
+        count = 0
+        for path, base_dir in self.store.pending():
+            if not os.path.isfile(path):
+                self.store.remove(path)
+                continue
+            self.put((path, base_dir) if base_dir else path)
+            count += 1
+        return count
+
+    def stats(self):
+        """
+        队列统计
+
+        Returns:
+            dict: depth（当前深度）、max_depth、put / get（累计入队/出队数）、
+                  avg_wait / max_wait（元素在队列中的等待时间，秒）、
+                  blocked_puts / blocked_time（因队列已满而阻塞的入队次数和总时长，秒）
+        """
+        with self.mutex:
+            depth = len(self._heap)
+            # 非 fifo 策略下堆顶不一定是最早入队的元素（stats 调用不频繁，直接遍历）
+            oldest = min((entry[2] for entry in self._heap), default=None)
+            result = {
+                'depth': depth,
+                'capacity': self.maxsize,
+                'max_depth': self.max_depth,
+                'put': self.put_count,
+                'get': self.get_count,
+                'avg_wait': self.total_wait / self.get_count if self.get_count else 0.0,
+                'max_wait': self.max_wait,
+                'oldest_wait': time.monotonic() - oldest if oldest is not None else 0.0,
+            }
+        with self._stats_lock:
+            result['blocked_puts'] = self.blocked_puts
+            result['blocked_time'] = self.blocked_time
+        return result
+
+    def describe(self):
+        s = self.stats()
+        capacity = s['capacity'] or '不限'
+        return (f"队列深度 {s['depth']}/{capacity}（最大 {s['max_depth']}），已入队 {s['put']}，已出队 {s['get']}，"
+                f"平均等待 {s['avg_wait']:.1f}秒，最长等待 {s['max_wait']:.1f}秒，"
+                f"队列满阻塞 {s['blocked_puts']} 次共 {s['blocked_time']:.1f}秒（排序: {self.order}）")
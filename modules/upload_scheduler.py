@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+全局分片上传调度器
+进程内所有文件的分片共享固定数量的上传槽位（即并发连接数），
+槽位在正在上传的文件之间轮转分配：多个文件同时上传时平均分享带宽，
+只有一个大文件时它可以独占全部槽位。
+"""
+import collections
+import queue
+import threading
+
+# 默认上传槽位数
+DEFAULT_UPLOAD_SLOTS = 9
+
+
+class _FileJob:
+    """一个文件在调度器中的待上传分片和运行状态"""
+
+    def __init__(self, key, func, items, max_in_flight=None):
+        self.key = key
+        self.func = func
+        self.pending = collections.deque(items)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.results = queue.Queue()
+
+    def ready(self):
+        return bool(self.pending) and (self.max_in_flight is None or self.in_flight < self.max_in_flight)
+
+
+class UploadScheduler:
+    """
+    进程级分片上传调度器
+
+    启动 slots 个常驻上传线程，每个线程轮流从各个文件的待上传分片中取出一个执行。
+    """
+
+    def __init__(self, slots=DEFAULT_UPLOAD_SLOTS):
+        """
+        Args:
+            slots (int): 上传槽位数，即全局最大并发分片数
+        """
+        if slots < 1:
+            raise ValueError(f"上传槽位数必须大于等于1: {slots}")
+        self.slots = slots
+        self._cond = threading.Condition()
+        self._jobs = collections.deque()
+        self._in_flight = 0
+        self._threads = []
+        for i in range(slots):
+            thread = threading.Thread(target=self._slot_loop, name=f"upload-slot-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_task(self):
+        """轮询各文件，取出下一个可执行的分片；调用方需持有锁"""
+        for _ in range(len(self._jobs)):
+            job = self._jobs[0]
+            self._jobs.rotate(-1)
+            if job.ready():
+                job.in_flight += 1
+                self._in_flight += 1
+                return job, job.pending.popleft()
+        return None
+
+    def _slot_loop(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task()
+            job, item = task
+
+            try:
+                job.results.put((item, job.func(item), None))
+            except Exception as e:
+                job.results.put((item, None, e))
+            finally:
+                with self._cond:
+                    job.in_flight -= 1
+                    self._in_flight -= 1
+                    # 该文件的并发限制释放了一个位置
+                    self._cond.notify()
+
+    def map(self, key, func, items, max_in_flight=None):
+        """
+        提交一个文件的全部分片，按完成顺序返回结果
+
+        Args:
+            key (str): 文件标识（如远程路径），用于统计
+            func (callable): 处理单个分片的函数
+            items (iterable): 分片列表
+            max_in_flight (int, optional): 该文件的最大并发分片数，None 表示不限制
+
+        Yields:
+            tuple: (item, result)，func 抛出的异常会原样抛出
+        """
+        items = list(items)
+        if not items:
+            return
+        job = _FileJob(key, func, items, max_in_flight)
+        with self._cond:
+            self._jobs.append(job)
+            self._cond.notify_all()
+
+        try:
+            for _ in range(len(items)):
+                item, result, error = job.results.get()
+                if error is not None:
+                    raise error
+                yield item, result
+        finally:
+            # 调用方提前结束时丢弃尚未开始的分片
+            with self._cond:
+                job.pending.clear()
+                self._jobs.remove(job)
+
+    def in_flight(self, key=None):
+        """
+        正在上传的分片数
+
+        Args:
+            key (str, optional): 文件标识，不提供则返回全局数量
+
+        Returns:
+            int: 正在上传的分片数
+        """
+        with self._cond:
+            if key is None:
+                return self._in_flight
+            return sum(job.in_flight for job in self._jobs if job.key == key)
+
+    def stats(self):
+        """
+        调度器状态快照
+
+        Returns:
+            dict: {'slots', 'in_flight', 'files': {文件标识: {'in_flight', 'pending'}}}
+        """
+        with self._cond:
+            files = {}
+            for job in self._jobs:
+                entry = files.setdefault(job.key, {'in_flight': 0, 'pending': 0})
+                entry['in_flight'] += job.in_flight
+                entry['pending'] += len(job.pending)
+            return {'slots': self.slots, 'in_flight': self._in_flight, 'files': files}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def configure_scheduler(slots):
+    """
+    设置全局调度器的槽位数，必须在第一次上传之前调用
+
+    Args:
+        slots (int): 上传槽位数
+
+    Returns:
+        UploadScheduler: 全局调度器
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            if _scheduler.slots == slots:
+                return _scheduler
+            raise RuntimeError("上传调度器已启动，无法再修改槽位数")
+        _scheduler = UploadScheduler(slots)
+        return _scheduler
+
+
+def get_scheduler():
+    """获取全局调度器，未配置时使用默认槽位数创建"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UploadScheduler()
+        return _scheduler
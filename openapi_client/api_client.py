@@ -23,6 +23,7 @@ from urllib3.fields import RequestField
 
 from openapi_client import rest
 from openapi_client.configuration import Configuration
+from openapi_client.streaming_multipart import StreamingFile
 from openapi_client.exceptions import ApiTypeError, ApiValueError, ApiException
 from openapi_client.model_utils import (
     ModelNormal,
@@ -549,7 +550,11 @@ class ApiClient(object):
                         "for %s must be open." % param_name
                     )
                 filename = os.path.basename(file_instance.name)
-                filedata = self.get_file_data_and_close_file(file_instance)
+                if isinstance(file_instance, StreamingFile):
+                    # sent by rest.RESTClientObject without reading it here
+                    filedata = file_instance
+                else:
+                    filedata = self.get_file_data_and_close_file(file_instance)
                 mimetype = (mimetypes.guess_type(filename)[0] or
                             'application/octet-stream')
                 params.append(
@@ -22,6 +22,7 @@ import ipaddress
 
 from openapi_client.exceptions import ApiException, UnauthorizedException, ForbiddenException
 from openapi_client.exceptions import NotFoundException, ServiceException, ApiValueError
+from openapi_client.streaming_multipart import StreamingMultipartBody, has_streaming_files
 
 
 logger = logging.getLogger(__name__)
@@ -182,13 +183,25 @@ class RESTClientObject(object):
                     # Content-Type which generated by urllib3 will be
                     # overwritten.
                     del headers['Content-Type']
-                    r = self.pool_manager.request(
-                        method, url,
-                        fields=post_params,
-                        encode_multipart=True,
-                        preload_content=_preload_content,
-                        timeout=timeout,
-                        headers=headers)
+                    if has_streaming_files(post_params):
+                        # stream file parts instead of encoding them in memory
+                        request_body = StreamingMultipartBody(post_params)
+                        headers['Content-Type'] = request_body.content_type
+                        headers['Content-Length'] = str(request_body.content_length)
+                        r = self.pool_manager.request(
+                            method, url,
+                            body=request_body,
+                            preload_content=_preload_content,
+                            timeout=timeout,
+                            headers=headers)
+                    else:
+                        r = self.pool_manager.request(
+                            method, url,
+                            fields=post_params,
+                            encode_multipart=True,
+                            preload_content=_preload_content,
+                            timeout=timeout,
+                            headers=headers)
                 # Pass a `string` parameter directly in the body to support
                 # other content types than Json when `body` argument is
                 # provided in serialized form
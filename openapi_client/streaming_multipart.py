@@ -0,0 +1,149 @@
+# !/usr/bin/env python3
+"""
+    xpan
+
+    Streaming multipart/form-data encoder.
+
+    File parameters wrapped in StreamingFile are not read into memory by
+    ApiClient.files_parameters. RESTClientObject sends them with a
+    StreamingMultipartBody instead of urllib3's encode_multipart_formdata:
+    the preamble, the file content (sliced from a memoryview or read from a
+    file range block by block) and the epilogue are written to the socket
+    one after another, with a precomputed Content-Length.
+"""
+
+
+import io
+import os
+
+from urllib3.fields import RequestField
+from urllib3.filepost import choose_boundary
+
+# size of the blocks handed to the socket
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+class StreamingFile(io.IOBase):
+    """A file parameter whose content is streamed instead of read up front.
+
+    The source is either a bytes-like object (sent as zero-copy memoryview
+    slices) or a byte range of an open file descriptor (read with pread).
+
+    :param source: bytes-like object holding the content
+    :param name: file name reported in the multipart headers
+    :param fd: file descriptor to read from instead of `source`
+    :param offset: start of the range in `fd`
+    :param length: length of the range in `fd`
+    """
+
+    def __init__(self, source=None, name='file', fd=None, offset=0, length=None,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        super().__init__()
+        if (source is None) == (fd is None):
+            raise ValueError("exactly one of source and fd must be given")
+        if fd is not None and length is None:
+            raise ValueError("length is required when streaming from fd")
+        self.source = memoryview(source).cast('B') if source is not None else None
+        self.name = name
+        self.fd = fd
+        self.offset = offset
+        self.length = len(self.source) if source is not None else length
+        self.block_size = block_size
+        # optional callable(n) invoked before each block is sent,
+        # e.g. a bandwidth limiter
+        self.on_block = None
+        # optional callable() invoked once when the file is closed,
+        # e.g. to hand a shared buffer back to its owner
+        self.on_close = None
+
+    def __len__(self):
+        return self.length
+
+    def readable(self):
+        return True
+
+    def iter_blocks(self):
+        """Yield the content in blocks of at most `block_size` bytes."""
+        position = 0
+        while position < self.length:
+            size = min(self.block_size, self.length - position)
+            if self.on_block is not None:
+                self.on_block(size)
+            if self.source is not None:
+                block = self.source[position:position + size]
+            else:
+                block = os.pread(self.fd, size, self.offset + position)
+                if not block:
+                    raise IOError("unexpected end of file while streaming")
+                size = len(block)
+            position += size
+            yield block
+
+    def read(self, size=-1):
+        """Materialize the whole content (fallback for non-streaming paths)."""
+        return b''.join(bytes(block) for block in self.iter_blocks())
+
+    def close(self):
+        if not self.closed:
+            if self.source is not None:
+                self.source.release()
+            if self.on_close is not None:
+                self.on_close()
+        super().close()
+
+
+def has_streaming_files(fields):
+    """Return True if any multipart field carries a StreamingFile."""
+    for field in fields or []:
+        if isinstance(field, RequestField):
+            if isinstance(field.data, StreamingFile):
+                return True
+            continue
+        _, value = field
+        if isinstance(value, tuple) and len(value) >= 2 and isinstance(value[1], StreamingFile):
+            return True
+    return False
+
+
+class StreamingMultipartBody(object):
+    """Re-iterable multipart/form-data body.
+
+    Iterating yields the encoded body piece by piece; iterating again
+    starts over, so urllib3 can safely retry the request.
+
+    :param fields: list of (name, value) tuples, where value is a str,
+        bytes or a (filename, data[, mimetype]) tuple, or RequestFields
+    :param boundary: multipart boundary, random if omitted
+    """
+
+    def __init__(self, fields, boundary=None):
+        self.boundary = boundary or choose_boundary()
+        self.parts = []
+        for field in fields:
+            if not isinstance(field, RequestField):
+                field = RequestField.from_tuples(*field)
+            data = field.data
+            if isinstance(data, int):
+                data = str(data)
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            self.parts.append(f"--{self.boundary}\r\n".encode('latin-1'))
+            self.parts.append(field.render_headers().encode('utf-8'))
+            self.parts.append(data)
+            self.parts.append(b"\r\n")
+        self.parts.append(f"--{self.boundary}--\r\n".encode('latin-1'))
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def content_length(self):
+        return sum(len(part) for part in self.parts)
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, StreamingFile):
+                yield from part.iter_blocks()
+            else:
+                yield part